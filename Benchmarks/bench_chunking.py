@@ -0,0 +1,77 @@
+## bench_chunking.py
+
+"""
+chunk_text against Utils.utils.format_text_by_sentences on multi-MB synthetic text.
+Both run on the same text; chunk_text counts words by default (the same unit as
+format_text_by_sentences' max_words), or real tokens with --model <tokenizer folder>.
+
+Usage:
+    python -m Benchmarks.bench_chunking --sizes-mb 1 4 8
+    python -m Benchmarks.bench_chunking --sizes-mb 4 --model ./Models/EmbeddingModels/mpnet-base-v2
+"""
+
+import json
+import time
+import random
+import argparse
+from Ingestion.splitter import chunk_text, count_words
+from Utils.utils import format_text_by_sentences
+
+WORDS = ("retrieval augmented generation grounds answers in document text while embeddings capture "
+         "meaning and vector search ranks passages by similarity to the question").split()
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    """Sentences of 5-30 words, some with parentheses, semicolons and numbers, paragraphs of ~8 sentences"""
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < size_bytes:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 30))]
+        if rng.random() < 0.2:
+            words.insert(rng.randint(1, len(words)), "(see section 3.2. for details)")
+        sentence = " ".join(words).capitalize() + rng.choice([".", ".", ".", ";"])
+        if rng.random() < 0.1:
+            sentence = f"{rng.randint(1, 99)} " + sentence
+        sentence += "\n\n" if rng.random() < 0.12 else rng.choice([" ", "\n"])
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking benchmark")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4])
+    parser.add_argument("--chunk-size", type=int, default=100, help="tokens (words without --model)")
+    parser.add_argument("--overlap", type=int, default=10)
+    parser.add_argument("--model", default=None, help="tokenizer folder for real token counts")
+    args = parser.parse_args()
+
+    count_tokens = count_words
+    if args.model:
+        from transformers import AutoTokenizer # pyright: ignore[reportMissingImports]
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        count_tokens = lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    rows = []
+    for size_mb in args.sizes_mb:
+        text = synthetic_text(int(size_mb * 1024 * 1024))
+        legacy, legacy_s = timed(lambda: format_text_by_sentences(text, max_words=args.chunk_size).splitlines())
+        chunks, chunk_s = timed(lambda: chunk_text(text, args.chunk_size, args.overlap, count_tokens))
+        rows.append({
+            "size_mb": size_mb,
+            "format_text_by_sentences_s": round(legacy_s, 3),
+            "format_text_by_sentences_chunks": len(legacy),
+            "chunk_text_s": round(chunk_s, 3),
+            "chunk_text_chunks": len(chunks),
+            "chunk_text_max_tokens": max(chunk.tokens for chunk in chunks),
+            "speedup": round(legacy_s / chunk_s, 2),
+            "chunk_text_mb_per_s": round(size_mb / chunk_s, 2),
+        })
+    print(json.dumps({"chunk_size": args.chunk_size, "overlap": args.overlap,
+                      "token_counter": args.model or "words", "results": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
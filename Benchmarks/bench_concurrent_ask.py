@@ -0,0 +1,78 @@
+## bench_concurrent_ask.py
+
+"""
+Throughput of RAGPipeline.ask as concurrent askers are added.
+Runs offline: in-memory Qdrant plus stand-in embedder/LLM whose latencies emulate
+model work that releases the GIL (torch ops, HTTP waits).
+"serialized" reproduces the old behaviour where one pipeline-wide lock wrapped ask().
+
+Usage:
+    python -m Benchmarks.bench_concurrent_ask --requests 64 --llm-ms 200
+"""
+
+import argparse
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Config.config import AppConfig, ConcurrencyConfig, QueryCacheConfig, RetrievalConfig
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+from Utils.standins import StubEmbedder, StubLLM
+from Vectorstore.qdrant_handler import QdrantHandler
+
+def build_pipeline(args) -> RAGPipeline:
+    config = AppConfig(
+        concurrency=ConcurrencyConfig(embed_workers=args.embed_workers, query_batching=not args.no_batching),
+        query_cache=QueryCacheConfig(cache_answers=False),
+        retrieval=RetrievalConfig(hybrid=False))     # points are inserted directly, dense leg only
+    embedder = StubEmbedder(dim=args.dim, latency_ms=args.embed_ms)
+    handler = QdrantHandler(url=":memory:", collection_name="bench_concurrent_ask")
+    pipeline = RAGPipeline(config=config, embedder=embedder, captioner=object(),
+                           qdrant_handler=handler, llm_client=StubLLM(args.llm_ms))
+
+    sentences = [f"synthetic sentence number {i} about topic {i % 50}" for i in range(args.points)]
+    handler.create_collection(vector_size=args.dim)
+    handler.insert_embeddings(sentences=sentences, embeddings=embedder.encode_batch(sentences), pdf_id="bench")
+    return pipeline
+
+def run_level(pipeline: RAGPipeline, concurrency: int, requests: int, serialized: bool) -> dict:
+    global_lock = threading.Lock()
+
+    def ask(i: int):
+        # Unique questions so the query caches never short-circuit the work
+        question = f"question {concurrency}-{i}-{serialized}?"
+        if serialized:
+            with global_lock:
+                return pipeline.ask(question, top_k=5)
+        return pipeline.ask(question, top_k=5)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(ask, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {"concurrency": concurrency, "serialized": serialized, "seconds": round(elapsed, 3),
+            "requests_per_sec": round(requests / elapsed, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent ask() throughput benchmark")
+    parser.add_argument("--requests", type=int, default=48)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--embed-ms", type=float, default=15.0)
+    parser.add_argument("--llm-ms", type=float, default=200.0)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--no-batching", action="store_true", help="embed each query separately on the worker pool")
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=64)
+    args = parser.parse_args()
+
+    pipeline = build_pipeline(args)
+    try:
+        results = [run_level(pipeline, 1, args.requests, serialized=True)]
+        results += [run_level(pipeline, level, args.requests, serialized=False) for level in args.levels]
+        batcher = pipeline.batcher_stats()
+    finally:
+        pipeline.close()
+    print(json.dumps({"levels": results, "embedding_batcher": batcher}, indent=2))
+
+if __name__ == "__main__":
+    main()
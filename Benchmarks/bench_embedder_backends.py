@@ -0,0 +1,84 @@
+## bench_embedder_backends.py
+
+"""
+Validate Embedder inference backends against the fp32 PyTorch baseline.
+Every backend embeds the same synthetic passages; the report gives the cosine similarity of each
+vector to its "torch" counterpart (mean / min / 1st percentile), throughput and speedup.
+Embedding caches are disabled so every run measures model inference.
+
+Usage:
+    python -m Benchmarks.bench_embedder_backends --model ./Models/EmbeddingModels/mpnet-base-v2
+    python -m Benchmarks.bench_embedder_backends --backends torch onnx-int8 --texts 512 --threads 4
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+from Benchmarks.bench_chunking import synthetic_text
+from Embeddings.backends import BACKENDS
+from Embeddings.embedder import Embedder
+from Ingestion.splitter import chunk_text
+
+def synthetic_passages(count: int, words: int = 120, seed: int = 0):
+    """count passages of about `words` words"""
+    text = synthetic_text(count * words * 8, seed=seed)
+    passages = [chunk.text for chunk in chunk_text(text, chunk_size=words, overlap=0)]
+    return passages[:count]
+
+def cosine_agreement(reference: np.ndarray, vectors: np.ndarray) -> dict:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosines = (reference * vectors).sum(axis=1)
+    return {"mean": float(cosines.mean()), "min": float(cosines.min()), "p1": float(np.percentile(cosines, 1))}
+
+def compare_backends(model_path: str, texts, backends=BACKENDS, batch_size: int = 32, num_threads: int = 0,
+                     onnx_dir: str = "Cache/onnx", repeats: int = 2) -> dict:
+    """Embed texts with each backend; "torch" is always run first as the reference"""
+    backends = ["torch"] + [name for name in backends if name != "torch"]
+    reference, baseline_rate, rows = None, None, []
+    for name in backends:
+        started = time.perf_counter()
+        embedder = Embedder(model_path=model_path, device=-1, batch_size=batch_size, cache_dir=None,
+                            backend=name, onnx_dir=onnx_dir, num_threads=num_threads)
+        load_s = time.perf_counter() - started
+        embedder.encode_batch(texts[:batch_size])       # warm-up
+        best_s = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            vectors = embedder.encode_batch(texts)
+            best_s = min(best_s, time.perf_counter() - started)
+        rate = len(texts) / best_s
+        if reference is None:
+            reference, baseline_rate = vectors, rate
+        rows.append({
+            "backend": name,
+            "load_s": round(load_s, 3),
+            "texts_per_s": round(rate, 1),
+            "speedup": round(rate / baseline_rate, 2),
+            "cosine_vs_torch": {key: round(value, 5) for key, value in cosine_agreement(reference, vectors).items()},
+        })
+        del embedder
+    return {"model": model_path, "texts": len(texts), "batch_size": batch_size, "num_threads": num_threads, "results": rows}
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedder backend validation")
+    parser.add_argument("--model", default="./Models/EmbeddingModels/mpnet-base-v2")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--words", type=int, default=120, help="words per passage")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="CPU inference threads, 0 = library default")
+    parser.add_argument("--onnx-dir", default="Cache/onnx")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="exit non-zero when a backend's min cosine is lower")
+    args = parser.parse_args()
+
+    report = compare_backends(args.model, synthetic_passages(args.texts, args.words), args.backends,
+                              batch_size=args.batch_size, num_threads=args.threads, onnx_dir=args.onnx_dir)
+    print(json.dumps(report, indent=2))
+    failing = [row["backend"] for row in report["results"] if row["cosine_vs_torch"]["min"] < args.min_cosine]
+    if failing:
+        raise SystemExit(f"Cosine agreement below {args.min_cosine}: {', '.join(failing)}")
+
+if __name__ == "__main__":
+    main()
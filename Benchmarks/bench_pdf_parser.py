@@ -0,0 +1,120 @@
+## bench_pdf_parser.py
+
+"""
+parse_pdf against the previous two-library walk on a synthetic multi-hundred-page PDF.
+"legacy" reproduces the old parser: pdfplumber.extract_tables on every page and every
+image re-encoded to a PNG file. "single_pass" is the current parse_pdf with one worker,
+"parallel" adds the page-range process pool. Table output of all variants is compared.
+
+Usage:
+    python -m Benchmarks.bench_pdf_parser --pages 300 --table-every 10 --workers 4
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import fitz # type: ignore
+import pdfplumber # type: ignore
+from PIL import Image
+from Ingestion.pdf_parser import parse_pdf
+
+LOREM = ("Retrieval augmented generation grounds answers in document text. "
+         "Each page of this synthetic report carries a few paragraphs of prose. ")
+
+def build_pdf(path: str, pages: int, table_every: int, image_every: int, seed: int = 0, page_texts=None):
+    """
+    Text on every page, a ruled 4x5 table every table_every pages, a photo every image_every pages.
+    page_texts replaces the default prose (one string per page, up to ~900 characters fit the text box).
+    """
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = page_texts[number] if page_texts is not None else f"Page {number}. " + LOREM * 6
+        page.insert_textbox(fitz.Rect(50, 50, 550, 300), text, fontsize=10)
+        if table_every and number % table_every == 0:
+            x0, y0, cell_w, cell_h = 60, 320, 110, 24
+            for row in range(5):
+                page.draw_line((x0, y0 + row * cell_h), (x0 + 4 * cell_w, y0 + row * cell_h))
+                for col in range(4):
+                    page.insert_text((x0 + col * cell_w + 4, y0 + row * cell_h + 16), f"r{row}c{col}", fontsize=9)
+            page.draw_line((x0, y0 + 5 * cell_h), (x0 + 4 * cell_w, y0 + 5 * cell_h))
+            for col in range(5):
+                page.draw_line((x0 + col * cell_w, y0), (x0 + col * cell_w, y0 + 5 * cell_h))
+        if image_every and number % image_every == 0:
+            buffer = io.BytesIO()
+            Image.fromarray((rng.random((240, 320, 3)) * 255).astype("uint8")).save(buffer, format="JPEG")
+            page.insert_image(fitz.Rect(60, 480, 380, 720), stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+def legacy_parse_pdf(pdf_path: str, temp_dir: str):
+    """The parser as it was: both libraries walk every page, images go through PNG files"""
+    output_dir = tempfile.mkdtemp(prefix="legacy_", dir=temp_dir)
+    text, tables, images = "", [], []
+    with fitz.open(pdf_path) as doc, pdfplumber.open(pdf_path) as plumber_pdf:
+        for page, plumber_page in zip(doc, plumber_pdf.pages):
+            for img_index, img in enumerate(page.get_images(full=True)):
+                pix = fitz.Pixmap(doc, img[0])
+                img_path = os.path.join(output_dir, f"page{page.number}_img{img_index}.png")
+                pix.save(img_path)
+                images.append(img_path)
+            text += page.get_text("text") + "\n"
+            tables.extend(plumber_page.extract_tables())
+    return {"text": text, "tables": tables, "images": images, "output_dir": output_dir}
+
+def run_variant(name: str, fn, repeats: int):
+    timings, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+        shutil.rmtree(result["output_dir"], ignore_errors=True)
+    return result, {"variant": name, "best_s": round(min(timings), 3), "mean_s": round(sum(timings) / len(timings), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF parsing benchmark")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--table-every", type=int, default=10, help="0 disables tables")
+    parser.add_argument("--image-every", type=int, default=5, help="0 disables images")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--pdf", default=None, help="benchmark an existing PDF instead of a synthetic one")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pdf_")
+    try:
+        pdf_path = args.pdf or os.path.join(work_dir, "synthetic.pdf")
+        if not args.pdf:
+            build_pdf(pdf_path, args.pages, args.table_every, args.image_every)
+
+        variants = [
+            ("legacy", lambda: legacy_parse_pdf(pdf_path, work_dir)),
+            ("single_pass", lambda: parse_pdf(pdf_path, work_dir, workers=1)),
+            ("parallel", lambda: parse_pdf(pdf_path, work_dir, workers=args.workers, parallel_min_pages=1)),
+        ]
+        rows, outputs = [], {}
+        for name, fn in variants:
+            outputs[name], row = run_variant(name, fn, args.repeats)
+            rows.append(row)
+
+        baseline = rows[0]["best_s"]
+        for row in rows:
+            row["speedup"] = round(baseline / row["best_s"], 2) if row["best_s"] else None
+            row["tables"] = len(outputs[row["variant"]]["tables"])
+            row["tables_match_legacy"] = outputs[row["variant"]]["tables"] == outputs["legacy"]["tables"]
+            row["text_matches_legacy"] = outputs[row["variant"]]["text"] == outputs["legacy"]["text"]
+
+        with fitz.open(pdf_path) as doc:
+            pages = doc.page_count
+        print(json.dumps({"pdf": pdf_path if args.pdf else "synthetic", "pages": pages, "results": rows}, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
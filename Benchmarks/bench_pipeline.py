@@ -0,0 +1,378 @@
+## bench_pipeline.py
+
+"""
+End-to-end pipeline benchmark on a synthetic corpus with offline stand-ins.
+A synthetic PDF (page, image and table counts configurable) goes through every stage on its own:
+parse, caption, OCR (when tesseract is installed), split, embed, upsert into a local-mode Qdrant
+folder, search, rerank (--rerank), context assembly and generation. Then the full ingest_pdf and
+ask paths run, with a per-stage breakdown taken from the pipeline's request traces.
+
+Stand-ins keep it offline:
+- a randomly initialised BERT on the tiny test vocabulary (or --model) embeds;
+- a fixed-latency captioner captions;
+- an in-process HTTP server speaking Ollama's /api/generate answers through the real OllamaClient.
+The numbers therefore track the pipeline's own cost plus the configured stand-in latencies.
+
+Every benchmark reports runs, throughput (items/s), p50/p95/p99/mean latency in ms and peak RSS.
+The JSON report is compared against a stored baseline; regressions beyond --tolerance (and
+--min-delta-ms for latencies) are listed and fail the run with --fail-on-regression. Baselines are
+machine-specific: record one with --save-baseline on the machine that runs the comparison.
+
+Usage:
+    python -m Benchmarks.bench_pipeline --pages 24 --image-every 4 --table-every 6
+    python -m Benchmarks.bench_pipeline --fail-on-regression --output bench.json
+    python -m Benchmarks.bench_pipeline --save-baseline Benchmarks/baselines/bench_pipeline.json
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import numpy as np
+from Benchmarks.bench_chunking import synthetic_text
+from Benchmarks.bench_pdf_parser import build_pdf
+from Config.config import AppConfig, IngestionConfig, OCRConfig, QueryCacheConfig, RerankConfig, RetrievalConfig
+from Embeddings.embedder import Embedder
+from Ingestion.pdf_parser import parse_pdf
+from LLM.ollama_client import OllamaClient
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+from Vectorstore.manifest import make_point_id
+from Utils.standins import StandInCaptioner, StubOllamaServer, build_tiny_cross_encoder, build_tiny_model
+from Vectorstore.qdrant_handler import QdrantHandler
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "bench_pipeline.json")
+
+# metric -> direction in which a change is a regression (+1 higher is worse, -1 lower is worse)
+COMPARED_METRICS = {"throughput": -1, "p95_ms": +1, "peak_rss_mb": +1}
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024      # KiB on Linux, peak only
+
+class RSSSampler:
+    """Peak resident set size while the block runs, sampled every interval_s on a background thread"""
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = _rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, _rss_mb())
+
+def build_standin_model(model_dir: str, layers: int = 4, hidden: int = 256) -> str:
+    """Randomly initialised BERT of MiniLM-like shape on the tiny offline test vocabulary"""
+    from transformers import BertConfig, BertModel # pyright: ignore[reportMissingImports]
+    from transformers.utils import logging as hf_logging # pyright: ignore[reportMissingImports]
+    hf_logging.disable_progress_bar()
+    build_tiny_model(model_dir)
+    config = BertConfig.from_pretrained(model_dir, hidden_size=hidden, num_hidden_layers=layers,
+                                        num_attention_heads=max(1, hidden // 64), intermediate_size=hidden * 4)
+    BertModel(config).save_pretrained(model_dir)
+    return model_dir
+
+def build_corpus(pdf_path: str, pages: int, image_every: int, table_every: int, seed: int = 0):
+    """Synthetic PDF with varied prose per page; returns the page texts"""
+    page_texts = [f"Page {number}. " + synthetic_text(800, seed=seed + number)[:850] for number in range(pages)]
+    build_pdf(pdf_path, pages, table_every=table_every, image_every=image_every, seed=seed, page_texts=page_texts)
+    return page_texts
+
+def make_questions(page_texts, count: int, seed: int = 0):
+    """Unique questions built from 6-word windows of the corpus, so query caches never answer them"""
+    rng = random.Random(seed)
+    words = " ".join(page_texts).split()
+    questions, seen = [], set()
+    while len(questions) < count:
+        start = rng.randrange(max(1, len(words) - 6))
+        question = "What does the report say about " + " ".join(words[start:start + 6]).strip(".;,()") + "?"
+        if question not in seen:
+            seen.add(question)
+            questions.append(question)
+    return questions
+
+def measure(fn, runs: int, unit: str, warmup: int = 1, setup=None) -> dict:
+    """
+    Time fn(run) `runs` times; fn returns the number of `unit`s it processed.
+    setup(run), when given, runs before every call and is not timed.
+    """
+    for run in range(warmup):
+        if setup is not None:
+            setup(run)
+        fn(run)
+    latencies, items = [], 0
+    with RSSSampler() as rss:
+        for run in range(runs):
+            if setup is not None:
+                setup(run)
+            started = time.perf_counter()
+            items += fn(run)
+            latencies.append(time.perf_counter() - started)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "runs": runs,
+        "items": items,
+        "unit": unit,
+        "throughput": round(items / sum(latencies), 2) if sum(latencies) > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "rss_growth_mb": round(rss.peak_mb - rss.start_mb, 1),
+    }
+
+def stage_breakdown(pipeline: RAGPipeline, op: str, runs: int) -> dict:
+    """Mean ms per request spent in each stage, from the last `runs` traces of `op`"""
+    traces = [trace for trace in pipeline.recent_traces() if trace["name"] == op][:runs]
+    totals = {}
+    for trace in traces:
+        for child in trace.get("children", []):
+            totals[child["name"]] = totals.get(child["name"], 0.0) + child["duration_ms"]
+    return {stage: round(total / len(traces), 3) for stage, total in totals.items()} if traces else {}
+
+def run_suite(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    server = StubOllamaServer(tokens=args.llm_tokens, ttft_ms=args.llm_ttft_ms, token_ms=args.llm_token_ms).start()
+    pipeline = None
+    try:
+        pdf_path = os.path.join(workdir, "corpus.pdf")
+        page_texts = build_corpus(pdf_path, args.pages, args.image_every, args.table_every, seed=args.seed)
+        questions = make_questions(page_texts, args.queries * 3 + 2, seed=args.seed)
+
+        started = time.perf_counter()
+        model_path = args.model or build_standin_model(os.path.join(workdir, "embedder"), args.model_layers, args.model_hidden)
+        # No embedding cache: every run pays for model inference
+        embedder = Embedder(model_path=model_path, device=-1, batch_size=args.batch_size, cache_dir=None)
+        reranker = None
+        if args.rerank:
+            from Retrieval.reranker import CrossEncoderReranker
+            reranker = CrossEncoderReranker(build_tiny_cross_encoder(os.path.join(workdir, "cross_encoder")))
+        model_load_s = time.perf_counter() - started
+
+        config = AppConfig(
+            ocr=OCRConfig(enabled=args.ocr),
+            ingestion=IngestionConfig(manifest_dir=os.path.join(workdir, "manifests")),
+            retrieval=RetrievalConfig(index_dir=os.path.join(workdir, "bm25")),
+            rerank=RerankConfig(enabled=args.rerank, budget_ms=10_000),
+            query_cache=QueryCacheConfig(cache_answers=False))
+        pipeline = RAGPipeline(config=config, collection_name="bench_pipeline", embedder=embedder,
+                               captioner=StandInCaptioner(args.caption_ms),
+                               qdrant_handler=QdrantHandler(url=os.path.join(workdir, "qdrant"), collection_name="bench_pipeline"),
+                               llm_client=OllamaClient(model="stub", url=server.url), reranker=reranker)
+        results = {}
+        runs = args.runs
+
+        # Stages on their own
+        parse_dir = os.path.join(workdir, "parse")
+        parsed = {}
+        def parse(run):
+            if parsed.get("output_dir"):
+                shutil.rmtree(parsed["output_dir"], ignore_errors=True)
+            parsed.update(parse_pdf(pdf_path, parse_dir, pdf_id="bench", workers=config.ingestion.parse_workers,
+                                    parallel_min_pages=config.ingestion.parallel_min_pages, scan_dpi=pipeline._scan_dpi()))
+            return len(parsed["page_texts"])
+        results["parse"] = measure(parse, runs, "pages")
+
+        images = parsed["images"]
+        def caption(run):
+            pipeline.captioner.caption(images)
+            return len(images)
+        if images:
+            results["caption"] = measure(caption, runs, "images")
+        def ocr(run):
+            pipeline.ocr_engine.ocr_images(images)
+            return len(images)
+        if images and pipeline.ocr_engine is not None and pipeline.ocr_engine.available:
+            results["ocr"] = measure(ocr, runs, "images")
+
+        chunks = []
+        def split(run):
+            chunks[:] = [chunk for page, text in parsed["page_texts"] for chunk in pipeline._chunk(text, page=page)]
+            return len(chunks)
+        results["split"] = measure(split, runs, "chunks")
+
+        texts = [chunk.text for chunk in chunks]
+        vectors = {}
+        def embed(run):
+            vectors["chunks"] = embedder.encode_batch(texts)
+            return len(texts)
+        results["embed"] = measure(embed, runs, "texts")
+
+        ids = [make_point_id("bench", str(idx)) for idx in range(len(texts))]
+        payloads = [chunk.provenance() for chunk in chunks]
+        def reset_collection(run):
+            pipeline.delete_collection()
+            pipeline.qdrant_handler.create_collection(vector_size=vectors["chunks"].shape[1])
+        def upsert(run):
+            pipeline._insert_points(texts, vectors["chunks"], "bench", ids, payloads)
+            pipeline._flush_sparse_index()
+            return len(texts)
+        results["upsert"] = measure(upsert, runs, "points", setup=reset_collection)
+
+        query_vectors = embedder.encode_batch(questions)
+        fetch_k = max(args.top_k, config.rerank.candidates) if reranker is not None else args.top_k
+        hits = {}
+        def search(run):
+            hits[run] = [pipeline._hit(hit["text"], hit["score"], hit["payload"])
+                         for hit in pipeline.retriever.search(questions[run], query_vectors[run], top_k=fetch_k)]
+            return 1
+        results["search"] = measure(search, args.queries, "queries")
+
+        if reranker is not None:
+            # Offset questions so the reranker's score cache starts cold
+            def rerank(run):
+                question = questions[args.queries + run]
+                reranker.rerank(question, hits[run], args.top_k, budget_ms=config.rerank.budget_ms)
+                return 1
+            results["rerank"] = measure(rerank, args.queries, "queries")
+
+        contexts = {}
+        def build_context(run):
+            contexts[run], _ = pipeline.context_builder.build(hits[run][:args.top_k])
+            return 1
+        results["context"] = measure(build_context, args.queries, "queries")
+
+        def generate(run):
+            pipeline.llm_client.generate_answer(prompt=questions[run], context=contexts[run])
+            return 1
+        results["generate"] = measure(generate, args.queries, "answers")
+
+        # Full paths
+        def reset_pipeline(run):
+            pipeline.delete_collection()
+        def ingest(run):
+            pipeline.ingest_pdf(pdf_path, temp_dir=os.path.join(workdir, "ingest"), doc_key="corpus.pdf")
+            return args.pages
+        results["ingest_pdf"] = measure(ingest, args.ingest_runs, "pages", warmup=0, setup=reset_pipeline)
+        results["ingest_pdf"]["stages_ms"] = stage_breakdown(pipeline, "ingest_pdf", args.ingest_runs)
+
+        ask_questions = questions[2 * args.queries:]
+        def ask(run):
+            pipeline.ask(ask_questions[run], top_k=args.top_k)
+            return 1
+        results["ask"] = measure(ask, args.queries, "answers")
+        results["ask"]["stages_ms"] = stage_breakdown(pipeline, "ask", args.queries)
+
+        return {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "model_load_s": round(model_load_s, 3),
+                "ocr": "ocr" in results,
+                "corpus": {"pages": args.pages, "image_every": args.image_every, "table_every": args.table_every,
+                           "images": len(images), "tables": len(parsed.get("tables", [])), "chunks": len(texts)},
+                "config": {key: getattr(args, key) for key in ("pages", "image_every", "table_every", "runs", "ingest_runs",
+                                                               "queries", "top_k", "batch_size", "model", "model_layers",
+                                                               "model_hidden", "caption_ms", "llm_tokens", "llm_ttft_ms",
+                                                               "llm_token_ms", "rerank", "ocr", "seed")},
+            },
+            "results": results,
+        }
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2, min_delta_ms: float = 5.0) -> list:
+    """
+    Per benchmark and metric: baseline, current, change in % and whether it regressed beyond tolerance.
+    Latency and throughput changes also need the latency to move by more than min_delta_ms, so
+    sub-millisecond stages do not flag scheduler jitter as regressions.
+    """
+    rows = []
+    for name, result in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regression = change * direction > tolerance
+            if metric != "peak_rss_mb":
+                latency = "p95_ms" if metric == "p95_ms" else "mean_ms"
+                regression = regression and abs(result.get(latency, 0.0) - previous.get(latency, 0.0)) > min_delta_ms
+            rows.append({"benchmark": name, "metric": metric, "baseline": old, "current": new,
+                         "change_pct": round(change * 100, 1), "regression": regression})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with offline stand-ins")
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--image-every", type=int, default=4, help="a photo every N pages, 0 disables images")
+    parser.add_argument("--table-every", type=int, default=6, help="a ruled table every N pages, 0 disables tables")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs of each corpus-wide stage")
+    parser.add_argument("--ingest-runs", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=30, help="timed runs of each per-query stage and of ask")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--model", default=None, help="embedding model folder; default builds a random stand-in")
+    parser.add_argument("--model-layers", type=int, default=4)
+    parser.add_argument("--model-hidden", type=int, default=256)
+    parser.add_argument("--caption-ms", type=float, default=25.0, help="stand-in captioner latency per image")
+    parser.add_argument("--llm-tokens", type=int, default=32)
+    parser.add_argument("--llm-ttft-ms", type=float, default=50.0)
+    parser.add_argument("--llm-token-ms", type=float, default=2.0)
+    parser.add_argument("--rerank", action="store_true", help="rerank with a tiny random cross-encoder")
+    parser.add_argument("--ocr", action="store_true", help="enable OCR (needs the tesseract executable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the JSON report here as well")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="report to compare against, skipped when missing")
+    parser.add_argument("--save-baseline", default=None, help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="smaller latency changes never count as regressions")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        meta = baseline.get("meta", {})
+        if meta.get("config") != report["meta"]["config"]:
+            print(f"warning: baseline {args.baseline} was recorded with different settings")
+        if (meta.get("platform"), meta.get("cpus")) != (report["meta"]["platform"], report["meta"]["cpus"]):
+            print(f"warning: baseline {args.baseline} was recorded on another machine ({meta.get('platform')}, {meta.get('cpus')} CPUs)")
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "min_delta_ms": args.min_delta_ms,
+                                "rows": compare(report, baseline, args.tolerance, args.min_delta_ms)}
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump({"meta": report["meta"], "results": report["results"]}, f, indent=2)
+
+    regressions = [row for row in report.get("comparison", {}).get("rows", []) if row["regression"]]
+    for row in regressions:
+        print(f"REGRESSION {row['benchmark']}.{row['metric']}: {row['baseline']} -> {row['current']} ({row['change_pct']:+}%)")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+## bench_qdrant_profiles.py
+
+"""
+Recall and latency of the Qdrant collection profiles (Config.config.COLLECTION_PROFILES).
+A synthetic clustered corpus of unit vectors is upserted into one collection per profile; queries
+are noisy copies of corpus vectors. Recall@k is measured against exact numpy cosine search, and
+filtered queries (pdf_id match) exercise the keyword payload index.
+
+Embedded Qdrant (":memory:" or a folder path) always searches exactly and ignores HNSW,
+quantization and payload indexes, so profile differences only show against a Qdrant server.
+
+Usage:
+    python -m Benchmarks.bench_qdrant_profiles --points 20000 --dim 384
+    python -m Benchmarks.bench_qdrant_profiles --url http://localhost:6333 --points 200000 --profiles default fast compact
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+from qdrant_client.models import Filter, FieldCondition, MatchValue # pyright: ignore[reportMissingImports]
+from Config.config import COLLECTION_PROFILES
+from Vectorstore.qdrant_handler import QdrantHandler
+
+def synthetic_corpus(points: int, dim: int, clusters: int = 64, docs: int = 100, seed: int = 0):
+    """Unit vectors around random cluster centres, each assigned to one of `docs` pdf_ids"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, points)] + 0.5 * rng.standard_normal((points, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    pdf_ids = [f"doc-{i % docs}" for i in range(points)]
+    return vectors, pdf_ids
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+def _percentiles(values) -> dict:
+    return {f"p{pct}": round(float(np.percentile(values, pct)), 3) for pct in (50, 95, 99)}
+
+def wait_until_indexed(handler: QdrantHandler, timeout_s: float = 600.0):
+    """Server collections index in the background; wait for the optimizer to finish"""
+    deadline = time.perf_counter() + timeout_s
+    while time.perf_counter() < deadline:
+        if str(handler.client.get_collection(handler.collection_name).status).lower().endswith("green"):
+            return
+        time.sleep(0.5)
+
+def bench_profile(url: str, name: str, vectors: np.ndarray, pdf_ids, queries: np.ndarray, truth: np.ndarray,
+                  top_k: int, batch_size: int) -> dict:
+    handler = QdrantHandler(url=url, collection_name=f"bench_profile_{name}", profile=COLLECTION_PROFILES[name])
+    handler.delete_collection()
+    handler.create_collection(vector_size=vectors.shape[1])
+
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        stop = min(start + batch_size, len(vectors))
+        handler.insert_embeddings(sentences=[str(i) for i in range(start, stop)], embeddings=vectors[start:stop].tolist(),
+                                  pdf_id=pdf_ids[start:stop], ids=list(range(start, stop)))
+    if url.startswith(("http://", "https://")):
+        wait_until_indexed(handler)
+    ingest_s = time.perf_counter() - started
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        found = handler.search(query.tolist(), top_k=top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits += len({int(point.id) for point in found} & set(expected.tolist()))
+
+    filtered = []
+    for idx, query in enumerate(queries):
+        t0 = time.perf_counter()
+        handler.client.query_points(collection_name=handler.collection_name, query=query.tolist(), limit=top_k,
+                                    query_filter=Filter(must=[FieldCondition(key="pdf_id", match=MatchValue(value=pdf_ids[idx]))]),
+                                    search_params=handler.search_params)
+        filtered.append((time.perf_counter() - t0) * 1000)
+
+    handler.delete_collection()
+    return {
+        "profile": name,
+        "ingest_s": round(ingest_s, 3),
+        "points_per_s": round(len(vectors) / ingest_s, 1),
+        f"recall@{top_k}": round(hits / truth.size, 4),
+        "latency_ms": _percentiles(latencies),
+        "filtered_latency_ms": _percentiles(filtered),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant collection profile benchmark")
+    parser.add_argument("--url", default=":memory:", help='Qdrant URL, ":memory:" or a local folder')
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    vectors, pdf_ids = synthetic_corpus(args.points, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.points, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(vectors, queries, args.top_k)
+
+    embedded = not args.url.startswith(("http://", "https://"))
+    report = {
+        "url": args.url,
+        "mode": "embedded (exact search, profile index settings not applied)" if embedded else "server",
+        "points": args.points,
+        "dim": args.dim,
+        "queries": args.queries,
+        "results": [bench_profile(args.url, name, vectors, pdf_ids, queries, truth, args.top_k, args.batch_size)
+                    for name in args.profiles],
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
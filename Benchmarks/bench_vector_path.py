@@ -0,0 +1,95 @@
+## bench_vector_path.py
+
+"""
+Embedder -> QdrantHandler vector hand-off: float32 arrays against the previous list-of-lists path.
+"legacy" reproduces the old code: encode_batch(...).tolist(), per-float isinstance validation and
+one PointStruct per point in a single upsert. "array" is the current insert_embeddings, which
+validates the float32 array once and upserts column-oriented batches.
+Each variant runs in a fresh process so peak RSS (ru_maxrss above the RSS after the embeddings
+exist) is measured independently.
+
+Usage:
+    python -m Benchmarks.bench_vector_path --points 100000 --dim 768
+    python -m Benchmarks.bench_vector_path --url http://localhost:6333 --batch-size 512 --parallelism 4 --grpc
+(--batch-size / --parallelism / --grpc configure the chunked upsert engine of the "array" variant)
+"""
+
+import json
+import time
+import uuid
+import argparse
+import resource
+import multiprocessing
+import numpy as np
+from qdrant_client.models import PointStruct # pyright: ignore[reportMissingImports]
+from Vectorstore.qdrant_handler import QdrantHandler
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024      # KiB on Linux
+
+def legacy_insert(handler: QdrantHandler, sentences, embeddings, pdf_id: str, ids):
+    """The previous insert_embeddings body"""
+    if not isinstance(embeddings, list) or not all(isinstance(e, list) and all(isinstance(v, (int, float)) for v in e) for e in embeddings):
+        raise ValueError("embeddings must be a list of lists of numbers")
+    points = [PointStruct(id=ids[idx], vector=vector, payload={"pdf_id": pdf_id, "text": sentence, "source": "pdf"})
+              for idx, (sentence, vector) in enumerate(zip(sentences, embeddings))]
+    handler.client.upsert(collection_name=handler.collection_name, points=points)
+
+def run_variant(variant: str, url: str, points: int, dim: int, engine: dict, result_queue):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((points, dim), dtype=np.float32)     # what encode_batch returns
+    sentences = [f"chunk {i}" for i in range(points)]
+    ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, str(i))) for i in range(points)]
+    handler = QdrantHandler(url=url, collection_name=f"bench_vector_path_{variant}", **(engine if variant == "array" else {}))
+    handler.delete_collection()
+    handler.create_collection(vector_size=dim)
+    baseline = _rss_mb()
+
+    started = time.perf_counter()
+    if variant == "legacy":
+        legacy_insert(handler, sentences, vectors.tolist(), "bench", ids)
+    else:
+        handler.insert_embeddings(sentences, vectors, pdf_id="bench", ids=ids)
+    elapsed = time.perf_counter() - started
+
+    count = handler.count()
+    handler.delete_collection()
+    result_queue.put({"variant": variant, "seconds": round(elapsed, 3), "points_per_s": round(points / elapsed, 1),
+                      "peak_rss_over_baseline_mb": round(_peak_rss_mb() - baseline, 1), "stored": count})
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector hand-off benchmark")
+    parser.add_argument("--url", default=":memory:", help='Qdrant URL, ":memory:" or a local folder')
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=256, help="points per upsert request")
+    parser.add_argument("--parallelism", type=int, default=2, help="upsert requests in flight (server only)")
+    parser.add_argument("--grpc", action="store_true", help="gRPC transport (server only)")
+    args = parser.parse_args()
+    engine = {"upsert_batch_size": args.batch_size, "upsert_parallelism": args.parallelism, "prefer_grpc": args.grpc}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for variant in ("legacy", "array"):
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_variant, args=(variant, args.url, args.points, args.dim, engine, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    legacy, array = results
+    print(json.dumps({
+        "url": args.url,
+        "points": args.points,
+        "dim": args.dim,
+        "engine": engine,
+        "results": results,
+        "speedup": round(legacy["seconds"] / array["seconds"], 2),
+        "peak_rss_saved_mb": round(legacy["peak_rss_over_baseline_mb"] - array["peak_rss_over_baseline_mb"], 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,47 @@
 ## config.py
 
 """
-Centralized configuration split into Qdrant and Ollama configs.
+Centralized configuration split into Qdrant, Ollama, embedder, captioner, OCR, ingestion,
+retrieval, rerank, context, query cache, concurrency, metrics and HTTP service configs.
 Thread-safe access ensured via frozen dataclasses.
 """
 
 from dataclasses import dataclass
 
+@dataclass(frozen=True)
+class CollectionProfile:
+    hnsw_m: int = 16                # HNSW graph degree (more = better recall, more memory)
+    hnsw_ef_construct: int = 100    # build-time candidate list size
+    search_ef: int | None = None    # search-time candidate list size, None = Qdrant default
+    quantization: bool = False      # int8 scalar quantization of the vectors
+    quantile: float = 0.99          # quantization range ignores this share of outliers
+    quantized_in_ram: bool = True   # keep quantized vectors in RAM
+    rescore: bool = True            # re-rank quantized candidates with the original vectors
+    oversampling: float = 2.0       # candidates fetched per result before rescoring
+    on_disk: bool = False           # original vectors memory-mapped from disk
+    payload_indexes: tuple = ("pdf_id", "source")  # keyword payload indexes
+
+# Named collection profiles, selected with QdrantConfig.profile
+COLLECTION_PROFILES = {
+    "default": CollectionProfile(),
+    "accurate": CollectionProfile(hnsw_m=32, hnsw_ef_construct=256, search_ef=256),
+    "fast": CollectionProfile(search_ef=64, quantization=True, oversampling=1.5),
+    "compact": CollectionProfile(search_ef=128, quantization=True, on_disk=True),
+}
+
 @dataclass(frozen=True)
 class QdrantConfig:
     host: str = "localhost"
     port: int = 6333
     collection_name: str = "rag_collection"
+    profile: str = "default"        # key of COLLECTION_PROFILES, applied when a collection is created
+    prefer_grpc: bool = False       # gRPC transport to a Qdrant server (faster bulk loads)
+    grpc_port: int = 6334
+    upsert_batch_size: int = 256    # points per upsert request
+    upsert_parallelism: int = 2     # upsert requests in flight at once
+    upsert_retries: int = 3         # retries of a failed batch, with exponential backoff
+    upsert_backoff: float = 0.5     # first retry delay in seconds
+    upsert_wait: bool = False       # wait for every batch to be applied, not only the final barrier
 
 @dataclass(frozen=True)
 class OllamaConfig:
@@ -19,10 +49,131 @@ class OllamaConfig:
     port: int = 11434
     embedding_model: str = "nomic-embed-text"
     llm_model: str = "mistral"
+    connect_timeout: float = 5.0    # seconds
+    read_timeout: float = 120.0     # max seconds between streamed chunks
+    max_retries: int = 3            # connection errors and 429/5xx, with exponential backoff
+    backoff_factor: float = 0.5
+    pool_maxsize: int = 16          # keep-alive connections per host
+
+@dataclass(frozen=True)
+class EmbedderConfig:
+    model_path: str = "./Models/EmbeddingModels/mpnet-base-v2"
+    batch_size: int = 32
+    cache_dir: str | None = "Cache/embeddings"   # persistent embedding cache, None disables it
+    cache_max_entries: int = 100_000
+    cache_dtype: str = "float16"
+    cache_flush_every: int = 10_000 # new cache entries between index writes, the rest is written after each ingest
+    backend: str = "torch"          # "torch", "torch-int8", "onnx" or "onnx-int8" (see Embeddings/backends.py)
+    onnx_dir: str = "Cache/onnx"    # exported ONNX models
+    num_threads: int = 0            # CPU inference threads, 0 = library default
+
+@dataclass(frozen=True)
+class CaptionerConfig:
+    model_path: str = "./Models/ImageCaptionModels/blip"
+    batch_size: int = 8             # images per generate call
+    preset: str = "fast"            # "fast" (greedy) or "quality" (beam search)
+    max_new_tokens: int = 80
+    min_width: int = 32             # smaller images (bullets, rules, icons) are not captioned
+    min_height: int = 32
+    min_area: int = 4096
+    dedupe: bool = True             # skip byte-identical and perceptual-hash duplicates
+    hash_distance: int = 4          # max dHash Hamming distance treated as the same image
+
+@dataclass(frozen=True)
+class OCRConfig:
+    enabled: bool = True            # also needs the tesseract executable on PATH
+    workers: int = 0                # parallel tesseract processes, 0 = one per CPU
+    max_side: int = 2500            # larger images are downscaled before OCR
+    min_text_likelihood: float = 0.2    # images scoring lower (photos, charts) are not OCR'd
+    lang: str = "eng"
+    scan_dpi: int = 200             # rendering resolution of pages without a text layer
+
+@dataclass(frozen=True)
+class IngestionConfig:
+    queue_size: int = 4             # max items waiting between two streaming stages
+    upsert_batch_size: int = 256    # points buffered per upsert flush in streaming mode
+    parse_workers: int = 0          # page-range parse processes for one large PDF, 0 = one per CPU
+    parallel_min_pages: int = 64    # smaller PDFs are parsed in-process
+    image_memory_limit_mb: int = 256    # extracted images kept in memory per document before spilling to disk
+    manifest_dir: str = "Cache/manifests"   # per-collection record of ingested documents and chunks
+    bulk_parse_workers: int = 0     # parse processes for bulk ingestion, 0 = one per CPU
+    bulk_upsert_batch_size: int = 1024  # points buffered per upsert flush in bulk mode (spans documents)
+    checkpoint_dir: str = "Cache/checkpoints"   # bulk ingestion resume points
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    hybrid: bool = True             # BM25 keyword leg fused with the dense leg; False = dense only
+    index_dir: str = "Cache/bm25"   # one compressed BM25 index per collection
+    candidates: int = 50            # hits fetched per leg before fusion (at least top_k)
+    rrf_k: int = 60                 # reciprocal rank fusion constant
+    bm25_k1: float = 1.5
+    bm25_b: float = 0.75
+    stats_window: int = 1024        # recent queries kept for per-leg latency percentiles
+
+@dataclass(frozen=True)
+class RerankConfig:
+    enabled: bool = False           # cross-encoder rerank of retrieved chunks
+    model_path: str = "./Models/RerankModels/ms-marco-MiniLM-L-6-v2"
+    device: int = -1                # -1 for CPU, 0+ for GPU
+    candidates: int = 30            # hits over-fetched and rescored (at least top_k)
+    batch_size: int = 16            # (query, chunk) pairs per forward pass
+    max_length: int = 256           # token limit of a (query, chunk) pair
+    budget_ms: float = 150.0        # per-request rerank budget; retrieval order is kept when exceeded
+    cache_entries: int = 10_000     # (query, chunk) score cache
+
+@dataclass(frozen=True)
+class ContextConfig:
+    max_tokens: int = 1500          # token budget of the retrieved context in the LLM prompt
+    tokenizer_path: str | None = None   # LLM tokenizer folder for exact counts, None = estimate from characters
+    duplicate_threshold: float = 0.85   # shingle overlap at which a chunk counts as a near-duplicate
+    merge_adjacent: bool = True     # merge overlapping / adjacent chunks of the same page
+    order: str = "relevance"        # "relevance", "edges" or "document"
+
+@dataclass(frozen=True)
+class QueryCacheConfig:
+    embedding_entries: int = 1024   # question -> query vector
+    result_entries: int = 1024      # (collection, version, vector hash, top_k) -> hits
+    answer_entries: int = 256       # (collection, version, question, context hash) -> answer
+    cache_answers: bool = True
+
+@dataclass(frozen=True)
+class ConcurrencyConfig:
+    embed_workers: int = 2          # query embeddings computed in parallel (also bounds Embedder forward passes)
+    query_batching: bool = True     # coalesce concurrent query embeddings into micro-batches
+    max_batch_size: int = 32        # micro-batch upper bound
+    max_wait_ms: float = 5.0        # how long the first query of a batch waits for company
+    llm_concurrency: int = 4        # ask_many() generations in flight against Ollama
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    enabled: bool = True            # stage histograms, counters and request span trees
+    trace_buffer: int = 256         # finished request traces kept for /traces
+
+@dataclass(frozen=True)
+class ServiceConfig:
+    host: str = "0.0.0.0"
+    port: int = 8000
+    qdrant_url: str = "http://localhost:6333"
+    collection_name: str = "pdf_embeddings"
+    embedder_device: int = 0        # -1 for CPU, 0+ for GPU
+    upload_dir: str = "TempData/uploads"
+    model_workers: int = 4          # executor threads for blocking query/LLM work
+    max_finished_jobs: int = 1000   # finished ingestion jobs kept for /jobs polling (oldest dropped first)
 
 @dataclass(frozen=True)
 class AppConfig:
     qdrant: QdrantConfig = QdrantConfig()
     ollama: OllamaConfig = OllamaConfig()
-    chunk_size: int = 500
-    overlap: int = 50
+    embedder: EmbedderConfig = EmbedderConfig()
+    captioner: CaptionerConfig = CaptionerConfig()
+    ocr: OCRConfig = OCRConfig()
+    ingestion: IngestionConfig = IngestionConfig()
+    retrieval: RetrievalConfig = RetrievalConfig()
+    rerank: RerankConfig = RerankConfig()
+    context: ContextConfig = ContextConfig()
+    query_cache: QueryCacheConfig = QueryCacheConfig()
+    concurrency: ConcurrencyConfig = ConcurrencyConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    service: ServiceConfig = ServiceConfig()
+    chunk_size: int = 500           # tokens per chunk (capped to the embedder's max input length)
+    overlap: int = 50               # tokens of trailing sentences repeated in the next chunk
@@ -0,0 +1,112 @@
+## backends.py
+
+"""
+Inference backends for Embedder. Each backend maps tokenized inputs to the model's last hidden
+state; pooling stays in Embedder, so every backend produces embeddings the same way.
+- "torch":      PyTorch eager (fp32), CPU or GPU
+- "torch-int8": PyTorch dynamic int8 quantization of the Linear layers, CPU only
+- "onnx":       ONNX Runtime on CPU, the model is exported once to onnx_dir
+- "onnx-int8":  ONNX Runtime with dynamically int8-quantized weights
+onnxruntime is optional and only imported when an ONNX backend is selected.
+"""
+
+import os
+import logging
+import warnings
+import numpy as np
+import torch # pyright: ignore[reportMissingImports]
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, inputs) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(**inputs.to(self.device)).last_hidden_state
+
+class TorchInt8Backend(TorchBackend):
+    """Dynamic quantization: int8 weights, activations quantized on the fly per batch"""
+    name = "torch-int8"
+
+    def __init__(self, model):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized, torch.device("cpu"))
+
+class _HiddenStateModule(torch.nn.Module):
+    """Positional-argument wrapper used for ONNX export"""
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *args):
+        return self.model(**dict(zip(self.input_names, args))).last_hidden_state
+
+def export_onnx(model, tokenizer, path: str, quantize: bool = False) -> str:
+    """Export model to ONNX at path (int8-quantized when quantize), unless it already exists"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in tokenizer.model_input_names]
+    sample = tokenizer(["export sample text", "a longer export sample text for dynamic axes"], padding=True, return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    fp32_path = f"{path}.fp32.tmp" if quantize else f"{path}.tmp"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        torch.onnx.export(_HiddenStateModule(model.cpu().eval(), input_names), tuple(sample[name] for name in input_names), fp32_path,
+                          input_names=input_names, output_names=["last_hidden_state"], dynamic_axes=dynamic_axes,
+                          opset_version=17, dynamo=False)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType # pyright: ignore[reportMissingImports]
+        quantize_dynamic(fp32_path, f"{path}.tmp", weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+    os.replace(f"{path}.tmp", path)
+    print(f"Exported ONNX model: {path}")
+    return path
+
+class OnnxBackend:
+    """ONNX Runtime CPU session; session.run is thread-safe, so concurrent forward passes may share it"""
+    def __init__(self, onnx_path: str, num_threads: int = 0):
+        try:
+            import onnxruntime as ort # pyright: ignore[reportMissingImports]
+        except ImportError as e:
+            raise RuntimeError(f"ONNX backends need the onnxruntime package: {e}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.name = "onnx-int8" if onnx_path.endswith("-int8.onnx") else "onnx"
+
+    def __call__(self, inputs) -> torch.Tensor:
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return torch.from_numpy(self.session.run(["last_hidden_state"], feed)[0])
+
+def build_backend(name: str, model, tokenizer, device, model_key: str, onnx_dir: str = "Cache/onnx", num_threads: int = 0):
+    """
+    Backend by name. model_key (folder name plus model revision) names the exported ONNX file,
+    so replaced model files trigger a new export.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if name != "torch" and device.type != "cpu":
+        logging.warning(f"Embedder backend '{name}' runs on CPU, ignoring device {device}")
+    if num_threads > 0 and name.startswith("torch"):
+        torch.set_num_threads(num_threads)
+
+    if name == "torch":
+        return TorchBackend(model, device)
+    if name == "torch-int8":
+        return TorchInt8Backend(model.cpu())
+    quantize = name == "onnx-int8"
+    path = os.path.join(onnx_dir, f"{model_key}{'-int8' if quantize else ''}.onnx")
+    return OnnxBackend(export_onnx(model, tokenizer, path, quantize=quantize), num_threads=num_threads)
@@ -0,0 +1,151 @@
+## batcher.py
+
+"""
+Dynamic micro-batching for query embeddings.
+Concurrent callers submit single texts; background workers gather up to max_batch_size
+items or wait at most max_wait_ms after the first one, run a single forward pass and
+hand each caller its own vector through a Future.
+"""
+
+import time
+import queue
+import threading
+import logging
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List
+
+def _percentile(values, pct: float) -> float:
+    return float(np.percentile(values, pct)) if len(values) else 0.0
+
+class EmbeddingBatcher:
+    """
+    Usage:
+        batcher = EmbeddingBatcher(lambda texts: embedder.encode(texts).numpy(), max_batch_size=32, max_wait_ms=5)
+        vector = batcher.encode("What is the document about?")      # np.ndarray (dim,)
+        batcher.stats()
+        batcher.close()
+    embed_fn(texts) must return an array-like of shape (len(texts), dim).
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 num_workers: int = 1, window: int = 1024):
+        if not callable(embed_fn):
+            raise ValueError("embed_fn must be callable")
+        if not isinstance(max_batch_size, int) or max_batch_size <= 0:
+            raise ValueError("max_batch_size must be a positive integer")
+        if not isinstance(max_wait_ms, (int, float)) or max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be a non-negative number")
+        if not isinstance(num_workers, int) or num_workers <= 0:
+            raise ValueError("num_workers must be a positive integer")
+
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = threading.Event()
+        self._submit_lock = threading.Lock()       # close() cannot slip between submit()'s check and its put
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=window)
+        self._latencies_ms = deque(maxlen=window)
+        self._batches = 0
+        self._items = 0
+
+        self._workers = [threading.Thread(target=self._run, name=f"embed-batcher-{i}", daemon=True) for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the Future resolves to its float32 vector"""
+        if not isinstance(text, str) or not text:
+            raise ValueError("text must be a non-empty string")
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed.is_set():
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text: str, timeout: float | None = None) -> np.ndarray:
+        return self.submit(text).result(timeout=timeout)
+
+    def _gather(self, first) -> list:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Close requested: keep the sentinel for the other workers
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.put(None)
+                return
+
+            batch = self._gather(first)
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+                if vectors.shape[0] != len(texts):
+                    raise RuntimeError(f"embed_fn returned {vectors.shape[0]} vectors for {len(texts)} texts")
+            except Exception as e:
+                logging.error(f"Embedding batch of {len(texts)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(RuntimeError(f"Encoding failed: {e}"))
+                continue
+
+            done = time.perf_counter()
+            for idx, (_, future, submitted) in enumerate(batch):
+                future.set_result(vectors[idx])
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._latencies_ms.extend((done - submitted) * 1000.0 for _, _, submitted in batch)
+
+    def queue_depth(self) -> int:
+        """Requests waiting for a batch"""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """Queue depth, batch sizes and request latency percentiles over the recent window"""
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            latencies = list(self._latencies_ms)
+            batches, items = self._batches, self._items
+        return {
+            "queue_depth": self.queue_depth(),
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": items / batches if batches else 0.0,
+            "max_batch_size_seen": max(sizes) if sizes else 0,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+            },
+        }
+
+    def close(self):
+        """Finish queued requests, then stop the workers"""
+        with self._submit_lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            self._queue.put(None)      # behind every submitted request
+        for worker in self._workers:
+            worker.join()
+        # Only the stop sentinel can be left behind
+        while not self._queue.empty():
+            self._queue.get_nowait()
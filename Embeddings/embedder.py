@@ -1,31 +1,106 @@
 ## embedder.py
 from transformers import AutoTokenizer, AutoModel # pyright: ignore[reportMissingImports]
 import torch # pyright: ignore[reportMissingImports]
-from typing import List, Union
+import numpy as np
+from typing import List, Optional, Union
+import os
+import glob
+import hashlib
 import warnings
 import threading
 import logging
+from Embeddings.embedding_cache import EmbeddingCache
+from Embeddings.backends import build_backend
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
+def model_revision(model_path: str) -> str:
+    """
+    Identity of a local model folder: config plus weight file names, sizes and mtimes.
+    Changes whenever the model files are replaced, which invalidates cached embeddings.
+    """
+    digest = hashlib.sha256()
+    config_path = os.path.join(model_path, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, "rb") as f:
+            digest.update(f.read())
+    for pattern in ("*.safetensors", "*.bin", "*.onnx"):
+        for weights in sorted(glob.glob(os.path.join(model_path, pattern))):
+            stat = os.stat(weights)
+            digest.update(f"{os.path.basename(weights)}:{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
 class Embedder:
-    def __init__(self, model_path: str = "./Models/EmbeddingModels/mpnet-base-v2", device: int = 0):
+    def __init__(self, model_path: str = "./Models/EmbeddingModels/mpnet-base-v2", device: int = 0, batch_size: int = 32,
+                 cache_dir: Optional[str] = None, cache_max_entries: int = 100_000, cache_dtype: str = "float16",
+                 cache_flush_every: int = 10_000, max_concurrency: int = 1, backend: str = "torch", onnx_dir: str = "Cache/onnx", num_threads: int = 0):
         """
         Local embeddings generator
         :param model_path: Path to HuggingFace embedding model folder
         :param device: -1 for CPU, 0+ for GPU
+        :param batch_size: Default micro-batch size used by encode_batch
+        :param cache_dir: Folder of the persistent embedding cache used by encode_batch (None disables it)
+        :param cache_max_entries: LRU bound of the embedding cache
+        :param cache_dtype: "float16" (compact) or "float32" storage for cached vectors
+        :param cache_flush_every: New cache entries between index writes; flush_cache() writes the rest
+        :param max_concurrency: Forward passes allowed to run at once (inference in eval/no_grad mode is thread-safe)
+        :param backend: "torch", "torch-int8", "onnx" or "onnx-int8" (all but "torch" run on CPU)
+        :param onnx_dir: Folder of exported ONNX models
+        :param num_threads: CPU inference threads, 0 keeps the library default
         """
-        self.lock = threading.Lock()
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+        if not isinstance(max_concurrency, int) or max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive integer")
+
+        # Bounds concurrent forward passes; a plain lock when max_concurrency == 1
+        self.lock = threading.BoundedSemaphore(max_concurrency)
+        self.batch_size = batch_size
         try:
             self.device = torch.device("cuda" if device >= 0 and torch.cuda.is_available() else "cpu")
             self.tokenizer = AutoTokenizer.from_pretrained(model_path)
             self.model = AutoModel.from_pretrained(model_path)
             self.model.to(self.device)
             self.model.eval()
+            self.model_config = self.model.config
+            revision = model_revision(model_path)
+            self.backend = build_backend(backend, self.model, self.tokenizer, self.device,
+                                         model_key=f"{os.path.basename(os.path.normpath(model_path))}-{revision}",
+                                         onnx_dir=onnx_dir, num_threads=num_threads)
+            if backend != "torch":
+                self.device = torch.device("cpu")
+            # Only the backend's weights are kept (the fp32 model is not needed for ONNX inference)
+            self.model = getattr(self.backend, "model", None)
         except Exception as e:
             logging.error(f"Failed to load model from {model_path}: {e}")
             raise RuntimeError(f"Model loading failed: {e}")
 
+        # Longest input the model sees without truncation, excluding special tokens
+        max_length = min(self.tokenizer.model_max_length, getattr(self.model_config, "max_position_embeddings", self.tokenizer.model_max_length))
+        self.max_tokens = max_length - self.tokenizer.num_special_tokens_to_add()
+
+        self.cache = None
+        if cache_dir:
+            self.cache = EmbeddingCache(
+                cache_dir,
+                # Quantized backends give slightly different vectors, they get their own cache entries
+                model_key=f"{os.path.realpath(model_path)}@{revision}" + ("" if backend == "torch" else f"#{backend}"),
+                dim=self.model_config.hidden_size,
+                max_entries=cache_max_entries,
+                dtype=cache_dtype,
+                flush_every=cache_flush_every)
+
+    def _forward(self, inputs) -> torch.Tensor:
+        """Run the backend on tokenized inputs and mean-pool the last hidden state (caller holds self.lock)"""
+        with torch.no_grad():
+            last_hidden_state = self.backend(inputs)
+
+            # mean pooling (common for sentence embeddings)
+            attention_mask = inputs["attention_mask"].to(last_hidden_state.device).unsqueeze(-1)
+            embeddings = (last_hidden_state * attention_mask).sum(1) / attention_mask.sum(1)
+
+        return embeddings.cpu()
+
     def encode(self, texts: Union[str, List[str]]) -> torch.Tensor:
         """
         Generate embeddings for a list of texts or a single text
@@ -42,21 +117,91 @@ class Embedder:
 
         with self.lock:
             try:
-                with torch.no_grad():
-                    inputs = self.tokenizer(
-                        texts,
-                        padding=True,
-                        truncation=True,
-                        return_tensors="pt"
-                    ).to(self.device)
-
-                    outputs = self.model(**inputs)
-
-                    # mean pooling (common for sentence embeddings)
-                    attention_mask = inputs["attention_mask"].unsqueeze(-1)
-                    embeddings = (outputs.last_hidden_state * attention_mask).sum(1) / attention_mask.sum(1)
-
-                return embeddings.cpu()
+                inputs = self.tokenizer(
+                    texts,
+                    padding=True,
+                    truncation=True,
+                    return_tensors="pt"
+                )
+                return self._forward(inputs)
             except Exception as e:
                 logging.error(f"Error during encoding: {e}")
                 raise RuntimeError(f"Encoding failed: {e}")
+
+    def encode_batch(self, texts: List[str], batch_size: Optional[int] = None, use_cache: bool = True) -> np.ndarray:
+        """
+        Generate embeddings for many texts using length-sorted micro-batches.
+        Texts are tokenized once, sorted by token count so each micro-batch pads to a
+        similar length, and the lock is held per micro-batch only so other callers can interleave.
+        Texts found in the embedding cache are not encoded again.
+        :param texts: List of text strings
+        :param batch_size: Micro-batch size, defaults to self.batch_size
+        :param use_cache: False bypasses the embedding cache (e.g. for one-off query texts)
+        :return: Contiguous float32 array of shape (len(texts), embedding_dim) in input order
+        """
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise ValueError("texts must be a list of strings")
+        if not texts:
+            raise ValueError("texts cannot be empty")
+        batch_size = self.batch_size if batch_size is None else batch_size
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+
+        if self.cache is None or not use_cache:
+            return self._encode_batch_uncached(texts, batch_size)
+
+        hits, missing = self.cache.get_many(texts)
+        result = np.empty((len(texts), self.cache.dim), dtype=np.float32)
+        for idx, vector in hits.items():
+            result[idx] = vector
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = self._encode_batch_uncached(missing_texts, batch_size)
+            result[missing] = vectors
+            self.cache.put_many(missing_texts, vectors)
+            self.cache.flush_if_due()
+        return result
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Token counts of texts without special tokens (one batched tokenizer call), used to size chunks"""
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the embedding cache (empty when caching is disabled)"""
+        return {} if self.cache is None else self.cache.stats()
+
+    def flush_cache(self):
+        """Write pending embedding cache entries to disk"""
+        if self.cache is not None:
+            self.cache.flush()
+
+    def close(self):
+        """Flush the embedding cache and release its writer lock"""
+        if self.cache is not None:
+            self.cache.close()
+
+    def _encode_batch_uncached(self, texts: List[str], batch_size: int) -> np.ndarray:
+        try:
+            encoded = self.tokenizer(texts, truncation=True)
+            input_ids = encoded["input_ids"]
+            order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+
+            result = None
+            for start in range(0, len(order), batch_size):
+                batch_idx = order[start:start + batch_size]
+                features = [{key: encoded[key][i] for key in encoded.keys()} for i in batch_idx]
+                inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt")
+
+                with self.lock:
+                    embeddings = self._forward(inputs)
+
+                if result is None:
+                    result = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+                result[batch_idx] = embeddings.numpy()
+
+            return result
+        except Exception as e:
+            logging.error(f"Error during batch encoding: {e}")
+            raise RuntimeError(f"Batch encoding failed: {e}")
@@ -0,0 +1,218 @@
+## embedding_cache.py
+
+"""
+Persistent on-disk embedding cache.
+- Keyed by (model identity, normalized text hash), so the same text is never encoded twice per model.
+- Vectors live in a memory-mapped float16/float32 file, next to the key digest of every slot;
+  a read only counts when the slot still holds the key it was looked up with.
+- The LRU index lives in a small .npz file, rewritten by flush(), or by flush_if_due() once
+  flush_every new entries are pending.
+- Size-bounded: the least recently used entry is evicted once max_entries is reached. Its slot
+  is reused only after an index without it has been saved (flush_every spare slots cover the gap).
+- One writer per cache folder (exclusive file lock); other instances on the same folder,
+  e.g. a bulk ingest next to the API service, read a snapshot and do not store vectors.
+Thread-safe via an instance lock.
+"""
+
+import os
+import hashlib
+import threading
+import logging
+import numpy as np
+from typing import Dict, List, Tuple
+from Utils.cache import LRUCache
+from Utils.filelock import FileLock
+
+_INDEX_FILE = "index.npz"
+_VECTORS_FILE = "vectors.bin"
+_KEYS_FILE = "keys.bin"
+_LOCK_FILE = "writer.lock"
+_KEY_SIZE = 16
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form used for cache keys"""
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """
+    Usage:
+        cache = EmbeddingCache("Cache/embeddings", model_key="mpnet@<revision>", dim=768)
+        hits, missing = cache.get_many(texts)    # hits: {index: vector}, missing: [index, ...]
+        cache.put_many([texts[i] for i in missing], vectors)
+        cache.flush_if_due()                      # cheap, writes the index every flush_every entries
+        cache.flush()                             # at the end of an ingest / on shutdown
+        cache.close()
+    """
+    def __init__(self, cache_dir: str, model_key: str, dim: int, max_entries: int = 100_000, dtype: str = "float16",
+                 flush_every: int = 10_000):
+        if not isinstance(cache_dir, str) or not cache_dir:
+            raise ValueError("cache_dir must be a non-empty string")
+        if not isinstance(model_key, str) or not model_key:
+            raise ValueError("model_key must be a non-empty string")
+        if not isinstance(dim, int) or dim <= 0:
+            raise ValueError("dim must be a positive integer")
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+        if dtype not in ("float16", "float32"):
+            raise ValueError("dtype must be 'float16' or 'float32'")
+        if not isinstance(flush_every, int) or flush_every <= 0:
+            raise ValueError("flush_every must be a positive integer")
+
+        self.model_key = model_key
+        self.dim = dim
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.dir = os.path.join(cache_dir, hashlib.blake2b(model_key.encode("utf-8"), digest_size=8).hexdigest())
+        self.writable = False
+        self._writer_lock = FileLock(os.path.join(self.dir, _LOCK_FILE))
+        self._vectors = None
+        self._keys = None
+        self._pending = 0           # entries written since the last flush
+
+        # Slots of evicted entries wait in _released until the saved index no longer points at them
+        self._free: List[int] = []
+        self._released: List[int] = []
+        self._lru = LRUCache(max_entries=max_entries, on_evict=lambda key, slot: self._released.append(slot))
+
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            self.writable = self._writer_lock.acquire(blocking=False)
+            if not self.writable:
+                logging.info(f"Embedding cache {self.dir} is in use by another instance, opening it read-only")
+            self._open()
+        except Exception as e:
+            logging.error(f"Failed to open embedding cache in {self.dir}: {e}")
+            raise RuntimeError(f"Embedding cache initialization failed: {e}")
+
+    def _open(self):
+        index_path = os.path.join(self.dir, _INDEX_FILE)
+        vectors_path = os.path.join(self.dir, _VECTORS_FILE)
+        keys_path = os.path.join(self.dir, _KEYS_FILE)
+        capacity = self.max_entries + self.flush_every
+
+        index = None
+        if all(os.path.exists(path) for path in (index_path, vectors_path, keys_path)):
+            try:
+                index = np.load(index_path)
+                meta_ok = (int(index["dim"]) == self.dim and str(index["dtype"]) == self.dtype.name
+                           and int(index["max_entries"]) == self.max_entries and int(index["capacity"]) == capacity)
+                if not meta_ok:
+                    logging.info(f"Embedding cache layout changed, starting a fresh cache in {self.dir}")
+                    index = None
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable embedding cache index {index_path}: {e}")
+                index = None
+
+        if index is None and not self.writable:
+            return          # nothing readable yet, every lookup misses
+        mode = ("r+" if self.writable else "r") if index is not None else "w+"
+        self._vectors = np.memmap(vectors_path, dtype=self.dtype, mode=mode, shape=(capacity, self.dim))
+        self._keys = np.memmap(keys_path, dtype=np.uint8, mode=mode, shape=(capacity, _KEY_SIZE))
+
+        used = set()
+        if index is not None:
+            for key, slot in zip(index["keys"], index["slots"]):
+                slot = int(slot)
+                # Slots rewritten after the index was saved (e.g. before a crash) no longer hold this key
+                if slot < capacity and slot not in used and self._keys[slot].tobytes() == key.tobytes():
+                    self._lru.put(key.tobytes(), slot)
+                    used.add(slot)
+        self._free = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.model_key}\0{normalize_text(text)}".encode("utf-8"), digest_size=_KEY_SIZE).digest()
+
+    def _read(self, slot: int, key: bytes):
+        """Vector of slot if it holds key, else None (the key is re-checked after the copy, a writer clears it first)"""
+        if self._keys[slot].tobytes() != key:
+            return None
+        vector = np.array(self._vectors[slot], dtype=np.float32)
+        return vector if self._keys[slot].tobytes() == key else None
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """Look up texts; returns ({position: float32 vector} for hits, [positions of misses])"""
+        hits: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        with self.lock:
+            for idx, text in enumerate(texts):
+                key = self.key(text)
+                slot = self._lru.peek(key)
+                vector = self._read(slot, key) if slot is not None else None
+                if vector is None:
+                    if slot is not None:
+                        self._lru.pop(key)
+                    self._lru.get(key)          # counts the miss
+                    missing.append(idx)
+                else:
+                    self._lru.get(key)          # counts the hit and refreshes recency
+                    hits[idx] = vector
+        return hits, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store one vector per text, evicting least recently used entries when full (no-op when read-only)"""
+        if len(texts) != len(vectors):
+            raise ValueError("Length of texts and vectors must match.")
+        if not self.writable:
+            return
+        with self.lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                slot = self._lru.peek(key)
+                if slot is None:
+                    if not self._free:
+                        # Every spare slot waits for an index save, save one to recycle them
+                        self._flush_locked()
+                    slot = self._free.pop()
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._lru.put(key, slot)
+            self._pending += len(texts)
+
+    def flush_if_due(self):
+        """flush() once at least flush_every entries were written since the last one"""
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Persist vectors and the LRU index (atomic index replace)"""
+        with self.lock:
+            if not self._pending:
+                return
+            try:
+                self._flush_locked()
+            except Exception as e:
+                logging.error(f"Failed to flush embedding cache {self.dir}: {e}")
+                raise RuntimeError(f"Embedding cache flush failed: {e}")
+
+    def _flush_locked(self):
+        self._vectors.flush()
+        self._keys.flush()
+        entries = self._lru.items()
+        keys = np.frombuffer(b"".join(k for k, _ in entries), dtype=np.uint8).reshape(-1, _KEY_SIZE)
+        slots = np.array([slot for _, slot in entries], dtype=np.int64)
+        tmp_path = os.path.join(self.dir, _INDEX_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, slots=slots, dim=self.dim, dtype=self.dtype.name, max_entries=self.max_entries,
+                     capacity=len(self._keys))
+        os.replace(tmp_path, os.path.join(self.dir, _INDEX_FILE))
+        # The saved index no longer references evicted entries, their slots can be reused
+        self._free.extend(self._released)
+        self._released.clear()
+        self._pending = 0
+
+    def close(self):
+        """Flush and release the writer lock"""
+        if self.writable:
+            self.flush()
+        with self.lock:
+            self._writer_lock.release()
+            self.writable = False
+
+    def stats(self) -> dict:
+        stats = self._lru.stats()
+        stats["bytes"] = stats["entries"] * self.dim * self.dtype.itemsize
+        stats["writable"] = self.writable
+        return stats
@@ -3,16 +3,19 @@ Image understanding via local captioning (BLIP).
 - No network calls required after first install of models.
 - Thread-safe lazy loader with a lock.
 - Works on CPU or GPU (auto-detect).
+- Captions in batches; tiny and duplicate images are skipped (see image_filter.py).
 """
 
 from typing import List, Dict
-from PIL import Image
 import torch # pyright: ignore[reportMissingImports]
 import threading
 import logging
 
 from transformers import BlipProcessor, BlipForConditionalGeneration  # type: ignore
 
+from Ingestion.image_filter import ImageFilter, decoding_kwargs
+from Ingestion.image_store import ImageSource, image_key, is_image_source, open_image
+
 class BlipCaptioner:
     """
     Thread-safe, lazy-initialized BLIP captioner.
@@ -22,8 +25,14 @@ class BlipCaptioner:
     """
     _init_lock = threading.Lock()
 
-    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base", device: str | None = None):
+    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base", device: str | None = None,
+                 batch_size: int = 8, preset: str = "fast", image_filter: ImageFilter | None = None):
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
         self.model_name = model_name
+        self.batch_size = batch_size
+        self.generate_kwargs = decoding_kwargs(preset)
+        self.image_filter = image_filter or ImageFilter()
         self._processor = None
 
         self._model = None
@@ -50,49 +59,62 @@ class BlipCaptioner:
                     self._model.eval()
 
     def caption_images(
-        self, image_paths: List[str],
+        self, image_paths: List[ImageSource],
         max_new_tokens: int = 80,
-        num_beams: int = 10,
-        repetition_penalty: float = 1.8) -> Dict[str, str]:
+        num_beams: int | None = None,
+        repetition_penalty: float | None = None) -> Dict[str, str]:
 
         """
         max_new_tokens - allow longer captions
-        num_beams - beam search for higher quality
-        Returns: dict[image_path] -> caption
+        num_beams / repetition_penalty - override the decoding preset (None keeps the preset value)
+        image_paths - file paths or in-memory ExtractedImage objects
+        Returns: dict[image_path or image name] -> caption, without images skipped by the image filter
         Robust to missing/corrupt files (caption will be an error string).
         """
-        if not isinstance(image_paths, list) or not all(isinstance(p, str) for p in image_paths):
-            raise ValueError("image_paths must be a list of strings")
+        if not isinstance(image_paths, list) or not all(is_image_source(p) for p in image_paths):
+            raise ValueError("image_paths must be a list of paths or ExtractedImage objects")
         if not image_paths:
             return {}
 
+        selected, stats = self.image_filter.select(image_paths)
+        logging.info(f"Captioning {len(selected)} of {len(image_paths)} images: {stats}")
+
+        generate_kwargs = dict(self.generate_kwargs, max_new_tokens=max_new_tokens)
+        if num_beams is not None:
+            generate_kwargs["num_beams"] = num_beams
+        if repetition_penalty is not None:
+            generate_kwargs["repetition_penalty"] = repetition_penalty
+
         self._ensure_loaded()
         results: Dict[str, str] = {}
 
-        with self._caption_lock:
-            for p in image_paths:
-                try:
-                    image = Image.open(p).convert("RGB")
-                except Exception as e:
-                    logging.error(f"Error opening image {p}: {e}")
-                    results[p] = f"[error opening image: {e}]"
-                    continue
+        # Decode up front so a corrupt file only costs its own caption
+        opened = []
+        for source in selected:
+            p = image_key(source)
+            try:
+                opened.append((p, open_image(source).convert("RGB")))
+            except Exception as e:
+                logging.error(f"Error opening image {p}: {e}")
+                results[p] = f"[error opening image: {e}]"
 
+        with self._caption_lock:
+            for start in range(0, len(opened), self.batch_size):
+                batch = opened[start:start + self.batch_size]
                 try:
-                    inputs = self._processor(images=image, return_tensors="pt").to(self.device)
+                    inputs = self._processor(images=[image for _, image in batch], return_tensors="pt").to(self.device)
 
                     with torch.no_grad():
-                        out = self._model.generate(
-                            **inputs,
-                            max_new_tokens=max_new_tokens,
-                            num_beams=num_beams,
-                            repetition_penalty=repetition_penalty)
+                        out = self._model.generate(**inputs, **generate_kwargs)
 
-                    caption = self._processor.batch_decode(out, skip_special_tokens=True)[0].strip()
-                    results[p] = caption
+                    captions = self._processor.batch_decode(out, skip_special_tokens=True)
+                    for (p, _), caption in zip(batch, captions):
+                        results[p] = caption.strip()
 
                 except Exception as e:
-                    logging.error(f"Error captioning image {p}: {e}")
-                    results[p] = f"[captioning error: {e}]"
+                    logging.error(f"Error captioning batch starting at {batch[0][0]}: {e}")
+                    for p, _ in batch:
+                        results[p] = f"[captioning error: {e}]"
 
-        return results
+        # Keep input order (opening errors were recorded first)
+        return {image_key(source): results[image_key(source)] for source in selected}
@@ -4,13 +4,28 @@ from typing import List, Dict
 import threading
 import logging
 
+from Ingestion.image_filter import ImageFilter, decoding_kwargs
+from Ingestion.image_store import ImageSource, image_key, is_image_source, open_image
+
 class Image_Captioner:
-    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base", device: int = 0):
+    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base", device: int = 0,
+                 batch_size: int = 8, preset: str = "fast", max_new_tokens: int = 80,
+                 image_filter: ImageFilter | None = None):
         """
         Initialize the image captioning model.
         :param model_name: HuggingFace model name (BLIP, BLIP-2, Florence-2, PaliGemma, etc.)
         :param device: -1 for CPU, 0+ for GPU device
+        :param batch_size: images per generate call
+        :param preset: "fast" (greedy) or "quality" (beam search)
+        :param image_filter: size / duplicate filter applied before captioning (default ImageFilter())
         """
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.generate_kwargs = decoding_kwargs(preset)
+        self.image_filter = image_filter or ImageFilter()
+
         import warnings
         warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
         warnings.filterwarnings("ignore", category=UserWarning, module="transformers")
@@ -23,25 +38,58 @@ class Image_Captioner:
             logging.error(f"Failed to load model {model_name}: {e}")
             raise RuntimeError(f"Model loading failed: {e}")
 
-    def caption(self, image_paths: List[str], prompt: str = "a detailed description of this image") -> Dict[str, str]:
+    def caption(self, image_paths: List[ImageSource], prompt: str = "a detailed description of this image") -> Dict[str, str]:
         """
-        Generate captions for a list of image paths with tuned decoding parameters.
+        Generate captions for a list of image paths or in-memory ExtractedImage objects with
+        tuned decoding parameters. Results are keyed by path / image name; images skipped by
+        the image filter (too small, duplicates) are left out.
         """
-        if not isinstance(image_paths, list) or not all(isinstance(p, str) for p in image_paths):
-            raise ValueError("image_paths must be a list of strings")
+        if not isinstance(image_paths, list) or not all(is_image_source(p) for p in image_paths):
+            raise ValueError("image_paths must be a list of paths or ExtractedImage objects")
         if not image_paths:
             return {}
 
+        # Tiny and repeated images (bullets, logos on every page) are not captioned at all
+        selected, stats = self.image_filter.select(image_paths)
+        logging.info(f"Captioning {len(selected)} of {len(image_paths)} images: {stats}")
+
+        # Decode once in memory; the pipeline receives PIL images, never re-reads files
         captions = {}
+        opened = []
+        for source in selected:
+            try:
+                opened.append((image_key(source), open_image(source).convert("RGB")))
+            except Exception as e:
+                logging.error(f"Error opening image {image_key(source)}: {e}")
+                captions[image_key(source)] = f"Error: {str(e)}"
+
         with self.lock:
-            for img_path in image_paths:
+            for start in range(0, len(opened), self.batch_size):
+                batch = opened[start:start + self.batch_size]
                 try:
-                    result = self.pipe(
-                        img_path,
-                        max_new_tokens=80,
+                    results = self.pipe(
+                        [image for _, image in batch],
+                        batch_size=len(batch),
+                        max_new_tokens=self.max_new_tokens,
+                        generate_kwargs=self.generate_kwargs,
                     )
-                    captions[img_path] = result[0]['generated_text']
+                    for (key, _), result in zip(batch, results):
+                        captions[key] = result[0]['generated_text']
                 except Exception as e:
-                    logging.error(f"Error captioning image {img_path}: {e}")
-                    captions[img_path] = f"Error: {str(e)}"
-        return captions
+                    # One bad image fails the whole batch; retry image by image to isolate it
+                    logging.warning(f"Batch captioning failed, retrying images one by one: {e}")
+                    for key, image in batch:
+                        captions[key] = self._caption_one(key, image)
+        return {image_key(source): captions[image_key(source)] for source in selected}
+
+    def _caption_one(self, key: str, image) -> str:
+        try:
+            result = self.pipe(
+                image,
+                max_new_tokens=self.max_new_tokens,
+                generate_kwargs=self.generate_kwargs,
+            )
+            return result[0]['generated_text']
+        except Exception as e:
+            logging.error(f"Error captioning image {key}: {e}")
+            return f"Error: {str(e)}"
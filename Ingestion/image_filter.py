@@ -0,0 +1,101 @@
+# Ingestion/image_filter.py
+"""
+Pre-captioning image selection shared by Image_Captioner and BlipCaptioner.
+- drops images below a minimum width/height/area (bullets, rules, spacer pixels)
+- drops byte-identical copies (SHA-256 of the encoded image)
+- drops perceptual duplicates (64-bit difference hash within a Hamming distance),
+  e.g. a logo re-encoded on every page
+Also holds the decoding presets used by both captioners.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+import hashlib
+import logging
+
+from Ingestion.image_store import ImageSource, image_bytes, image_key, open_image
+
+# "fast": greedy decoding, one forward pass per token
+# "quality": beam search; several times slower on CPU
+DECODING_PRESETS: Dict[str, dict] = {
+    "fast": {"num_beams": 1, "do_sample": False},
+    "quality": {"num_beams": 5, "do_sample": False, "repetition_penalty": 1.8},
+}
+
+def decoding_kwargs(preset: str) -> dict:
+    """Generate kwargs for a decoding preset name"""
+    if preset not in DECODING_PRESETS:
+        raise ValueError(f"preset must be one of {sorted(DECODING_PRESETS)}")
+    return dict(DECODING_PRESETS[preset])
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: compares neighbouring pixels of a (hash_size+1) x hash_size grayscale thumbnail"""
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+class ImageFilter:
+    """
+    Usage:
+        keep, stats = ImageFilter(min_area=4096).select(images)
+    """
+    def __init__(self, min_width: int = 32, min_height: int = 32, min_area: int = 4096,
+                 dedupe: bool = True, hash_distance: int = 4):
+        """
+        :param min_width / min_height / min_area: images smaller than any of these are skipped
+        :param dedupe: skip byte-identical and perceptual-hash duplicates
+        :param hash_distance: max Hamming distance between dHashes counted as the same image (0-64)
+        """
+        if min(min_width, min_height, min_area) < 0:
+            raise ValueError("minimum image sizes must be non-negative")
+        if not 0 <= hash_distance <= 64:
+            raise ValueError("hash_distance must be between 0 and 64")
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_area = min_area
+        self.dedupe = dedupe
+        self.hash_distance = hash_distance
+
+    def select(self, images: List[ImageSource]) -> Tuple[List[ImageSource], Dict[str, int]]:
+        """
+        Accepts file paths and ExtractedImage objects.
+        Returns (images worth captioning in input order, counts of kept / too_small / duplicate / unreadable).
+        Unreadable images are kept so the captioner reports the error for them.
+        """
+        keep: List[str] = []
+        stats = {"kept": 0, "too_small": 0, "duplicate": 0, "unreadable": 0}
+        seen_digests = set()
+        seen_hashes: List[int] = []
+
+        for source in images:
+            digest: Optional[str] = None
+            try:
+                if self.dedupe:
+                    digest = hashlib.sha256(image_bytes(source)).hexdigest()
+                    if digest in seen_digests:
+                        stats["duplicate"] += 1
+                        continue
+                with open_image(source) as image:
+                    width, height = image.size
+                    if width < self.min_width or height < self.min_height or width * height < self.min_area:
+                        stats["too_small"] += 1
+                        continue
+                    if self.dedupe:
+                        image_hash = dhash(image)
+                        if any(bin(image_hash ^ other).count("1") <= self.hash_distance for other in seen_hashes):
+                            seen_digests.add(digest)
+                            stats["duplicate"] += 1
+                            continue
+                        seen_hashes.append(image_hash)
+                        seen_digests.add(digest)
+            except Exception as e:
+                logging.warning(f"Could not inspect image {image_key(source)}: {e}")
+                stats["unreadable"] += 1
+            keep.append(source)
+
+        stats["kept"] = len(keep)
+        return keep, stats
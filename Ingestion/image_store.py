@@ -0,0 +1,79 @@
+# Ingestion/image_store.py
+"""
+In-memory handling of images extracted from PDFs.
+The parser keeps each image's original encoded bytes (JPEG, PNG, ...) in memory and hands
+them to OCR and the captioners directly, so nothing is re-encoded, written and read back.
+Only once a document's images exceed a memory limit are further images spilled, still
+unmodified, into the job's private temp dir.
+"""
+
+from dataclasses import dataclass
+from typing import Union
+from PIL import Image
+import io
+import os
+
+@dataclass
+class ExtractedImage:
+    name: str                   # unique within the document, e.g. "page3_img0"
+    page: int
+    ext: str                    # encoded format: "png", "jpeg", ...
+    width: int
+    height: int
+    data: bytes | None = None   # encoded bytes when held in memory
+    path: str | None = None     # file path when spilled to disk
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) if self.data is not None else 0
+
+# Image-consuming functions accept plain file paths as well as extracted images
+ImageSource = Union[str, ExtractedImage]
+
+def is_image_source(image) -> bool:
+    return isinstance(image, (str, ExtractedImage))
+
+def image_key(image: ImageSource) -> str:
+    """Key used in OCR / caption result dicts: the file path, or the extracted image's name"""
+    return image if isinstance(image, str) else image.name
+
+def image_bytes(image: ImageSource) -> bytes:
+    if isinstance(image, ExtractedImage) and image.data is not None:
+        return image.data
+    path = image if isinstance(image, str) else image.path
+    with open(path, "rb") as f:
+        return f.read()
+
+def open_image(image: ImageSource) -> Image.Image:
+    """Open without touching the disk when the bytes are in memory (PIL decodes lazily)"""
+    if isinstance(image, ExtractedImage):
+        if image.data is not None:
+            return Image.open(io.BytesIO(image.data))
+        return Image.open(image.path)
+    if not os.path.exists(image):
+        raise FileNotFoundError(f"Image not found: {image}")
+    return Image.open(image)
+
+class ImageSpool:
+    """
+    Keeps extracted images in memory up to memory_limit bytes per document, then writes the
+    rest to output_dir. Not thread-safe: one spool per parsed document.
+    """
+    def __init__(self, output_dir: str, memory_limit: int = 256 * 1024 * 1024):
+        if not isinstance(memory_limit, int) or memory_limit < 0:
+            raise ValueError("memory_limit must be a non-negative integer")
+        self.output_dir = output_dir
+        self.memory_limit = memory_limit
+        self.in_memory_bytes = 0
+        self.spilled = 0
+
+    def add(self, name: str, page: int, ext: str, width: int, height: int, data: bytes) -> ExtractedImage:
+        if self.in_memory_bytes + len(data) <= self.memory_limit:
+            self.in_memory_bytes += len(data)
+            return ExtractedImage(name=name, page=page, ext=ext, width=width, height=height, data=data)
+
+        path = os.path.join(self.output_dir, f"{name}.{ext}")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.spilled += 1
+        return ExtractedImage(name=name, page=page, ext=ext, width=width, height=height, path=path)
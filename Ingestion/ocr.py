@@ -1,43 +1,185 @@
 """
 OCR extraction from images.
 Uses pytesseract + OpenCV.
+- images are preprocessed with OpenCV: grayscale, downscale of huge images, Otsu binarization, deskew
+- a cheap text-likelihood score keeps photos and charts away from tesseract
+- images are OCR'd in parallel; each image runs its own tesseract process (limited to one
+  OpenMP thread through that process's environment only), so a thread pool sized to the cores
+  keeps them all busy
+- per-image timings are returned and aggregated in stats()
 """
 
 import pytesseract
-from PIL import Image
+import numpy as np
+import cv2
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import shlex
+import shutil
+import subprocess
+import threading
 import logging
 
-def run_ocr_on_images(image_paths: List[str]) -> Dict[str, str]:
+from Ingestion.image_store import ImageSource, image_key, is_image_source, open_image
+
+def preprocess_for_ocr(image, max_side: int = 2500) -> np.ndarray:
+    """PIL image -> deskewed, binarized grayscale array (black text on white)"""
+    gray = np.asarray(image.convert("L"))
+    height, width = gray.shape
+    if max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) < binary.size / 2:     # light text on dark background
+        binary = cv2.bitwise_not(binary)
+    return deskew(binary)
+
+def deskew(binary: np.ndarray, max_angle: float = 15.0) -> np.ndarray:
+    """Rotate so that text lines are horizontal; angles outside +-max_angle are left alone"""
+    coords = cv2.findNonZero(cv2.bitwise_not(binary))
+    if coords is None or len(coords) < 50:
+        return binary
+    # OpenCV versions disagree on the angle range ([-90, 0) vs [0, 90)); fold it into [-45, 45)
+    angle = (cv2.minAreaRect(coords)[-1] + 45) % 90 - 45
+    if abs(angle) < 0.5 or abs(angle) > max_angle:
+        return binary
+    height, width = binary.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST, borderValue=255)
+
+def text_likelihood(binary: np.ndarray) -> float:
+    """
+    0..1 score of how much a binarized image looks like printed text: mostly background,
+    with many small glyph-sized connected components. Photos score low on both.
+    """
+    height, width = binary.shape
+    background = np.count_nonzero(binary) / binary.size
+    if background < 0.6:
+        return 0.0
+    count, _, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_not(binary), connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = np.count_nonzero((heights >= 6) & (heights <= max(12, height // 8)) & (areas >= 10))
+    glyph_score = min(1.0, glyphs / 40.0)
+    return round(min(1.0, (background - 0.6) / 0.3) * glyph_score, 3)
+
+class OCREngine:
+    """
+    Usage:
+        engine = OCREngine(workers=4)
+        results = engine.ocr_images(images)   # key -> {"text", "seconds", "text_likelihood", "skipped"}
     """
-    Run OCR on a list of image files.
+    def __init__(self, workers: int = 0, max_side: int = 2500, min_text_likelihood: float = 0.2,
+                 lang: str = "eng", tesseract_config: str = "--oem 1 --psm 3"):
+        """
+        :param workers: parallel tesseract processes (0 = one per CPU)
+        :param max_side: larger images are downscaled to this many pixels on the long side
+        :param min_text_likelihood: images scoring below this are not OCR'd (0 OCRs everything)
+        """
+        workers = workers or os.cpu_count() or 1
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("workers must be a positive integer")
+        self.max_side = max_side
+        self.min_text_likelihood = min_text_likelihood
+        self.lang = lang
+        self.tesseract_config = tesseract_config
+        # One tesseract thread per process, parallelism comes from the pool. Only the tesseract
+        # processes get the limit: torch/ONNX in this process keep their own threading
+        self._tesseract_env = dict(os.environ)
+        self._tesseract_env.setdefault("OMP_THREAD_LIMIT", "1")
+        self.available = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+        if not self.available:
+            logging.warning("tesseract executable not found, OCR is disabled")
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        self.lock = threading.Lock()
+        self._stats = {"images": 0, "ocr_runs": 0, "skipped_non_text": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    def _ocr_one(self, source: ImageSource) -> dict:
+        start = time.perf_counter()
+        result = {"text": "", "text_likelihood": None, "skipped": None}
+        try:
+            with open_image(source) as image:
+                binary = preprocess_for_ocr(image, self.max_side)
+            score = text_likelihood(binary)
+            result["text_likelihood"] = score
+            if score < self.min_text_likelihood:
+                result["skipped"] = "non_text"
+            else:
+                result["text"] = self._tesseract(binary)
+        except FileNotFoundError:
+            logging.warning(f"File not found: {image_key(source)}")
+            result["text"] = "[File not found]"
+            result["skipped"] = "error"
+        except Exception as e:
+            logging.error(f"Error during OCR on {image_key(source)}: {e}")
+            result["text"] = f"[Error: {str(e)}]"
+            result["skipped"] = "error"
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        return result
+
+    def _tesseract(self, binary: np.ndarray) -> str:
+        """Run tesseract on a binarized image (PNG through stdin, text through stdout)"""
+        ok, png = cv2.imencode(".png", binary)
+        if not ok:
+            raise RuntimeError("PNG encoding failed")
+        args = [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout", "-l", self.lang, *shlex.split(self.tesseract_config, posix=os.name != "nt")]
+        proc = subprocess.run(args, input=png.tobytes(), capture_output=True, env=self._tesseract_env)
+        if proc.returncode:
+            raise RuntimeError(f"tesseract exited with {proc.returncode}: {proc.stderr.decode('utf-8', 'replace').strip()}")
+        return proc.stdout.decode("utf-8", "replace").strip()
+
+    def ocr_images(self, images: List[ImageSource]) -> Dict[str, dict]:
+        """OCR images in parallel; returns key -> {"text", "seconds", "text_likelihood", "skipped"} in input order"""
+        if not isinstance(images, list) or not all(is_image_source(p) for p in images):
+            raise ValueError("images must be a list of paths or ExtractedImage objects")
+        if not images or not self.available:
+            return {}
+
+        results = dict(zip((image_key(source) for source in images), self.pool.map(self._ocr_one, images)))
+        with self.lock:
+            for result in results.values():
+                self._stats["images"] += 1
+                self._stats["seconds"] += result["seconds"]
+                self._stats["max_seconds"] = max(self._stats["max_seconds"], result["seconds"])
+                if result["skipped"] == "non_text":
+                    self._stats["skipped_non_text"] += 1
+                elif result["skipped"] == "error":
+                    self._stats["errors"] += 1
+                else:
+                    self._stats["ocr_runs"] += 1
+        logging.info("OCR timings: " + ", ".join(f"{key}={result['seconds']}s" for key, result in results.items()))
+        return results
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self._stats, seconds=round(self._stats["seconds"], 3))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+def run_ocr_on_images(image_paths: List[ImageSource], engine: OCREngine | None = None) -> Dict[str, str]:
+    """
+    Run OCR on a list of image files or in-memory extracted images.
 
     Args:
-        image_paths (List[str]): List of image file paths.
+        image_paths (List[ImageSource]): List of image file paths or ExtractedImage objects.
+        engine (OCREngine): engine to use; a temporary one is created when omitted.
 
     Returns:
-        Dict[str, str]: Dictionary mapping image_path -> extracted_text
+        Dict[str, str]: Dictionary mapping image_path (or image name) -> extracted_text
     """
-    if not isinstance(image_paths, list) or not all(isinstance(p, str) for p in image_paths):
-        raise ValueError("image_paths must be a list of strings")
+    if not isinstance(image_paths, list) or not all(is_image_source(p) for p in image_paths):
+        raise ValueError("image_paths must be a list of paths or ExtractedImage objects")
     if not image_paths:
         return {}
 
-    ocr_results = {}
-
-    for img_path in image_paths:
-        if not os.path.exists(img_path):
-            logging.warning(f"File not found: {img_path}")
-            ocr_results[img_path] = "[File not found]"
-            continue
-
-        try:
-            img = Image.open(img_path)
-            text = pytesseract.image_to_string(img)
-            ocr_results[img_path] = text.strip()
-        except Exception as e:
-            logging.error(f"Error during OCR on {img_path}: {e}")
-            ocr_results[img_path] = f"[Error: {str(e)}]"
-
-    return ocr_results
+    owned = engine is None
+    engine = engine or OCREngine()
+    try:
+        return {key: result["text"] for key, result in engine.ocr_images(image_paths).items()}
+    finally:
+        if owned:
+            engine.close()
@@ -1,62 +1,218 @@
 """
 PDF parsing utilities.
-Extract text, tables, and images from PDFs.
+Extract text, tables, and images from PDFs in a single pass per page:
+- PyMuPDF reads text and images of every page
+- a cheap ruling-line check decides whether a page can hold a table, and only those
+  pages are opened with pdfplumber (whose default table finder needs ruling lines too)
+- large documents are split into page ranges parsed by a process pool
+- pages without a text layer (scans) are rendered so they can be OCR'd
+Images are returned as in-memory ExtractedImage objects (see image_store.py).
 Thread-safe since each request is independent.
 """
 
 import os
+import shutil
 import fitz # type: ignore
 import pdfplumber # type: ignore
-import uuid
+import tempfile
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from Utils.utils import make_pdf_id
+from Ingestion.image_store import ImageSpool
 
-def parse_pdf(pdf_path: str, temp_dir: str = "TempData"):
+# Encoded formats handed on as-is; anything else (JBIG2, JPX, CCITT...) is converted to PNG
+PIL_FORMATS = {"png", "jpeg", "jpg", "bmp", "gif", "tiff", "tif"}
+
+def _extract_image(doc, xref: int):
+    """Return (ext, width, height, encoded bytes) of an embedded image without re-encoding when possible"""
+    info = doc.extract_image(xref)
+    if info and info.get("ext", "").lower() in PIL_FORMATS:
+        return info["ext"].lower(), info["width"], info["height"], info["image"]
+
+    pix = fitz.Pixmap(doc, xref)
+    if pix.n - pix.alpha >= 4:      # CMYK cannot be written as PNG
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return "png", pix.width, pix.height, pix.tobytes("png")
+
+def page_may_have_table(page, tolerance: float = 1.0) -> bool:
+    """
+    True when the page has at least two horizontal and two vertical ruling edges
+    (lines, rectangles or quads), the minimum pdfplumber's "lines" strategy needs to find a table.
+    """
+    horizontal = vertical = 0
+    for drawing in page.get_cdrawings():
+        for item in drawing["items"]:
+            kind = item[0]
+            if kind == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(y0 - y1) <= tolerance:
+                    horizontal += 1
+                elif abs(x0 - x1) <= tolerance:
+                    vertical += 1
+            elif kind in ("re", "qu"):
+                # A rectangle contributes two edges in each direction
+                horizontal += 2
+                vertical += 2
+            if horizontal >= 2 and vertical >= 2:
+                return True
+    return False
+
+def _iter_page_range(pdf_path: str, start: int, stop: int, detect_tables: bool = True, scan_dpi: int = 200):
+    """
+    Parse pages [start, stop) of a PDF, yielding
+        {"page", "text", "tables", "images": [(name, ext, width, height, bytes)], "scan": (...) or None}
+    "scan" is a grayscale rendering of image-bearing pages with no text layer (scan_dpi=0 disables it).
+    """
+    plumber_pdf = None
+    try:
+        with fitz.open(pdf_path) as doc:
+            for number in range(start, stop):
+                page = doc[number]
+                images = []
+                for img_index, img in enumerate(page.get_images(full=True)):
+                    ext, width, height, data = _extract_image(doc, img[0])
+                    images.append((f"page{number}_img{img_index}", ext, width, height, data))
+
+                tables = []
+                if not detect_tables or page_may_have_table(page):
+                    if plumber_pdf is None:
+                        plumber_pdf = pdfplumber.open(pdf_path)
+                    plumber_page = plumber_pdf.pages[number]
+                    tables = plumber_page.extract_tables()
+                    plumber_page.close()    # drop pdfminer's cached layout of this page
+
+                text = page.get_text("text")
+                scan = None
+                if scan_dpi and images and not text.strip():
+                    # Uncompressed PGM: cheaper to produce than PNG, and it only lives until OCR
+                    pix = page.get_pixmap(dpi=scan_dpi, colorspace=fitz.csGRAY)
+                    scan = (f"page{number}_scan", "pgm", pix.width, pix.height, pix.tobytes("pnm"))
+
+                yield {"page": number, "text": text, "tables": tables, "images": images, "scan": scan}
+    finally:
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+
+def _parse_page_range(pdf_path: str, start: int, stop: int, detect_tables: bool = True, scan_dpi: int = 200):
+    """Pool worker: parse a page range and return its records as a list"""
+    return list(_iter_page_range(pdf_path, start, stop, detect_tables, scan_dpi))
+
+def _page_ranges(page_count: int, workers: int, min_pages_per_task: int = 8):
+    """
+    Split pages into about two contiguous ranges per worker: enough to balance the load,
+    few enough that each worker opens the PDF (and pdfplumber) only a couple of times.
+    """
+    size = max(min_pages_per_task, -(-page_count // (workers * 2)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def _iter_raw_pages(pdf_path: str, workers: int, parallel_min_pages: int, detect_tables: bool, scan_dpi: int):
+    """Yield raw page records in page order, from a process pool for large documents"""
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count < parallel_min_pages:
+        yield from _iter_page_range(pdf_path, 0, page_count, detect_tables, scan_dpi)
+        return
+
+    # Bounded window of in-flight ranges keeps parsed-but-unconsumed pages in check
+    ranges = _page_ranges(page_count, workers)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = []
+        next_range = 0
+        while next_range < len(ranges) or futures:
+            while next_range < len(ranges) and len(futures) < workers * 2:
+                start, stop = ranges[next_range]
+                futures.append(pool.submit(_parse_page_range, pdf_path, start, stop, detect_tables, scan_dpi))
+                next_range += 1
+            yield from futures.pop(0).result()
+
+def iter_pdf_pages(pdf_path: str, temp_dir: str = "TempData", pdf_id: str | None = None,
+                   image_memory_limit: int = 256 * 1024 * 1024, workers: int = 1,
+                   parallel_min_pages: int = 64, detect_tables: bool = True, scan_dpi: int = 200):
     """
-    Parse PDF into text, tables, and images.
-    Each PDF's images are stored in TempData/<pdf_basename_UUID>/
+    Parse PDF page by page, yielding one record per page:
+        {"pdf_id", "page", "text", "tables", "images", "scan", "output_dir"}
+    pdf_id defaults to a stable id derived from the file name (see make_pdf_id).
+    images are ExtractedImage objects holding the encoded bytes in memory; once a document's
+    images exceed image_memory_limit bytes the rest are written to a private folder
+    TempData/<pdf_id>_<random>/ (output_dir), which the caller removes when done
+    (the parser removes it itself when parsing fails).
+    Documents with at least parallel_min_pages pages are parsed by `workers` processes (0 = one per CPU).
+    detect_tables=False runs pdfplumber on every page.
+    scan is an ExtractedImage rendering of a page without text layer, for OCR (None otherwise).
     """
     if not isinstance(pdf_path, str) or not pdf_path:
         raise ValueError("pdf_path must be a non-empty string")
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+    if not isinstance(workers, int) or workers < 0:
+        raise ValueError("workers must be a non-negative integer")
 
+    pdf_output_dir = None
     try:
         if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-
-        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        pdf_id = f"{base_name}_{uuid.uuid4().hex[:8]}"
-        pdf_output_dir = os.path.join(temp_dir, pdf_id)
-        os.makedirs(pdf_output_dir, exist_ok=True)
-
-        text = ""
-        tables = []
-        images = []
-
-        # -------- Extract text with PyMuPDF --------
-        doc = fitz.open(pdf_path)
-        for page in doc:
-            text += page.get_text("text") + "\n"
-            for img_index, img in enumerate(page.get_images(full=True)):
-                xref = img[0]
-                pix = fitz.Pixmap(doc, xref)
-                img_path = os.path.join(pdf_output_dir, f"page{page.number}_img{img_index}.png")
-                pix.save(img_path)
-                images.append(img_path)
-        doc.close()
-
-        # -------- Extract tables with pdfplumber --------
-        with pdfplumber.open(pdf_path) as plumber_pdf:
-            for page in plumber_pdf.pages:
-                tables.extend(page.extract_tables())
-
-        return {
-            "pdf_id": pdf_id,       # unique identifier for this PDF
-            "text": text,
-            "tables": tables,
-            "images": images,
-            "output_dir": pdf_output_dir
-        }
+            os.makedirs(temp_dir, exist_ok=True)
+
+        pdf_id = pdf_id or make_pdf_id(os.path.basename(pdf_path))
+        pdf_output_dir = tempfile.mkdtemp(prefix=f"{pdf_id}_", dir=temp_dir)
+        spool = ImageSpool(pdf_output_dir, image_memory_limit)
+
+        for raw in _iter_raw_pages(pdf_path, workers or os.cpu_count() or 1, parallel_min_pages, detect_tables, scan_dpi):
+            scan = raw["scan"]
+            yield {
+                "pdf_id": pdf_id,
+                "page": raw["page"],
+                "text": raw["text"],
+                "tables": raw["tables"],
+                "images": [spool.add(name, raw["page"], ext, width, height, data)
+                           for name, ext, width, height, data in raw["images"]],
+                "scan": spool.add(scan[0], raw["page"], *scan[1:]) if scan else None,
+                "output_dir": pdf_output_dir
+            }
     except Exception as e:
         logging.error(f"Error parsing PDF {pdf_path}: {e}")
+        if pdf_output_dir is not None:
+            shutil.rmtree(pdf_output_dir, ignore_errors=True)
         raise RuntimeError(f"PDF parsing failed: {e}")
+
+def parse_pdf(pdf_path: str, temp_dir: str = "TempData", pdf_id: str | None = None,
+              image_memory_limit: int = 256 * 1024 * 1024, workers: int = 1, parallel_min_pages: int = 64,
+              scan_dpi: int = 200):
+    """
+    Parse PDF into text, tables, images, and renderings of scanned pages ("scans") for OCR.
+    Images stay in memory up to image_memory_limit bytes, the rest spill to TempData/<pdf_id>_<random>/
+    """
+    if not isinstance(pdf_path, str) or not pdf_path:
+        raise ValueError("pdf_path must be a non-empty string")
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+    text = ""
+    page_texts = []
+    tables = []
+    images = []
+    scans = []
+    pdf_output_dir = None
+
+    for page in iter_pdf_pages(pdf_path, temp_dir, pdf_id, image_memory_limit, workers, parallel_min_pages,
+                               scan_dpi=scan_dpi):
+        pdf_id = page["pdf_id"]
+        pdf_output_dir = page["output_dir"]
+        text += page["text"] + "\n"
+        page_texts.append((page["page"], page["text"]))
+        tables.extend(page["tables"])
+        images.extend(page["images"])
+        if page["scan"] is not None:
+            scans.append(page["scan"])
+
+    return {
+        "pdf_id": pdf_id,       # unique identifier for this PDF
+        "text": text,
+        "page_texts": page_texts,   # [(page number, text)] for chunk provenance
+        "tables": tables,
+        "images": images,
+        "scans": scans,
+        "output_dir": pdf_output_dir
+    }
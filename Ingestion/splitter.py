@@ -3,7 +3,149 @@
 """
 Chunking and buffering strategies.
 Thread-safe functions (no global state).
+- split_sentences: single regex scan, linear in the text length, returns char spans
+- chunk_text / chunk_pages: pack sentences into chunks of at most chunk_size tokens with
+  `overlap` tokens of trailing sentences repeated in the next chunk; every chunk keeps its
+  page and char offsets into the source text
+Token counts come from a count_tokens(texts) -> [int] callable, normally Embedder.count_tokens,
+so chunks fit the embedder's window. Without one, whitespace-separated words are counted.
 """
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50):
-    return []
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Sentence ends (. ; ! ?) followed by whitespace and an upper-case letter, digit, quote or bracket,
+# brackets (for nesting) and blank lines (paragraph breaks)
+_BOUNDARY = re.compile(r'[.;!?](?=\s+["\'(\[]?[A-Z0-9])|[()\[\]]|\n\s*\n')
+_WORD = re.compile(r"\S+")
+
+@dataclass
+class Chunk:
+    text: str
+    start: int              # char offsets into the source text (page text for chunk_pages)
+    end: int
+    page: Optional[int] = None
+    tokens: int = 0
+
+    def provenance(self) -> dict:
+        return {"page": self.page, "start": self.start, "end": self.end}
+
+def count_words(texts: List[str]) -> List[int]:
+    """Fallback token counter: whitespace-separated words"""
+    return [len(text.split()) for text in texts]
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Sentence spans (start, end) of text, whitespace-trimmed, in one pass.
+    Punctuation inside () or [] does not end a sentence.
+    """
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+
+    spans = []
+    start = 0
+    depth = 0
+    for match in _BOUNDARY.finditer(text):
+        token = match.group()
+        if token in "([":
+            depth += 1
+            continue
+        if token in ")]":
+            depth = max(depth - 1, 0)
+            continue
+        if depth and token[0] != "\n":
+            continue
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    trimmed = []
+    for span_start, span_end in spans:
+        while span_start < span_end and text[span_start].isspace():
+            span_start += 1
+        while span_end > span_start and text[span_end - 1].isspace():
+            span_end -= 1
+        if span_start < span_end:
+            trimmed.append((span_start, span_end))
+    return trimmed
+
+def _split_long_span(text: str, start: int, end: int, chunk_size: int,
+                     count_tokens: Callable[[List[str]], List[int]]) -> List[Tuple[int, int, int]]:
+    """Break a sentence longer than chunk_size into word windows: [(start, end, tokens)]"""
+    words = [(m.start(), m.end()) for m in _WORD.finditer(text, start, end)]
+    counts = count_tokens([text[s:e] for s, e in words])
+    pieces, piece_start, piece_tokens, last_end = [], None, 0, None
+    for (word_start, word_end), tokens in zip(words, counts):
+        if piece_start is not None and piece_tokens + tokens > chunk_size:
+            pieces.append((piece_start, last_end, piece_tokens))
+            piece_start, piece_tokens = None, 0
+        if piece_start is None:
+            piece_start = word_start
+        piece_tokens += tokens
+        last_end = word_end
+    if piece_start is not None:
+        pieces.append((piece_start, last_end, piece_tokens))
+    return pieces
+
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50,
+               count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+               page: Optional[int] = None) -> List[Chunk]:
+    """
+    Split text into sentence-aligned chunks of at most chunk_size tokens.
+    Consecutive chunks share up to `overlap` tokens worth of whole sentences.
+    Sentences longer than chunk_size are cut at word boundaries.
+    """
+    if not isinstance(text, str):
+        raise ValueError("text must be a string")
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+    if not isinstance(overlap, int) or not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be a non-negative integer smaller than chunk_size")
+    count_tokens = count_tokens or count_words
+
+    spans = split_sentences(text)
+    if not spans:
+        return []
+
+    # One batched tokenizer call for all sentences
+    units: List[Tuple[int, int, int]] = []
+    for (start, end), tokens in zip(spans, count_tokens([text[s:e] for s, e in spans])):
+        if tokens > chunk_size:
+            units.extend(_split_long_span(text, start, end, chunk_size, count_tokens))
+        else:
+            units.append((start, end, tokens))
+
+    chunks: List[Chunk] = []
+    window: List[Tuple[int, int, int]] = []
+    window_tokens = 0
+
+    def emit():
+        chunk_start, chunk_end = window[0][0], window[-1][1]
+        chunks.append(Chunk(text=" ".join(text[chunk_start:chunk_end].split()), start=chunk_start,
+                            end=chunk_end, page=page, tokens=window_tokens))
+
+    for unit in units:
+        if window and window_tokens + unit[2] > chunk_size:
+            emit()
+            # Carry trailing sentences worth at most `overlap` tokens into the next chunk
+            carried, carried_tokens = [], 0
+            for previous in reversed(window):
+                if carried_tokens + previous[2] > overlap or carried_tokens + previous[2] + unit[2] > chunk_size:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            window, window_tokens = carried, carried_tokens
+        window.append(unit)
+        window_tokens += unit[2]
+    if window:
+        emit()
+    return chunks
+
+def chunk_pages(pages: Iterable[Tuple[int, str]], chunk_size: int = 500, overlap: int = 50,
+                count_tokens: Optional[Callable[[List[str]], List[int]]] = None) -> List[Chunk]:
+    """chunk_text over (page, text) pairs; chunks never span pages"""
+    chunks = []
+    for page, text in pages:
+        chunks.extend(chunk_text(text, chunk_size, overlap, count_tokens, page=page))
+    return chunks
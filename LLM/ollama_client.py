@@ -2,28 +2,75 @@
 
 """
 Ollama client for embeddings and LLM.
-Thread-safe HTTP calls.
+Thread-safe HTTP calls over a pooled keep-alive session with timeouts and retry/backoff.
+Answers can be streamed token by token (sync generator or async iterator); every call
+reports time-to-first-token and tokens/sec.
 """
 
+import time
+import socket
+import asyncio
+import threading
 import requests
 import json
 import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+@dataclass
+class GenerationStats:
+    ttft_s: float = 0.0             # request sent -> first token received
+    total_s: float = 0.0
+    tokens: int = 0                 # streamed chunks (Ollama sends about one token per chunk)
+    tokens_per_sec: float = 0.0     # decode rate after the first token
+    prompt_tokens: int = 0          # prompt_eval_count reported by Ollama
+    eval_tokens: int = 0            # eval_count reported by Ollama
+
+def abort_response(response: requests.Response):
+    """Wake a thread blocked reading a streamed response; it then fails its read and closes the response"""
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
 class OllamaClient:
-    def __init__(self, model: str = "mistral:7b", url: str = "http://localhost:11434"):
+    def __init__(self, model: str = "mistral:7b", url: str = "http://localhost:11434",
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5, pool_maxsize: int = 16):
+        """
+        :param connect_timeout: seconds to establish a connection
+        :param read_timeout: max seconds between two streamed chunks
+        :param max_retries: retries on connection errors and 429/5xx responses (before any token is streamed)
+        :param backoff_factor: exponential backoff base in seconds
+        :param pool_maxsize: keep-alive connections kept per host
+        """
         self.model = model
         self.url = url
+        self.timeout = (connect_timeout, read_timeout)
 
-    def generate_answer(self, prompt: str, context: str = "", max_tokens: int = 512) -> str:
-        """Generate answer using Ollama with provided context."""
-        if not isinstance(prompt, str) or not prompt.strip():
-            raise ValueError("prompt must be a non-empty string")
-        if not isinstance(context, str):
-            raise ValueError("context must be a string")
-        if not isinstance(max_tokens, int) or max_tokens <= 0:
-            raise ValueError("max_tokens must be a positive integer")
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,                 # never replay a request whose response already started
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
 
-        full_prompt = f"""You are an assistant. Use the context to answer the question.
+    def _build_prompt(self, prompt: str, context: str) -> str:
+        return f"""You are an assistant. Use the context to answer the question.
 
         Context:
         {context}
@@ -33,35 +80,134 @@ class OllamaClient:
 
         Answer:"""
 
+    def stream_answer(self, prompt: str, context: str = "", max_tokens: int = 512,
+                      on_stats: Optional[Callable[[GenerationStats], None]] = None,
+                      on_response: Optional[Callable[[requests.Response], None]] = None):
+        """
+        Generate answer using Ollama with provided context, yielding tokens as they arrive.
+        on_stats receives the GenerationStats of the call once the stream completes;
+        on_response receives the open HTTP response, e.g. to abort_response() it from another thread.
+        """
+        yield from self._stream(prompt, context, max_tokens, on_stats, on_response=on_response)
+
+    def _stream(self, prompt: str, context: str, max_tokens: int, on_stats: Optional[Callable[[GenerationStats], None]],
+                cancelled: Optional[threading.Event] = None,
+                on_response: Optional[Callable[[requests.Response], None]] = None):
+        """
+        stream_answer() that stops quietly once `cancelled` is set; on_response receives the
+        open HTTP response so another thread can abort a blocked read
+        """
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("prompt must be a non-empty string")
+        if not isinstance(context, str):
+            raise ValueError("context must be a string")
+        if not isinstance(max_tokens, int) or max_tokens <= 0:
+            raise ValueError("max_tokens must be a positive integer")
+
+        stats = GenerationStats()
         try:
-            response = requests.post(
+            start = time.perf_counter()
+            first_token_at = None
+            response = self.session.post(
                 f"{self.url}/api/generate",
                 json={
                     "model": self.model,
-                    "prompt": full_prompt,
+                    "prompt": self._build_prompt(prompt, context),
                     "options": {"num_predict": max_tokens},
                     "stream": True
                 },
-                stream=True
+                stream=True,
+                timeout=self.timeout
             )
 
             if response.status_code != 200:
                 logging.error(f"Ollama request failed with status {response.status_code}: {response.text}")
                 raise RuntimeError(f"Ollama request failed: {response.text}")
+            if on_response is not None:
+                on_response(response)
+
+            with response:
+                for line in response.iter_lines():
+                    if cancelled is not None and cancelled.is_set():
+                        return
+                    if line:
+                        try:
+                            data = json.loads(line.decode("utf-8"))
+                        except json.JSONDecodeError as e:
+                            logging.warning(f"JSON decode error: {e}")
+                            continue
+                        if data.get("response"):
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            stats.tokens += 1
+                            yield data["response"]
+                        if data.get("done"):
+                            stats.prompt_tokens = data.get("prompt_eval_count", 0)
+                            stats.eval_tokens = data.get("eval_count", 0)
 
-            # Collect streamed chunks
-            answer_parts = []
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        data = json.loads(line.decode("utf-8"))
-                        if "response" in data:
-                            answer_parts.append(data["response"])
-                    except json.JSONDecodeError as e:
-                        logging.warning(f"JSON decode error: {e}")
-                        continue
-
-            return "".join(answer_parts).strip()
+            end = time.perf_counter()
+            stats.total_s = end - start
+            if first_token_at is not None:
+                stats.ttft_s = first_token_at - start
+                decode_s = end - first_token_at
+                stats.tokens_per_sec = (stats.tokens - 1) / decode_s if stats.tokens > 1 and decode_s > 0 else 0.0
+            logging.info(f"Ollama {self.model}: ttft={stats.ttft_s * 1000:.0f} ms, "
+                         f"{stats.tokens} tokens, {stats.tokens_per_sec:.1f} tokens/s")
+            if on_stats is not None:
+                on_stats(stats)
         except Exception as e:
+            if cancelled is not None and cancelled.is_set():
+                return
             logging.error(f"Error generating answer: {e}")
             raise RuntimeError(f"Answer generation failed: {e}")
+
+    async def astream_answer(self, prompt: str, context: str = "", max_tokens: int = 512,
+                             on_stats: Optional[Callable[[GenerationStats], None]] = None):
+        """
+        Async iterator over answer tokens. The blocking HTTP stream is read on a worker
+        thread and tokens are handed to the event loop as they arrive.
+        If the consumer stops early, the HTTP stream is aborted and the worker thread is awaited.
+        """
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        cancelled = threading.Event()
+        responses = []
+
+        def opened(response):
+            responses.append(response)
+            if cancelled.is_set():
+                abort_response(response)
+
+        def produce():
+            try:
+                for token in self._stream(prompt, context, max_tokens, on_stats, cancelled=cancelled, on_response=opened):
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+                loop.call_soon_threadsafe(tokens.put_nowait, finished)
+            except Exception as e:
+                if not cancelled.is_set():
+                    loop.call_soon_threadsafe(tokens.put_nowait, e)
+
+        producer = loop.run_in_executor(None, produce)
+        ended = False
+        try:
+            while True:
+                item = await tokens.get()
+                if item is finished or isinstance(item, Exception):
+                    ended = True
+                    if item is finished:
+                        break
+                    raise item
+                yield item
+        finally:
+            if not ended:
+                # Consumer stopped early: abort the read in progress so the producer returns now
+                cancelled.set()
+                for response in responses:
+                    abort_response(response)
+            await producer
+
+    def generate_answer(self, prompt: str, context: str = "", max_tokens: int = 512,
+                        on_stats: Optional[Callable[[GenerationStats], None]] = None) -> str:
+        """Generate answer using Ollama with provided context."""
+        return "".join(self.stream_answer(prompt, context=context, max_tokens=max_tokens, on_stats=on_stats)).strip()
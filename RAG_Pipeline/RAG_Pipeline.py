@@ -1,114 +1,851 @@
 import os
+import time
 import shutil
 import threading
 import logging
-from Ingestion.pdf_parser import parse_pdf
-from Ingestion.ocr import run_ocr_on_images
+import contextvars
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from Config.config import AppConfig, COLLECTION_PROFILES
+from Ingestion.pdf_parser import parse_pdf, iter_pdf_pages
+from Ingestion.ocr import OCREngine
 from Ingestion.image_BlipCaptioner import BlipCaptioner
 from Ingestion.image_Captioner import Image_Captioner
+from Ingestion.image_filter import ImageFilter
+from Ingestion.image_store import image_key
 from Embeddings.embedder import Embedder
+from Embeddings.batcher import EmbeddingBatcher
 from LLM.ollama_client import OllamaClient
-from Utils.utils import format_text_by_sentences # pyright: ignore[reportMissingImports]
+from Ingestion.splitter import Chunk, chunk_text, count_words
+from Utils.utils import file_sha256, text_sha256, make_pdf_id # pyright: ignore[reportMissingImports]
 from Vectorstore.qdrant_handler import QdrantHandler
+from Vectorstore.manifest import IngestManifest, make_point_id
+from Retrieval.bm25_index import BM25Index
+from Retrieval.retriever import HybridRetriever
+from Retrieval.reranker import CrossEncoderReranker
+from Retrieval.context_builder import ContextBuilder, tokenizer_counter
+from RAG_Pipeline.streaming import StagedPipeline
+from RAG_Pipeline.query_cache import QueryCache
+from Utils.rwlock import ReadWriteLock
+from Utils.metrics import REGISTRY, Tracer
+
+MODEL_LOAD_SECONDS = REGISTRY.gauge("rag_model_load_seconds", "Seconds spent loading each model")
+QUEUE_DEPTH = REGISTRY.gauge("rag_queue_depth", "Items waiting in pipeline queues")
+
+def _timed_load(model: str, load):
+    """Build a model and record its load time"""
+    t0 = time.perf_counter()
+    loaded = load()
+    MODEL_LOAD_SECONDS.set(time.perf_counter() - t0, model=model)
+    return loaded
 
 
 class RAGPipeline:
-    def __init__(self, embedder_device=0, qdrant_url="http://localhost:6333", collection_name="pdf_embeddings"):
-        self.lock = threading.Lock()
+    """
+    Concurrency model:
+    - ingest_lock serializes ingestions (one manifest writer at a time); it is never taken by queries.
+    - rw_lock: queries hold the read side while embedding + searching, collection-level changes
+      (stale chunk deletion, delete_collection) take the write side. LLM generation runs unlocked.
+    - query embeddings are coalesced by an EmbeddingBatcher (or run on a bounded worker pool when
+      batching is disabled); Embedder bounds concurrent forward passes.
+    - with hybrid retrieval a local BM25 index mirrors the collection: it is updated on every upsert
+      and stale-chunk deletion, flushed to disk after each ingest, and searched next to Qdrant.
+    - an optional cross-encoder reranks over-fetched hits within a per-request time budget.
+    - ask() assembles a token-budgeted, deduplicated context from the hits (ContextBuilder).
+    - query_many()/ask_many() embed all questions in one forward pass, search them in one Qdrant
+      round trip and run up to concurrency.llm_concurrency generations at a time.
+    - every request is traced (self.tracer): stage latencies (parse, ocr, caption, split, embed, upsert,
+      search, rerank, context, generate) feed Prometheus histograms and the request's span tree.
+    Pre-built components (embedder, captioner, ocr_engine, qdrant_handler, llm_client, reranker) may be injected,
+    e.g. for benchmarks with stand-in models.
+    """
+    def __init__(self, embedder_device=0, qdrant_url="http://localhost:6333", collection_name="pdf_embeddings", config: AppConfig | None = None,
+                 *, embedder=None, captioner=None, ocr_engine=None, qdrant_handler=None, llm_client=None, reranker=None):
+        self.ingest_lock = threading.Lock()
+        self.rw_lock = ReadWriteLock()
+        self.config = config or AppConfig()
+        self.tracer = Tracer(REGISTRY, trace_buffer=self.config.metrics.trace_buffer, enabled=self.config.metrics.enabled)
         try:
-            self.embedder = Embedder(device=embedder_device)
-            self.captioner = Image_Captioner("./Models/ImageCaptionModels/blip", device=embedder_device)
-            self.qdrant_handler = QdrantHandler(url=qdrant_url, collection_name=collection_name)
-            self.llm_client = OllamaClient(model="mistral:7b", url="http://localhost:11434")
+            self.embedder = embedder or _timed_load("embedder", lambda: Embedder(
+                model_path=self.config.embedder.model_path,
+                device=embedder_device,
+                batch_size=self.config.embedder.batch_size,
+                cache_dir=self.config.embedder.cache_dir,
+                cache_max_entries=self.config.embedder.cache_max_entries,
+                cache_dtype=self.config.embedder.cache_dtype,
+                cache_flush_every=self.config.embedder.cache_flush_every,
+                max_concurrency=self.config.concurrency.embed_workers,
+                backend=self.config.embedder.backend,
+                onnx_dir=self.config.embedder.onnx_dir,
+                num_threads=self.config.embedder.num_threads))
+            captioner_config = self.config.captioner
+            self.captioner = captioner or _timed_load("captioner", lambda: Image_Captioner(
+                captioner_config.model_path,
+                device=embedder_device,
+                batch_size=captioner_config.batch_size,
+                preset=captioner_config.preset,
+                max_new_tokens=captioner_config.max_new_tokens,
+                image_filter=ImageFilter(
+                    min_width=captioner_config.min_width,
+                    min_height=captioner_config.min_height,
+                    min_area=captioner_config.min_area,
+                    dedupe=captioner_config.dedupe,
+                    hash_distance=captioner_config.hash_distance)))
+            ocr_config = self.config.ocr
+            self.ocr_engine = ocr_engine
+            if self.ocr_engine is None and ocr_config.enabled:
+                self.ocr_engine = _timed_load("ocr", lambda: OCREngine(
+                    workers=ocr_config.workers,
+                    max_side=ocr_config.max_side,
+                    min_text_likelihood=ocr_config.min_text_likelihood,
+                    lang=ocr_config.lang))
+            qdrant_config = self.config.qdrant
+            self.qdrant_handler = qdrant_handler or QdrantHandler(
+                url=qdrant_url,
+                collection_name=collection_name,
+                profile=COLLECTION_PROFILES[qdrant_config.profile],
+                prefer_grpc=qdrant_config.prefer_grpc,
+                grpc_port=qdrant_config.grpc_port,
+                upsert_batch_size=qdrant_config.upsert_batch_size,
+                upsert_parallelism=qdrant_config.upsert_parallelism,
+                max_retries=qdrant_config.upsert_retries,
+                backoff_factor=qdrant_config.upsert_backoff,
+                upsert_wait=qdrant_config.upsert_wait)
+            collection_name = self.qdrant_handler.collection_name
+            self.embed_pool = ThreadPoolExecutor(max_workers=self.config.concurrency.embed_workers, thread_name_prefix="embed")
+            self.embedding_batcher = None
+            if self.config.concurrency.query_batching:
+                self.embedding_batcher = EmbeddingBatcher(
+                    lambda texts: self.embedder.encode(texts).numpy(),
+                    max_batch_size=self.config.concurrency.max_batch_size,
+                    max_wait_ms=self.config.concurrency.max_wait_ms,
+                    num_workers=self.config.concurrency.embed_workers)
+                QUEUE_DEPTH.set_function(self.embedding_batcher.queue_depth, queue="embed_batcher")
+            self.manifest = IngestManifest(self.config.ingestion.manifest_dir, collection_name)
+            retrieval_config = self.config.retrieval
+            self.bm25_index = None
+            self.retriever = None
+            if retrieval_config.hybrid:
+                self.bm25_index = BM25Index(retrieval_config.index_dir, collection_name,
+                                            k1=retrieval_config.bm25_k1, b=retrieval_config.bm25_b)
+                self._sync_sparse_index()
+                self.retriever = HybridRetriever(self.qdrant_handler, self.bm25_index,
+                                                 rrf_k=retrieval_config.rrf_k,
+                                                 candidates=retrieval_config.candidates,
+                                                 stats_window=retrieval_config.stats_window)
+            rerank_config = self.config.rerank
+            self.reranker = reranker
+            if self.reranker is None and rerank_config.enabled:
+                self.reranker = _timed_load("reranker", lambda: CrossEncoderReranker(
+                    rerank_config.model_path,
+                    device=rerank_config.device,
+                    batch_size=rerank_config.batch_size,
+                    max_length=rerank_config.max_length,
+                    cache_entries=rerank_config.cache_entries))
+            context_config = self.config.context
+            self.context_builder = ContextBuilder(
+                max_tokens=context_config.max_tokens,
+                count_tokens=tokenizer_counter(context_config.tokenizer_path) if context_config.tokenizer_path else None,
+                duplicate_threshold=context_config.duplicate_threshold,
+                merge_adjacent=context_config.merge_adjacent,
+                order=context_config.order)
+            self.query_cache = QueryCache(
+                embedding_entries=self.config.query_cache.embedding_entries,
+                result_entries=self.config.query_cache.result_entries,
+                answer_entries=self.config.query_cache.answer_entries,
+                cache_answers=self.config.query_cache.cache_answers)
+            self.llm_client = llm_client or OllamaClient(
+                model="mistral:7b",
+                url="http://localhost:11434",
+                connect_timeout=self.config.ollama.connect_timeout,
+                read_timeout=self.config.ollama.read_timeout,
+                max_retries=self.config.ollama.max_retries,
+                backoff_factor=self.config.ollama.backoff_factor,
+                pool_maxsize=self.config.ollama.pool_maxsize)
         except Exception as e:
             logging.error(f"Failed to initialize RAGPipeline: {e}")
             raise RuntimeError(f"RAGPipeline initialization failed: {e}")
 
-    def ingest_pdf(self, pdf_path: str, temp_dir: str = "TempData"):
-        """Parse PDF, run OCR, image captioning, generate embeddings, and insert into Qdrant"""
+    def _sync_sparse_index(self):
+        """Rebuild the BM25 index from Qdrant payloads when it does not index exactly the collection's point ids"""
+        try:
+            points = {point_id for point_id, _ in self.qdrant_handler.scroll(with_payload=False)}
+        except Exception as e:
+            logging.warning(f"Skipping BM25 index check, Qdrant unavailable: {e}")
+            return
+        indexed = self.bm25_index.point_ids()
+        if points != indexed:
+            logging.info(f"Rebuilding BM25 index ({len(points - indexed)} points missing, {len(indexed - points)} stale)")
+            self.bm25_index.rebuild((point_id, payload.get("text", "")) for point_id, payload in self.qdrant_handler.scroll())
+
+    def _insert_points(self, sentences, embeddings, pdf_id, ids, payloads):
+        """Upsert points into Qdrant and mirror their text into the BM25 index"""
+        with self.tracer.span("upsert", items=len(sentences)):
+            self.qdrant_handler.insert_embeddings(sentences=sentences, embeddings=embeddings, pdf_id=pdf_id, source="pdf", ids=ids, payloads=payloads)
+            if self.bm25_index is not None:
+                self.bm25_index.add(ids, sentences)
+
+    def _flush_sparse_index(self):
+        if self.bm25_index is not None:
+            self.bm25_index.flush()
+
+    def _flush_embedding_cache(self):
+        if isinstance(self.embedder, Embedder):
+            self.embedder.flush_cache()
+
+    def _find_duplicate(self, content_hash: str):
+        """Return a no-op ingest result if a file with this exact content is already in the collection"""
+        if not self.qdrant_handler.collection_exists():
+            # Collection was dropped behind our back, the manifest no longer describes it
+            self.manifest.clear()
+            return None
+        doc_key = self.manifest.find_by_content(content_hash)
+        if doc_key is None:
+            return None
+        doc = self.manifest.get(doc_key)
+        logging.info(f"Skipping ingestion, identical content already ingested as '{doc_key}'")
+        return {"pdf_id": doc["pdf_id"], "doc_key": doc_key, "skipped": True, "new_chunks": 0, "stale_chunks": 0}
+
+    def _scan_dpi(self) -> int:
+        """Scanned pages are only rendered when there is an OCR engine to read them"""
+        return self.config.ocr.scan_dpi if self.ocr_engine is not None else 0
+
+    def _chunk_size(self) -> int:
+        """Configured chunk size, capped to what the embedder can see without truncation"""
+        max_tokens = getattr(self.embedder, "max_tokens", None)
+        return min(self.config.chunk_size, max_tokens) if max_tokens else self.config.chunk_size
+
+    def _chunk(self, text: str, page: int | None = None):
+        """Token-budgeted chunks sized with the embedder's tokenizer (word counts for stand-in embedders)"""
+        chunk_size = self._chunk_size()
+        return chunk_text(text, chunk_size=chunk_size, overlap=min(self.config.overlap, chunk_size - 1),
+                          count_tokens=getattr(self.embedder, "count_tokens", count_words), page=page)
+
+    def _picture_chunks(self, images, scans, first_picture: int = 1):
+        """
+        Caption images and OCR them together with scanned-page renderings.
+        Returns ({page: OCR text of its scan}, picture chunks, number of pictures). Picture chunks are
+        "Picture N : caption" plus "Picture N text : ..." chunks of the image's OCR text.
+        """
+        with self.tracer.span("caption", items=len(images)):
+            captions = self.captioner.caption(images)
+        ocr_results = {}
+        if self.ocr_engine is not None:
+            # Images on scanned pages are already covered by the page rendering
+            scanned_pages = {scan.page for scan in scans}
+            targets = [image for image in images if image_key(image) in captions and getattr(image, "page", None) not in scanned_pages]
+            with self.tracer.span("ocr", items=len(targets) + len(scans)):
+                ocr_results = self.ocr_engine.ocr_images(targets + list(scans))
+
+        def ocr_text(key):
+            result = ocr_results.get(key)
+            return result["text"] if result and not result["skipped"] else ""
+
+        pages = {image_key(image): getattr(image, "page", None) for image in images}
+        chunks = []
+        for idx, (key, caption) in enumerate(captions.items(), start=first_picture):
+            page = pages.get(key)
+            chunks.append(Chunk(text=f"Picture {idx} : {caption}", start=None, end=None, page=page))
+            for piece in self._chunk(ocr_text(key), page=page):
+                chunks.append(Chunk(text=f"Picture {idx} text : {piece.text}", start=None, end=None, page=page, tokens=piece.tokens))
+        scan_texts = {scan.page: ocr_text(image_key(scan)) for scan in scans}
+        return scan_texts, chunks, len(captions)
+
+    def _document_chunks(self, parsed: dict):
+        """Caption and OCR a parsed document's images, chunk each page's text and append the pictures"""
+        scan_texts, picture_chunks, _ = self._picture_chunks(parsed["images"], parsed.get("scans", []))
+        chunks = []
+        with self.tracer.span("split") as span:
+            for page, text in parsed["page_texts"]:
+                # A scanned page has no text layer, its OCR text takes its place
+                chunks.extend(self._chunk(scan_texts.get(page) or text, page=page))
+            if span is not None:
+                span.items = len(chunks)
+        return chunks + picture_chunks
+
+    @staticmethod
+    def _select_new_chunks(doc_key: str, chunks, previous: dict, seen: dict, kept: dict):
+        """
+        Hash each chunk's text and keep only chunks that are neither in the previous version of the
+        document nor already seen in this run. Every chunk is recorded in `seen` (hash -> point id),
+        the provenance of chunks already stored in `kept` (point id -> {"page", "start", "end"}).
+        Returns (new_chunks, new_point_ids).
+        """
+        new_chunks, new_ids = [], []
+        for chunk in chunks:
+            chunk_hash = text_sha256(chunk.text)
+            if chunk_hash in seen:
+                continue
+            seen[chunk_hash] = make_point_id(doc_key, chunk_hash)
+            if chunk_hash not in previous:
+                new_chunks.append(chunk)
+                new_ids.append(seen[chunk_hash])
+            else:
+                kept[seen[chunk_hash]] = chunk.provenance()
+        return new_chunks, new_ids
+
+    def _refresh_provenance(self, kept: dict) -> int:
+        """Rewrite page/offsets of unchanged chunks that moved (e.g. text inserted above them); returns the count"""
+        stored = self.qdrant_handler.retrieve(list(kept))
+        moved = {point_id: provenance for point_id, provenance in kept.items()
+                 if point_id in stored and any(stored[point_id].get(field) != value for field, value in provenance.items())}
+        self.qdrant_handler.set_payloads(moved)
+        return len(moved)
+
+    def _finish_document(self, doc_key: str, content_hash: str, pdf_id: str, previous: dict, seen: dict, kept: dict) -> int:
+        """
+        Delete chunks that disappeared from the document, refresh the location of the ones that moved
+        and record the new version; returns stale count
+        """
+        stale_ids = [point_id for chunk_hash, point_id in previous.items() if chunk_hash not in seen]
+        if kept:
+            self._refresh_provenance(kept)
+        with self.rw_lock.write_lock():
+            self.qdrant_handler.delete_points(stale_ids)
+            if self.bm25_index is not None:
+                self.bm25_index.remove(stale_ids)
+            self.manifest.record(doc_key, content_hash, pdf_id, seen)
+        return len(stale_ids)
+
+    def ingest_pdf(self, pdf_path: str, temp_dir: str = "TempData", doc_key: str | None = None):
+        """
+        Parse PDF, run OCR, image captioning, generate embeddings, and insert into Qdrant.
+        doc_key identifies the document across re-uploads (defaults to the file name):
+        unchanged content is a no-op, changed content only embeds new chunks and deletes stale ones.
+        """
         if not isinstance(pdf_path, str) or not pdf_path:
             raise ValueError("pdf_path must be a non-empty string")
+        doc_key = doc_key or os.path.basename(pdf_path)
 
-        with self.lock:
+        with self.tracer.trace("ingest_pdf", doc_key=doc_key), self.ingest_lock:
+            result = None
             try:
+                content_hash = file_sha256(pdf_path)
+                duplicate = self._find_duplicate(content_hash)
+                if duplicate is not None:
+                    return duplicate
+
                 os.makedirs(temp_dir, exist_ok=True)
 
                 # 1. Parse PDF and add text, image, table and others in the result dictionary
-                result = parse_pdf(pdf_path, temp_dir)
-
-                # 2. Image captioning
-                captions = self.captioner.caption(result["images"])
-                result["caption"] = captions
-
-                # 3. Combine text + captions
-                #caption_texts = [f"Picture {idx}:{caption}" for idx, caption in enumerate(captions.values(), start=1)]
-                caption_texts = [f"Picture {idx} : {caption}" for idx, caption in enumerate(result["caption"].values(), start=1)]
-                combined_text = result["text"] + "\n" + "\n".join(caption_texts)
+                with self.tracer.span("parse") as span:
+                    result = parse_pdf(pdf_path, temp_dir, pdf_id=make_pdf_id(doc_key),
+                                       image_memory_limit=self.config.ingestion.image_memory_limit_mb * 1024 * 1024,
+                                       workers=self.config.ingestion.parse_workers,
+                                       parallel_min_pages=self.config.ingestion.parallel_min_pages,
+                                       scan_dpi=self._scan_dpi())
+                    if span is not None:
+                        span.items = len(result["page_texts"])
 
-                # 4. Split text by sentences
-                combined_text = format_text_by_sentences(combined_text)
-                lines = combined_text.splitlines()
+                # 2-4. Image captioning and OCR, token-budgeted chunks of each page plus the pictures
+                chunks = self._document_chunks(result)
 
-                # 5. Generate embeddings
-                embeddings = [self.embedder.encode(line).squeeze(0).tolist() for line in lines]
+                # 5. Keep only chunks that are not stored yet
+                previous = self.manifest.chunks(doc_key)
+                seen, kept = {}, {}
+                new_chunks, new_ids = self._select_new_chunks(doc_key, chunks, previous, seen, kept)
 
-                # 6. Store processed text in result
-                result["formatted_text"] = lines
-                result["embeddings"] = embeddings
+                # 6. Generate embeddings (batched, returned in input order) and insert into Qdrant
+                if new_chunks:
+                    new_lines = [chunk.text for chunk in new_chunks]
+                    with self.tracer.span("embed", items=len(new_lines)):
+                        embeddings = self.embedder.encode_batch(new_lines)
+                    self.qdrant_handler.create_collection(vector_size=embeddings.shape[1])
+                    self._insert_points(new_lines, embeddings, result["pdf_id"], new_ids, [chunk.provenance() for chunk in new_chunks])
 
-                # 7. Create Qdrant collection and insert embeddings
-                self.qdrant_handler.create_collection(vector_size=len(result["embeddings"][0]))
-                self.qdrant_handler.insert_embeddings(sentences=result["formatted_text"], embeddings=result["embeddings"], pdf_id=result["pdf_id"], source="pdf")
+                # 7. Drop stale chunks of the previous version and update the manifest
+                stale_count = self._finish_document(doc_key, content_hash, result["pdf_id"], previous, seen, kept)
 
-                # 8. Remove unnecessary keys to save memory
+                # 8. Store processed text in result, remove unnecessary keys to save memory
+                result["formatted_text"] = [chunk.text for chunk in chunks]
+                result["doc_key"] = doc_key
+                result["skipped"] = False
+                result["new_chunks"] = len(new_chunks)
+                result["stale_chunks"] = stale_count
+                result["images"] = [image_key(image) for image in result["images"]]   # drop in-memory image bytes
+                result["scans"] = [image_key(scan) for scan in result["scans"]]
                 del result["text"]
-                del result["caption"]
-
-                # 9. Clean up temp directory
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                    print(f"\nTemporary folder '{temp_dir}' deleted.")
+                del result["page_texts"]
 
                 return result
             except Exception as e:
                 logging.error(f"Error in ingest_pdf for {pdf_path}: {e}")
                 raise RuntimeError(f"PDF ingestion failed: {e}")
+            finally:
+                # 9. Cached retrievals may be stale once parsing started, clean up this document's temp folder
+                if result is not None:
+                    self.query_cache.invalidate(self.qdrant_handler.collection_name)
+                    self._flush_sparse_index()
+                    self._flush_embedding_cache()
+                if result is not None and result.get("output_dir") and os.path.exists(result["output_dir"]):
+                    shutil.rmtree(result["output_dir"])
+                    print(f"\nTemporary folder '{result['output_dir']}' deleted.")
+
+    def ingest_pdf_streaming(self, pdf_path: str, temp_dir: str = "TempData", queue_size: int | None = None, upsert_batch_size: int | None = None, doc_key: str | None = None):
+        """
+        Streaming variant of ingest_pdf: pages flow parse -> caption -> embed -> upsert
+        through bounded queues, so stages overlap and peak memory is capped by the queue sizes.
+        Chunks are formed per page, and points are upserted in fixed-size batches as they become ready.
+        Deduplication and incremental re-ingestion work as in ingest_pdf.
+        """
+        if not isinstance(pdf_path, str) or not pdf_path:
+            raise ValueError("pdf_path must be a non-empty string")
+        queue_size = self.config.ingestion.queue_size if queue_size is None else queue_size
+        upsert_batch_size = self.config.ingestion.upsert_batch_size if upsert_batch_size is None else upsert_batch_size
+        if not isinstance(upsert_batch_size, int) or upsert_batch_size <= 0:
+            raise ValueError("upsert_batch_size must be a positive integer")
+        doc_key = doc_key or os.path.basename(pdf_path)
+
+        with self.tracer.trace("ingest_pdf_streaming", doc_key=doc_key), self.ingest_lock:
+            content_hash = file_sha256(pdf_path)
+            duplicate = self._find_duplicate(content_hash)
+            if duplicate is not None:
+                return duplicate
+
+            pdf_id = make_pdf_id(doc_key)
+            summary = {"pdf_id": pdf_id, "doc_key": doc_key, "skipped": False, "pages": 0, "new_chunks": 0, "stale_chunks": 0}
+            output_dirs = set()
+            picture_counter = [0]
+            previous = self.manifest.chunks(doc_key)
+            seen, kept = {}, {}
+            pending_sentences, pending_vectors, pending_ids, pending_payloads = [], [], [], []
+            collection_ready = [False]
+
+            def caption_stage(page):
+                # Caption / OCR this page's images, chunk the page and append numbered pictures
+                output_dirs.add(page["output_dir"])
+                scans = [page["scan"]] if page.get("scan") is not None else []
+                scan_texts, picture_chunks, pictures = self._picture_chunks(page["images"], scans, picture_counter[0] + 1)
+                picture_counter[0] += pictures
+                with self.tracer.span("split") as span:
+                    page["chunks"] = self._chunk(scan_texts.get(page["page"]) or page["text"], page=page["page"])
+                    if span is not None:
+                        span.items = len(page["chunks"])
+                page["chunks"] += picture_chunks
+                return page
+
+            def embed_stage(page):
+                chunks, ids = self._select_new_chunks(doc_key, page.pop("chunks"), previous, seen, kept)
+                if not chunks:
+                    return (page, [], [], [], [])
+                lines = [chunk.text for chunk in chunks]
+                # Rows stay views into the page's float32 array until the upsert stacks them
+                with self.tracer.span("embed", items=len(lines)):
+                    vectors = list(self.embedder.encode_batch(lines))
+                return (page, lines, vectors, ids, [chunk.provenance() for chunk in chunks])
+
+            def parsed_pages(pages):
+                # Pages are parsed lazily by the source thread, time each step of the iterator
+                while True:
+                    t0 = time.perf_counter()
+                    page = next(pages, None)
+                    if page is None:
+                        return
+                    self.tracer.record("parse", time.perf_counter() - t0, items=1)
+                    yield page
+
+            def flush(count=None):
+                # Upsert the first `count` pending points (all of them by default)
+                count = len(pending_sentences) if count is None else count
+                if count == 0:
+                    return
+                if not collection_ready[0]:
+                    self.qdrant_handler.create_collection(vector_size=pending_vectors[0].shape[0])
+                    collection_ready[0] = True
+                self._insert_points(pending_sentences[:count], np.stack(pending_vectors[:count]), pdf_id, pending_ids[:count], pending_payloads[:count])
+                summary["new_chunks"] += count
+                del pending_sentences[:count]
+                del pending_vectors[:count]
+                del pending_ids[:count]
+                del pending_payloads[:count]
+
+            def upsert_sink(item):
+                page, lines, vectors, ids, payloads = item
+                summary["pages"] += 1
+                pending_sentences.extend(lines)
+                pending_vectors.extend(vectors)
+                pending_ids.extend(ids)
+                pending_payloads.extend(payloads)
+                while len(pending_sentences) >= upsert_batch_size:
+                    flush(upsert_batch_size)
+
+            def finish():
+                flush()
+                summary["stale_chunks"] = self._finish_document(doc_key, content_hash, pdf_id, previous, seen, kept)
+
+            stages = StagedPipeline(queue_size=queue_size)
+            for stage in ("caption", "embed", "sink"):
+                QUEUE_DEPTH.set_function(lambda stage=stage: stages.queue_depths().get(stage, 0), queue=f"ingest_{stage}")
+            try:
+                os.makedirs(temp_dir, exist_ok=True)
+                stages.run(
+                    source=parsed_pages(iter_pdf_pages(pdf_path, temp_dir, pdf_id=pdf_id,
+                                                       image_memory_limit=self.config.ingestion.image_memory_limit_mb * 1024 * 1024,
+                                                       workers=self.config.ingestion.parse_workers,
+                                                       parallel_min_pages=self.config.ingestion.parallel_min_pages,
+                                                       scan_dpi=self._scan_dpi())),
+                    stages=[("caption", caption_stage), ("embed", embed_stage)],
+                    sink=upsert_sink,
+                    on_finish=finish)
+                return summary
+            except Exception as e:
+                logging.error(f"Error in ingest_pdf_streaming for {pdf_path}: {e}")
+                raise RuntimeError(f"PDF ingestion failed: {e}")
+            finally:
+                for stage in ("caption", "embed", "sink"):
+                    QUEUE_DEPTH.set(0, queue=f"ingest_{stage}")
+                self.query_cache.invalidate(self.qdrant_handler.collection_name)
+                self._flush_sparse_index()
+                self._flush_embedding_cache()
+                # Only this document's image folder is removed, other ingests may share temp_dir
+                for output_dir in output_dirs:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+    def delete_collection(self):
+        """Delete the whole collection together with its ingest manifest and cached queries"""
+        with self.ingest_lock, self.rw_lock.write_lock():
+            try:
+                self.qdrant_handler.delete_collection()
+                self.manifest.clear()
+                if self.bm25_index is not None:
+                    self.bm25_index.clear()
+            finally:
+                self.query_cache.invalidate(self.qdrant_handler.collection_name)
+
+    def cache_stats(self) -> dict:
+        """Hit rates of the query-side caches and the persistent embedding cache"""
+        stats = self.query_cache.stats()
+        stats["embedding_cache"] = self.embedder.cache_stats()
+        return stats
+
+    def _encode_query(self, user_question: str):
+        with self.tracer.span("embed", items=1):
+            if self.embedding_batcher is not None:
+                return self.embedding_batcher.encode(user_question)
+            return self.embed_pool.submit(lambda: self.embedder.encode(user_question).squeeze(0).numpy()).result()
+
+    def batcher_stats(self) -> dict:
+        """Queue depth, batch size and latency percentiles of the query embedding batcher"""
+        return {} if self.embedding_batcher is None else self.embedding_batcher.stats()
+
+    def retrieval_stats(self) -> dict:
+        """Per-leg (dense, sparse, fusion) latency percentiles of hybrid retrieval, plus reranker stats"""
+        stats = {} if self.retriever is None else self.retriever.stats()
+        if self.reranker is not None:
+            stats["rerank"] = self.reranker.stats()
+        return stats
+
+    def stage_stats(self) -> dict:
+        """Per-stage and per-request latency percentiles (seconds, estimated from the metric histograms)"""
+        return self.tracer.stage_summary()
+
+    def metrics_text(self) -> str:
+        """All pipeline metrics in the Prometheus text exposition format"""
+        return REGISTRY.render()
+
+    def recent_traces(self, limit: int | None = None) -> list:
+        """Span trees of the last finished requests, newest first"""
+        return self.tracer.recent_traces(limit)
+
+    def close(self):
+        """Stop the embedding batcher and worker pools, release pooled LLM and Qdrant connections"""
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.close()
+        self.embed_pool.shutdown(wait=True)
+        if self.retriever is not None:
+            self.retriever.close()
+        self._flush_sparse_index()
+        if isinstance(self.embedder, Embedder):
+            self.embedder.close()
+        if isinstance(self.ocr_engine, OCREngine):
+            self.ocr_engine.close()
+        if isinstance(self.llm_client, OllamaClient):
+            self.llm_client.close()
+        if isinstance(self.qdrant_handler, QdrantHandler):
+            self.qdrant_handler.close()
+
+    @staticmethod
+    def _hit(text: str, score: float, payload: dict) -> tuple:
+        """Retrieved hit: (text, score, chunk location used to merge neighbouring chunks)"""
+        return (text, score, {key: payload.get(key) for key in ("pdf_id", "page", "start", "end")})
+
+    def _retrieve(self, user_question: str, top_k: int):
+        """Top-k hits as (text, score, location) tuples, best first"""
+        query_vector = self.query_cache.get_embedding(user_question)
+        if query_vector is None:
+            query_vector = self._encode_query(user_question)
+            self.query_cache.put_embedding(user_question, query_vector)
+
+        with self.rw_lock.read_lock():
+            result_key = self.query_cache.result_key(self.qdrant_handler.collection_name, query_vector, top_k)
+            retrieved = self.query_cache.get_results(result_key)
+            if retrieved is None:
+                fetch_k = max(top_k, self.config.rerank.candidates) if self.reranker is not None else top_k
+                with self.tracer.span("search", items=1, hybrid=self.retriever is not None):
+                    if self.retriever is not None:
+                        retrieved = [self._hit(hit["text"], hit["score"], hit["payload"]) for hit in self.retriever.search(user_question, query_vector, top_k=fetch_k)]
+                    else:
+                        results = self.qdrant_handler.search(query_vector, top_k=fetch_k)
+                        retrieved = [self._hit(hit.payload["text"], hit.score, hit.payload) for hit in results]
+                if self.reranker is None:
+                    self.query_cache.put_results(result_key, retrieved)
+                else:
+                    candidates, retrieved = retrieved, None
+
+        # Reranking runs outside the read lock, it only touches the fetched candidates
+        if retrieved is None:
+            with self.tracer.span("rerank", items=len(candidates)) as span:
+                retrieved, info = self.reranker.rerank(user_question, candidates, top_k, budget_ms=self.config.rerank.budget_ms)
+                if span is not None:
+                    span.attrs["fallback"] = info["fallback"]
+            if not info["fallback"]:
+                self.query_cache.put_results(result_key, retrieved)
+        return retrieved
+
+    def _retrieve_many(self, questions: List[str], top_k: int):
+        """
+        _retrieve() for many questions: uncached questions are embedded in one encode_batch() call and
+        searched with one batched Qdrant request. Returns (hits per question, timings in ms per question);
+        embed and search times are those of the shared batch.
+        """
+        timings = [{"embed": 0.0, "search": 0.0, "rerank": 0.0} for _ in questions]
+        vectors = [self.query_cache.get_embedding(question) for question in questions]
+        missing = list(dict.fromkeys(question for question, vector in zip(questions, vectors) if vector is None))
+        if missing:
+            t0 = time.perf_counter()
+            with self.tracer.span("embed", items=len(missing)):
+                # Query vectors go to the query cache, not the persistent document embedding cache
+                encoded = dict(zip(missing, self.embedder.encode_batch(missing, use_cache=False)))
+            embed_ms = (time.perf_counter() - t0) * 1000
+            for question, vector in encoded.items():
+                self.query_cache.put_embedding(question, vector)
+            for idx, question in enumerate(questions):
+                if vectors[idx] is None:
+                    vectors[idx] = encoded[question]
+                    timings[idx]["embed"] = embed_ms
+
+        retrieved = [None] * len(questions)
+        candidates = {}
+        with self.rw_lock.read_lock():
+            result_keys = [self.query_cache.result_key(self.qdrant_handler.collection_name, vector, top_k) for vector in vectors]
+            for idx, result_key in enumerate(result_keys):
+                retrieved[idx] = self.query_cache.get_results(result_key)
+            pending = [idx for idx, hits in enumerate(retrieved) if hits is None]
+            if pending:
+                fetch_k = max(top_k, self.config.rerank.candidates) if self.reranker is not None else top_k
+                query_vectors = np.stack([vectors[idx] for idx in pending])
+                t0 = time.perf_counter()
+                with self.tracer.span("search", items=len(pending), hybrid=self.retriever is not None):
+                    if self.retriever is not None:
+                        batches = self.retriever.search_many([questions[idx] for idx in pending], query_vectors, top_k=fetch_k)
+                        batches = [[self._hit(hit["text"], hit["score"], hit["payload"]) for hit in hits] for hits in batches]
+                    else:
+                        batches = self.qdrant_handler.search_batch(query_vectors, top_k=fetch_k)
+                        batches = [[self._hit(hit.payload["text"], hit.score, hit.payload) for hit in hits] for hits in batches]
+                search_ms = (time.perf_counter() - t0) * 1000
+                for idx, hits in zip(pending, batches):
+                    timings[idx]["search"] = search_ms
+                    if self.reranker is None:
+                        retrieved[idx] = hits
+                        self.query_cache.put_results(result_keys[idx], hits)
+                    else:
+                        candidates[idx] = hits
+
+        # Reranking runs outside the read lock, per question with its own time budget
+        for idx, hits in candidates.items():
+            t0 = time.perf_counter()
+            with self.tracer.span("rerank", items=len(hits)):
+                retrieved[idx], info = self.reranker.rerank(questions[idx], hits, top_k, budget_ms=self.config.rerank.budget_ms)
+            timings[idx]["rerank"] = (time.perf_counter() - t0) * 1000
+            if not info["fallback"]:
+                self.query_cache.put_results(result_keys[idx], retrieved[idx])
+        return retrieved, timings
+
+    @staticmethod
+    def _check_questions(questions, top_k: int):
+        if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+            raise ValueError("questions must be a list of non-empty strings")
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
 
     def query(self, user_question: str, top_k: int = 10):
-        """Query the Qdrant collection and return top-k relevant sentences"""
+        """
+        Query the Qdrant collection and return top-k relevant sentences as [(text, score)].
+        With hybrid retrieval the score is the fused RRF score of the dense and BM25 rankings.
+        With reranking, top-N candidates are rescored by the cross-encoder (its score is returned);
+        if the time budget runs out the retrieval order is kept and the result is not cached.
+        """
         if not isinstance(user_question, str) or not user_question.strip():
             raise ValueError("user_question must be a non-empty string")
         if not isinstance(top_k, int) or top_k <= 0:
             raise ValueError("top_k must be a positive integer")
 
-        try:
-            query_vector = self.embedder.encode(user_question).squeeze(0).tolist()
-            results = self.qdrant_handler.search(query_vector, top_k=top_k)
+        with self.tracer.trace("query", top_k=top_k):
+            try:
+                retrieved = self._retrieve(user_question, top_k)
+                if not retrieved:
+                    return "No relevant information found."
 
-            if not results:
-                return "No relevant information found."
+                return [(text, score) for text, score, _ in retrieved]
+            except Exception as e:
+                logging.error(f"Error in query for '{user_question}': {e}")
+                raise RuntimeError(f"Query failed: {e}")
 
-            return [(hit.payload["text"], hit.score) for hit in results]
-        except Exception as e:
-            logging.error(f"Error in query for '{user_question}': {e}")
-            raise RuntimeError(f"Query failed: {e}")
+    def query_many(self, questions: List[str], top_k: int = 10) -> List[dict]:
+        """
+        query() for a list of questions: one batched embedding pass and one Qdrant round trip.
+        Returns [{"question", "results", "timings_ms"}] in input order, results as query() returns them.
+        """
+        self._check_questions(questions, top_k)
+        if not questions:
+            return []
+
+        with self.tracer.trace("query_many", questions=len(questions), top_k=top_k):
+            try:
+                retrieved, timings = self._retrieve_many(questions, top_k)
+            except Exception as e:
+                logging.error(f"Error in query_many for {len(questions)} questions: {e}")
+                raise RuntimeError(f"Query failed: {e}")
+        return [{"question": question,
+                 "results": [(text, score) for text, score, _ in hits] if hits else "No relevant information found.",
+                 "timings_ms": timing}
+                for question, hits, timing in zip(questions, retrieved, timings)]
+
+    def context_stats(self) -> dict:
+        """Prompt tokens before and after context assembly, summed over all asks"""
+        return self.context_builder.stats()
 
     def ask(self, user_question: str, top_k: int = 10):
-        """Retrieve top-k context from Qdrant and generate answer using LLM"""
+        """Retrieve top-k context from Qdrant, assemble it within the token budget and generate answer using LLM"""
         if not isinstance(user_question, str) or not user_question.strip():
             raise ValueError("user_question must be a non-empty string")
         if not isinstance(top_k, int) or top_k <= 0:
             raise ValueError("top_k must be a positive integer")
 
-        with self.lock:
+        # No pipeline lock: retrieval takes the read lock inside _retrieve(), generation runs unlocked
+        with self.tracer.trace("ask", top_k=top_k):
             try:
-                retrieved = self.query(user_question, top_k=top_k)
-                if isinstance(retrieved, str):  # No results
-                    return retrieved
+                retrieved = self._retrieve(user_question, top_k)
+                if not retrieved:
+                    return "No relevant information found."
 
-                context = " ".join([text for text, score in retrieved])
-                answer = self.llm_client.generate_answer(prompt=user_question, context=context)
+                with self.tracer.span("context", items=len(retrieved)):
+                    context, report = self.context_builder.build(retrieved)
+                logging.info(f"Context: {report['passages_out']}/{report['passages_in']} passages, {report['tokens_saved']} prompt tokens saved")
+                answer_key = self.query_cache.answer_key(self.qdrant_handler.collection_name, user_question, context)
+                answer = self.query_cache.get_answer(answer_key)
+                if answer is None:
+                    with self.tracer.span("generate", items=1):
+                        answer = self.llm_client.generate_answer(prompt=user_question, context=context)
+                    self.query_cache.put_answer(answer_key, answer)
                 return answer
             except Exception as e:
                 logging.error(f"Error in ask for '{user_question}': {e}")
-                raise RuntimeError(f"Answer generation failed: {e}")
\ No newline at end of file
+                raise RuntimeError(f"Answer generation failed: {e}")
+
+    def ask_many(self, questions: List[str], top_k: int = 10, concurrency: int | None = None) -> List[dict]:
+        """
+        ask() for a list of questions: retrieval is batched as in query_many(), then up to
+        `concurrency` (default concurrency.llm_concurrency) generations run against the LLM at once.
+        Returns [{"question", "answer", "error", "context", "timings_ms"}] in input order; "context" is
+        the ContextBuilder report and a failed generation sets "error" for its question only.
+        """
+        self._check_questions(questions, top_k)
+        concurrency = concurrency or self.config.concurrency.llm_concurrency
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be a positive integer")
+        if not questions:
+            return []
+
+        with self.tracer.trace("ask_many", questions=len(questions), top_k=top_k):
+            return self._ask_many(questions, top_k, concurrency)
+
+    def _ask_many(self, questions: List[str], top_k: int, concurrency: int) -> List[dict]:
+        started = time.perf_counter()
+        try:
+            retrieved, timings = self._retrieve_many(questions, top_k)
+        except Exception as e:
+            logging.error(f"Error in ask_many for {len(questions)} questions: {e}")
+            raise RuntimeError(f"Answer generation failed: {e}")
+        retrieve_ms = (time.perf_counter() - started) * 1000
+        results = [{"question": question, "answer": None, "error": None, "context": None,
+                    "timings_ms": dict(timing, retrieve=retrieve_ms, context=0.0, generate=0.0)}
+                   for question, timing in zip(questions, timings)]
+
+        def answer(idx):
+            result, hits = results[idx], retrieved[idx]
+            try:
+                if not hits:
+                    result["answer"] = "No relevant information found."
+                    return
+                t0 = time.perf_counter()
+                with self.tracer.span("context", items=len(hits)):
+                    context, result["context"] = self.context_builder.build(hits)
+                result["timings_ms"]["context"] = (time.perf_counter() - t0) * 1000
+                answer_key = self.query_cache.answer_key(self.qdrant_handler.collection_name, result["question"], context)
+                result["answer"] = self.query_cache.get_answer(answer_key)
+                if result["answer"] is None:
+                    t0 = time.perf_counter()
+                    with self.tracer.span("generate", items=1):
+                        result["answer"] = self.llm_client.generate_answer(prompt=result["question"], context=context)
+                    result["timings_ms"]["generate"] = (time.perf_counter() - t0) * 1000
+                    self.query_cache.put_answer(answer_key, result["answer"])
+            except Exception as e:
+                logging.error(f"Error in ask_many for '{result['question']}': {e}")
+                result["error"] = str(e)
+            finally:
+                result["timings_ms"]["total"] = (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(questions)), thread_name_prefix="llm") as pool:
+            # Each generation runs in its own copy of this context so its spans join the ask_many trace
+            futures = [pool.submit(contextvars.copy_context().run, answer, idx) for idx in range(len(questions))]
+            for future in futures:
+                future.result()
+        return results
+
+    def ask_stream(self, user_question: str, top_k: int = 10, on_response=None):
+        """
+        Like ask(), but yields answer tokens as the LLM produces them.
+        on_response is handed to OllamaClient.stream_answer (receives the open HTTP response).
+        """
+        if not isinstance(user_question, str) or not user_question.strip():
+            raise ValueError("user_question must be a non-empty string")
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+
+        # Each next() may run on a different thread, so the trace is only activated between yields
+        root = self.tracer.start("ask_stream", top_k=top_k)
+        error = None
+        try:
+            answer = None
+            with self.tracer.activate(root):
+                retrieved = self._retrieve(user_question, top_k)
+                if retrieved:
+                    with self.tracer.span("context", items=len(retrieved)):
+                        context, report = self.context_builder.build(retrieved)
+                    logging.info(f"Context: {report['passages_out']}/{report['passages_in']} passages, {report['tokens_saved']} prompt tokens saved")
+                    answer_key = self.query_cache.answer_key(self.qdrant_handler.collection_name, user_question, context)
+                    answer = self.query_cache.get_answer(answer_key)
+            if not retrieved:
+                yield "No relevant information found."
+                return
+            if answer is not None:
+                yield answer
+                return
+
+            parts = []
+            t0 = time.perf_counter()
+            stream_options = {} if on_response is None else {"on_response": on_response}
+            for token in self.llm_client.stream_answer(prompt=user_question, context=context, **stream_options):
+                parts.append(token)
+                yield token
+            with self.tracer.activate(root):
+                self.tracer.record("generate", time.perf_counter() - t0, items=1, tokens=len(parts))
+            self.query_cache.put_answer(answer_key, "".join(parts).strip())
+        except Exception as e:
+            error = e
+            logging.error(f"Error in ask_stream for '{user_question}': {e}")
+            raise RuntimeError(f"Answer generation failed: {e}")
+        finally:
+            self.tracer.finish(root, error)
\ No newline at end of file
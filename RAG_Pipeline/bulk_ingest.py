@@ -0,0 +1,330 @@
+## bulk_ingest.py
+
+"""
+Bulk ingestion of many PDFs.
+- parse_pdf runs in a process pool (PyMuPDF/pdfplumber are CPU-bound and hold the GIL)
+- parsed documents flow through shared caption -> embed stages (StagedPipeline)
+- points from many documents are upserted into Qdrant in large batches
+- a checkpoint file records finished files, so a crashed run resumes where it stopped
+Per-stage throughput is reported at the end.
+
+Usage:
+    python -m RAG_Pipeline.bulk_ingest ./pdfs --collection pdf_embeddings --device -1
+"""
+
+import os
+import json
+import glob
+import time
+import shutil
+import argparse
+import threading
+import logging
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional
+
+from Ingestion.pdf_parser import parse_pdf
+from RAG_Pipeline.streaming import StagedPipeline
+from Utils.utils import file_sha256, make_pdf_id
+
+def _timed_parse(pdf_path: str, temp_dir: str, pdf_id: str, image_memory_limit: int, scan_dpi: int):
+    """Worker-side parse; returns (parsed, seconds) so queueing time is not counted as parse time"""
+    t0 = time.perf_counter()
+    # Documents are already spread over processes, so each one is parsed in-process
+    parsed = parse_pdf(pdf_path, temp_dir, pdf_id=pdf_id, image_memory_limit=image_memory_limit, workers=1,
+                       scan_dpi=scan_dpi)
+    return parsed, time.perf_counter() - t0
+
+class IngestCheckpoint:
+    """
+    JSON record of finished files: {path: {"size", "mtime", "content_hash", "status"}}.
+    A file is skipped on resume when its size and mtime are unchanged.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self._files: Dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._files = json.load(f).get("files", {})
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+
+    @staticmethod
+    def _signature(pdf_path: str) -> dict:
+        stat = os.stat(pdf_path)
+        return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def is_done(self, pdf_path: str) -> bool:
+        with self.lock:
+            entry = self._files.get(os.path.abspath(pdf_path))
+        return entry is not None and entry["status"] == "done" and \
+            {"size": entry["size"], "mtime": entry["mtime"]} == self._signature(pdf_path)
+
+    def mark(self, pdf_path: str, status: str, content_hash: str = "", error: str = ""):
+        entry = {**self._signature(pdf_path), "content_hash": content_hash, "status": status}
+        if error:
+            entry["error"] = error
+        with self.lock:
+            self._files[os.path.abspath(pdf_path)] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"files": self._files}, f)
+            os.replace(tmp_path, self.path)
+
+class StageStats:
+    """Busy time and item counts of one stage (thread-safe)"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = 0
+        self.units = 0          # stage-specific unit: pages, images, chunks, points
+        self.busy_s = 0.0
+
+    def add(self, seconds: float, items: int = 1, units: int = 0):
+        with self.lock:
+            self.items += items
+            self.units += units
+            self.busy_s += seconds
+
+    def report(self, wall_s: float, unit: str) -> dict:
+        with self.lock:
+            return {
+                "items": self.items,
+                unit: self.units,
+                "busy_s": round(self.busy_s, 3),
+                f"{unit}_per_sec": round(self.units / wall_s, 2) if wall_s > 0 else 0.0,
+            }
+
+class BulkIngestor:
+    """
+    Usage:
+        pipeline = RAGPipeline(embedder_device=-1, collection_name="pdf_embeddings")
+        report = BulkIngestor(pipeline, parse_workers=8).ingest_directory("./pdfs")
+    """
+    def __init__(self, pipeline, parse_workers: Optional[int] = None, upsert_batch_size: Optional[int] = None,
+                 checkpoint_path: Optional[str] = None, temp_dir: str = "TempData", queue_size: int = 8):
+        ingestion = pipeline.config.ingestion
+        parse_workers = (ingestion.bulk_parse_workers if parse_workers is None else parse_workers) or os.cpu_count() or 1
+        upsert_batch_size = ingestion.bulk_upsert_batch_size if upsert_batch_size is None else upsert_batch_size
+        if not isinstance(parse_workers, int) or parse_workers <= 0:
+            raise ValueError("parse_workers must be a positive integer")
+        if not isinstance(upsert_batch_size, int) or upsert_batch_size <= 0:
+            raise ValueError("upsert_batch_size must be a positive integer")
+
+        self.pipeline = pipeline
+        self.parse_workers = parse_workers
+        self.upsert_batch_size = upsert_batch_size
+        self.temp_dir = temp_dir
+        self.queue_size = queue_size
+        collection = pipeline.qdrant_handler.collection_name
+        self.checkpoint = IngestCheckpoint(checkpoint_path or os.path.join(
+            ingestion.checkpoint_dir, f"{collection}.json"))
+
+    def ingest_directory(self, directory: str, pattern: str = "**/*.pdf") -> dict:
+        if not os.path.isdir(directory):
+            raise ValueError(f"Not a directory: {directory}")
+        paths = sorted(glob.glob(os.path.join(directory, pattern), recursive=True))
+        return self.ingest_files(paths, root=directory)
+
+    def _parse_results(self, docs: List[dict], stats: StageStats, failures: list) -> Iterable[dict]:
+        """Submit parses with a bounded number in flight and yield documents as they finish"""
+        image_memory_limit = self.pipeline.config.ingestion.image_memory_limit_mb * 1024 * 1024
+        scan_dpi = self.pipeline._scan_dpi()
+        ctx = multiprocessing.get_context("spawn")   # never fork a process that holds model threads
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=ctx) as pool:
+            pending = {}
+            queue_docs = list(docs)
+            while queue_docs or pending:
+                while queue_docs and len(pending) < self.parse_workers * 2:
+                    doc = queue_docs.pop(0)
+                    pending[pool.submit(_timed_parse, doc["path"], self.temp_dir, doc["pdf_id"], image_memory_limit, scan_dpi)] = doc
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc = pending.pop(future)
+                    try:
+                        doc["parsed"], seconds = future.result()
+                    except Exception as e:
+                        logging.error(f"Bulk parse failed for {doc['path']}: {e}")
+                        failures.append({"path": doc["path"], "stage": "parse", "error": str(e)})
+                        self.checkpoint.mark(doc["path"], "failed", doc["content_hash"], str(e))
+                        continue
+                    stats.add(seconds, units=1)
+                    yield doc
+
+    def ingest_files(self, paths: List[str], root: Optional[str] = None) -> dict:
+        """Ingest many PDFs; returns a report with per-stage throughput and failures"""
+        pipeline = self.pipeline
+        stats = {name: StageStats() for name in ("parse", "caption", "embed", "upsert")}
+        failures: List[dict] = []
+        skipped = {"checkpoint": 0, "duplicate": 0}
+        started = time.perf_counter()
+
+        with pipeline.ingest_lock:
+            # -------- Plan: drop files finished in a previous run, already ingested or copies within this run --------
+            docs = []
+            planned: Dict[str, str] = {}            # content hash -> path ingested by this run
+            copies: List[tuple] = []                # (path, content hash, path of the ingested copy)
+            for path in paths:
+                if self.checkpoint.is_done(path):
+                    skipped["checkpoint"] += 1
+                    continue
+                content_hash = file_sha256(path)
+                if content_hash in planned:
+                    skipped["duplicate"] += 1
+                    copies.append((path, content_hash, planned[content_hash]))
+                    continue
+                if pipeline._find_duplicate(content_hash) is not None:
+                    skipped["duplicate"] += 1
+                    self.checkpoint.mark(path, "done", content_hash)
+                    continue
+                planned[content_hash] = path
+                doc_key = os.path.relpath(path, root) if root else os.path.basename(path)
+                docs.append({"path": path, "doc_key": doc_key, "pdf_id": make_pdf_id(doc_key),
+                             "content_hash": content_hash, "previous": pipeline.manifest.chunks(doc_key),
+                             "seen": {}, "kept": {}, "remaining": 0, "embedded": False})
+
+            # Documents waiting for their last points to be upserted, in arrival order
+            in_flight: List[dict] = []
+            pending = {"sentences": [], "vectors": [], "ids": [], "payloads": [], "docs": []}
+            collection_ready = [False]
+
+            def caption_stage(doc):
+                t0 = time.perf_counter()
+                parsed = doc.pop("parsed")
+                try:
+                    chunks = pipeline._document_chunks(parsed)
+                except Exception as e:
+                    logging.error(f"Bulk captioning failed for {doc['path']}: {e}")
+                    failures.append({"path": doc["path"], "stage": "caption", "error": str(e)})
+                    self.checkpoint.mark(doc["path"], "failed", doc["content_hash"], str(e))
+                    return None
+                finally:
+                    if parsed.get("output_dir"):
+                        shutil.rmtree(parsed["output_dir"], ignore_errors=True)
+                stats["caption"].add(time.perf_counter() - t0, units=len(parsed["images"]))
+                doc["chunks"] = chunks
+                return doc
+
+            def embed_stage(doc):
+                t0 = time.perf_counter()
+                chunks, ids = pipeline._select_new_chunks(doc["doc_key"], doc.pop("chunks"), doc["previous"], doc["seen"], doc["kept"])
+                lines = [chunk.text for chunk in chunks]
+                try:
+                    vectors = list(pipeline.embedder.encode_batch(lines)) if lines else []     # float32 row views
+                except Exception as e:
+                    logging.error(f"Bulk embedding failed for {doc['path']}: {e}")
+                    failures.append({"path": doc["path"], "stage": "embed", "error": str(e)})
+                    self.checkpoint.mark(doc["path"], "failed", doc["content_hash"], str(e))
+                    return None
+                stats["embed"].add(time.perf_counter() - t0, units=len(lines))
+                doc["batch"] = (lines, vectors, ids, [chunk.provenance() for chunk in chunks])
+                return doc
+
+            def finalize_ready():
+                # A document is complete once all of its points are in Qdrant
+                while in_flight and in_flight[0]["remaining"] == 0:
+                    doc = in_flight.pop(0)
+                    pipeline._finish_document(doc["doc_key"], doc["content_hash"], doc["pdf_id"], doc["previous"], doc["seen"], doc["kept"])
+                    self.checkpoint.mark(doc["path"], "done", doc["content_hash"])
+
+            def flush(count=None):
+                count = len(pending["sentences"]) if count is None else count
+                if count:
+                    t0 = time.perf_counter()
+                    if not collection_ready[0]:
+                        pipeline.qdrant_handler.create_collection(vector_size=pending["vectors"][0].shape[0])
+                        collection_ready[0] = True
+                    docs_batch = pending["docs"][:count]
+                    pipeline._insert_points(pending["sentences"][:count], np.stack(pending["vectors"][:count]),
+                                            [doc["pdf_id"] for doc in docs_batch], pending["ids"][:count], pending["payloads"][:count])
+                    for doc in docs_batch:
+                        doc["remaining"] -= 1
+                    for key in pending:
+                        del pending[key][:count]
+                    stats["upsert"].add(time.perf_counter() - t0, units=count)
+                finalize_ready()
+
+            def upsert_sink(doc):
+                lines, vectors, ids, payloads = doc.pop("batch")
+                doc["remaining"] = len(lines)
+                in_flight.append(doc)
+                pending["sentences"].extend(lines)
+                pending["vectors"].extend(vectors)
+                pending["ids"].extend(ids)
+                pending["payloads"].extend(payloads)
+                pending["docs"].extend([doc] * len(lines))
+                while len(pending["sentences"]) >= self.upsert_batch_size:
+                    flush(self.upsert_batch_size)
+                finalize_ready()
+
+            try:
+                os.makedirs(self.temp_dir, exist_ok=True)
+                StagedPipeline(queue_size=self.queue_size).run(
+                    source=self._parse_results(docs, stats["parse"], failures),
+                    stages=[("caption", caption_stage), ("embed", embed_stage)],
+                    sink=upsert_sink,
+                    on_finish=flush)
+            finally:
+                # A copy is done once the file it duplicates is; otherwise the next run picks it up again
+                for path, content_hash, original in copies:
+                    if self.checkpoint.is_done(original):
+                        self.checkpoint.mark(path, "done", content_hash)
+                pipeline.query_cache.invalidate(pipeline.qdrant_handler.collection_name)
+                pipeline._flush_sparse_index()
+                pipeline._flush_embedding_cache()
+
+        wall_s = time.perf_counter() - started
+        report = {
+            "files": len(paths),
+            "ingested": len(docs) - len(failures),
+            "skipped": skipped,
+            "failed": failures,
+            "wall_s": round(wall_s, 3),
+            "stages": {
+                "parse": stats["parse"].report(wall_s, "documents"),
+                "caption": stats["caption"].report(wall_s, "images"),
+                "embed": stats["embed"].report(wall_s, "chunks"),
+                "upsert": stats["upsert"].report(wall_s, "points"),
+            },
+        }
+        logging.info(f"Bulk ingestion finished: {json.dumps(report)}")
+        return report
+
+def main():
+    from dataclasses import replace
+    from Config.config import AppConfig
+    from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of PDFs into Qdrant")
+    parser.add_argument("directory")
+    parser.add_argument("--collection", default="pdf_embeddings")
+    parser.add_argument("--qdrant-url", default="http://localhost:6333")
+    parser.add_argument("--device", type=int, default=-1, help="-1 for CPU, 0+ for GPU")
+    parser.add_argument("--workers", type=int, default=None, help="parse processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=None, help="points buffered per upsert flush (default: 1024)")
+    parser.add_argument("--grpc", action="store_true", help="talk to the Qdrant server over gRPC")
+    parser.add_argument("--upsert-parallelism", type=int, default=None, help="upsert requests in flight (default: QdrantConfig)")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: Cache/checkpoints/<collection>.json)")
+    parser.add_argument("--pattern", default="**/*.pdf")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    config = AppConfig()
+    qdrant_config = replace(config.qdrant, prefer_grpc=args.grpc or config.qdrant.prefer_grpc)
+    if args.upsert_parallelism is not None:
+        qdrant_config = replace(qdrant_config, upsert_parallelism=args.upsert_parallelism)
+    config = replace(config, qdrant=qdrant_config)
+    pipeline = RAGPipeline(embedder_device=args.device, qdrant_url=args.qdrant_url, collection_name=args.collection, config=config)
+    try:
+        ingestor = BulkIngestor(pipeline, parse_workers=args.workers, upsert_batch_size=args.batch_size,
+                                checkpoint_path=args.checkpoint)
+        print(json.dumps(ingestor.ingest_directory(args.directory, pattern=args.pattern), indent=2))
+    finally:
+        pipeline.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+## query_cache.py
+
+"""
+Layered query-side caches for RAGPipeline.
+- query embeddings:  normalized question -> vector
+- retrieval results: (collection, collection version, query vector hash, top_k) -> hits
+- answers:           (collection, collection version, question, context hash) -> answer (optional)
+Ingesting into or deleting a collection bumps its version and drops its cached results and answers.
+Thread-safe (every layer is an LRUCache).
+"""
+
+import hashlib
+import threading
+import numpy as np
+from typing import Any, List, Optional
+from Utils.cache import LRUCache
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.split())
+
+class QueryCache:
+    def __init__(self, embedding_entries: int = 1024, result_entries: int = 1024, answer_entries: int = 256, cache_answers: bool = True):
+        self.embeddings = LRUCache(max_entries=embedding_entries)
+        self.results = LRUCache(max_entries=result_entries)
+        self.answers = LRUCache(max_entries=answer_entries) if cache_answers else None
+        self._versions = {}
+        self._versions_lock = threading.Lock()
+
+    def collection_version(self, collection: str) -> int:
+        with self._versions_lock:
+            return self._versions.get(collection, 0)
+
+    def invalidate(self, collection: str):
+        """Called after any write to a collection (ingest, delete)"""
+        with self._versions_lock:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+        self.results.remove_where(lambda key: key[0] == collection)
+        if self.answers is not None:
+            self.answers.remove_where(lambda key: key[0] == collection)
+
+    # -------- query embeddings --------
+    def get_embedding(self, question: str) -> Optional[List[float]]:
+        return self.embeddings.get(_normalize_question(question))
+
+    def put_embedding(self, question: str, vector: List[float]):
+        self.embeddings.put(_normalize_question(question), vector)
+
+    # -------- retrieval results --------
+    # Keys capture the collection version before the lookup, so a result computed while an
+    # ingest invalidates the collection is stored under the old version and never served.
+    def result_key(self, collection: str, vector, top_k: int) -> tuple:
+        vector_hash = hashlib.blake2b(np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+        return (collection, self.collection_version(collection), vector_hash, top_k)
+
+    def get_results(self, key: tuple) -> Optional[List[Any]]:
+        return self.results.get(key)
+
+    def put_results(self, key: tuple, results: List[Any]):
+        self.results.put(key, results)
+
+    # -------- answers --------
+    def answer_key(self, collection: str, question: str, context: str) -> tuple:
+        context_hash = hashlib.blake2b(context.encode("utf-8"), digest_size=16).hexdigest()
+        return (collection, self.collection_version(collection), _normalize_question(question), context_hash)
+
+    def get_answer(self, key: tuple) -> Optional[str]:
+        return None if self.answers is None else self.answers.get(key)
+
+    def put_answer(self, key: tuple, answer: str):
+        if self.answers is not None:
+            self.answers.put(key, answer)
+
+    def stats(self) -> dict:
+        return {
+            "query_embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+            "answers": self.answers.stats() if self.answers is not None else {},
+        }
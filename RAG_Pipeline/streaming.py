@@ -0,0 +1,132 @@
+## streaming.py
+
+"""
+Bounded-queue stage runner used for streaming ingestion.
+Each stage runs in its own thread and hands items to the next stage through a
+bounded queue, so a slow stage applies backpressure instead of letting memory grow.
+"""
+
+import queue
+import threading
+import contextvars
+import logging
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+_DONE = object()
+
+class StagedPipeline:
+    """
+    Usage:
+        pipe = StagedPipeline(queue_size=4)
+        pipe.run(source=pages, stages=[("caption", caption_fn), ("embed", embed_fn)], sink=upsert_fn)
+
+    source: iterable producing items (consumed in its own thread)
+    stages: list of (name, fn); fn(item) returns the next item, or None to drop it
+    sink:   fn(item) called in the calling thread for every item leaving the last stage
+    """
+    def __init__(self, queue_size: int = 4):
+        if not isinstance(queue_size, int) or queue_size <= 0:
+            raise ValueError("queue_size must be a positive integer")
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._errors: List[Tuple[str, BaseException]] = []
+        self._errors_lock = threading.Lock()
+        self._queues: List[Tuple[str, "queue.Queue"]] = []
+
+    def _fail(self, name: str, exc: BaseException):
+        logging.error(f"Streaming stage '{name}' failed: {exc}")
+        with self._errors_lock:
+            self._errors.append((name, exc))
+        self._stop.set()
+
+    def _put(self, q: "queue.Queue", item: Any) -> bool:
+        # Blocking put that still notices an abort from another stage
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _finish(self, q: "queue.Queue"):
+        # End-of-stream marker; skipped once aborted since consumers then exit on the stop flag
+        while True:
+            try:
+                q.put(_DONE, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    return
+
+    def _get(self, q: "queue.Queue") -> Any:
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _produce(self, source: Iterable, out_q: "queue.Queue"):
+        try:
+            for item in source:
+                if not self._put(out_q, item):
+                    return
+        except BaseException as e:
+            self._fail("source", e)
+        finally:
+            self._finish(out_q)
+
+    def _transform(self, name: str, fn: Callable[[Any], Any], in_q: "queue.Queue", out_q: "queue.Queue"):
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    return
+                result = fn(item)
+                if result is not None and not self._put(out_q, result):
+                    return
+        except BaseException as e:
+            self._fail(name, e)
+        finally:
+            self._finish(out_q)
+
+    def queue_depths(self) -> dict:
+        """Items waiting in front of each stage ("sink" for the last queue) of the current run"""
+        return {name: q.qsize() for name, q in self._queues}
+
+    def run(self, source: Iterable, stages: List[Tuple[str, Callable[[Any], Any]]], sink: Callable[[Any], None],
+            on_finish: Optional[Callable[[], None]] = None):
+        """Run all stages to completion; re-raises the first stage error as RuntimeError"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(stages) + 1)]
+        self._queues = list(zip([name for name, _ in stages] + ["sink"], queues))
+        # Stage threads run in copies of the caller's context, so they see its active trace
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(self._produce, source, queues[0]),
+                                    name="stage-source", daemon=True)]
+        for idx, (name, fn) in enumerate(stages):
+            threads.append(threading.Thread(
+                target=contextvars.copy_context().run, args=(self._transform, name, fn, queues[idx], queues[idx + 1]),
+                name=f"stage-{name}", daemon=True))
+
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                sink(item)
+            if on_finish is not None and not self._stop.is_set():
+                on_finish()
+        except BaseException as e:
+            self._fail("sink", e)
+        finally:
+            # Threads are either finished already or will notice the stop flag and exit
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+        if self._errors:
+            name, exc = self._errors[0]
+            raise RuntimeError(f"Streaming stage '{name}' failed: {exc}")
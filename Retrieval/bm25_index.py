@@ -0,0 +1,333 @@
+## bm25_index.py
+
+"""
+Local BM25 inverted index kept next to the Qdrant vectors.
+- documents are Qdrant points (chunk text keyed by point id), added and removed incrementally at ingest time
+- postings are NumPy arrays grown in place: uint32 doc numbers and uint16 term frequencies per term,
+  so a search only touches the postings of its query terms
+- removals are tombstones; the index is compacted once a quarter of it is dead
+- on disk: one compressed .npz per collection with gap-encoded postings, written atomically;
+  point ids are Qdrant's UUIDs or unsigned integers, stored as 16 bytes plus a type tag
+- several processes may share the file (API service, bulk ingest CLI): flush() takes a file lock,
+  reloads what other processes wrote and re-applies this process's unsaved changes on top;
+  searches reload the file once another process replaced it
+Thread-safe: searches share a read lock, updates take the write lock.
+"""
+
+import os
+import re
+import uuid
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from Utils.filelock import FileLock
+from Utils.rwlock import ReadWriteLock
+
+_TOKEN = re.compile(r"[a-z0-9_]+(?:[.\-/:][a-z0-9_]+)*")
+
+# Point id type tags of the on-disk index
+_UUID_ID = 0
+_INT_ID = 1
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased word tokens. Identifiers such as "ERR-4012", "v2.3.1" or "src/app.py" are kept
+    whole and also split into their parts, so both exact and partial lookups match.
+    """
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[.\-/:]", token) if part)
+    return tokens
+
+def _encode_point_id(point_id: str) -> Tuple[int, bytes]:
+    """(type tag, 16 bytes) of a Qdrant point id: an unsigned integer or a UUID"""
+    if point_id.isdigit():
+        value = int(point_id)
+        if value >= 2**64:
+            raise ValueError(f"Point id {point_id} is not an unsigned 64-bit integer")
+        return _INT_ID, value.to_bytes(16, "big")
+    try:
+        return _UUID_ID, uuid.UUID(point_id).bytes
+    except ValueError:
+        raise ValueError(f"Point id {point_id!r} is neither an unsigned integer nor a UUID")
+
+def _decode_point_id(tag: int, raw: bytes) -> str:
+    if tag == _INT_ID:
+        return str(int.from_bytes(raw, "big"))
+    return str(uuid.UUID(bytes=raw))
+
+def _append(values: np.ndarray, size: int, value) -> np.ndarray:
+    """values with value stored at position size, doubling the capacity when it is full"""
+    if size == len(values):
+        grown = np.empty(max(4, 2 * size), dtype=values.dtype)
+        grown[:size] = values[:size]
+        values = grown
+    values[size] = value
+    return values
+
+def _file_signature(path: str):
+    """Changes whenever the file is replaced (os.replace gives it a new inode)"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+class BM25Index:
+    """
+    Usage:
+        index = BM25Index("Cache/bm25", "pdf_embeddings")
+        index.add(point_ids, texts)
+        index.flush()
+        hits = index.search("error ERR-4012", top_k=20)   # [(point_id, score)]
+    """
+    def __init__(self, index_dir: str, collection_name: str, k1: float = 1.5, b: float = 0.75,
+                 compact_ratio: float = 0.25):
+        if k1 <= 0 or not 0 <= b <= 1:
+            raise ValueError("k1 must be positive and b within [0, 1]")
+        self.path = os.path.join(index_dir, f"{collection_name}.npz")
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.lock = ReadWriteLock()
+        self.file_lock = FileLock(f"{self.path}.lock")
+        self._pending: Dict[str, Optional[str]] = {}    # unsaved changes: point id -> text (None = removed)
+        self._replace = False                           # next flush overwrites the file (rebuild)
+        self._reset()
+        self._reload()
+
+    def _reset(self):
+        self._point_ids: List[str] = []             # doc number -> point id
+        self._doc_of: Dict[str, int] = {}           # point id -> doc number (live docs only)
+        self._size = 0                              # doc numbers in use (live and tombstoned)
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._postings: Dict[str, list] = {}        # term -> [doc numbers, term frequencies, count]
+        self._total_length = 0
+        self._signature = None                      # file signature of the state loaded from disk
+
+    def _reload(self):
+        """Load the file written last (by any process) and re-apply unsaved changes (caller holds the write lock)"""
+        self._reset()
+        signature = _file_signature(self.path)
+        if signature is not None:
+            try:
+                self._load()
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable BM25 index {self.path}: {e}")
+                self._reset()
+        self._signature = signature
+        for point_id, text in self._pending.items():
+            if text is None:
+                self._remove_one(point_id)
+            else:
+                self._add_one(point_id, text)
+
+    def refresh(self):
+        """Pick up a file another process wrote since this index last loaded or saved it"""
+        if self._replace or _file_signature(self.path) == self._signature:
+            return
+        with self.lock.write_lock():
+            if not self._replace and _file_signature(self.path) != self._signature:
+                self._reload()
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    def __contains__(self, point_id) -> bool:
+        return str(point_id) in self._doc_of
+
+    def point_ids(self) -> Set[str]:
+        """Ids of the indexed (live) points"""
+        with self.lock.read_lock():
+            return set(self._doc_of)
+
+    # -------- Updates --------
+    def _add_one(self, point_id: str, text: str):
+        if point_id in self._doc_of:
+            self._remove_one(point_id)
+        doc = self._size
+        terms = tokenize(text)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = [np.empty(4, dtype=np.uint32), np.empty(4, dtype=np.uint16), 0]
+            posting[0] = _append(posting[0], posting[2], doc)
+            posting[1] = _append(posting[1], posting[2], min(tf, 65535))
+            posting[2] += 1
+        self._point_ids.append(point_id)
+        self._doc_of[point_id] = doc
+        self._lengths = _append(self._lengths, doc, len(terms))
+        self._alive = _append(self._alive, doc, True)
+        self._size += 1
+        self._total_length += len(terms)
+
+    def _remove_one(self, point_id: str):
+        doc = self._doc_of.pop(point_id, None)
+        if doc is not None:
+            self._alive[doc] = False
+            self._total_length -= int(self._lengths[doc])
+
+    def add(self, point_ids: List, texts: List[str]):
+        """Index texts under their point ids (re-adding an id replaces it)"""
+        if len(point_ids) != len(texts):
+            raise ValueError("point_ids and texts must have the same length")
+        for point_id in point_ids:
+            _encode_point_id(str(point_id))
+        with self.lock.write_lock():
+            for point_id, text in zip(point_ids, texts):
+                self._add_one(str(point_id), text)
+                self._pending[str(point_id)] = text
+
+    def remove(self, point_ids: Iterable):
+        with self.lock.write_lock():
+            for point_id in point_ids:
+                self._remove_one(str(point_id))
+                self._pending[str(point_id)] = None
+
+    def clear(self):
+        with self.file_lock, self.lock.write_lock():
+            self._pending.clear()
+            self._replace = False
+            self._reset()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def rebuild(self, documents: Iterable[Tuple[object, str]]):
+        """Replace the whole index with (point_id, text) pairs, e.g. scrolled from Qdrant"""
+        with self.lock.write_lock():
+            self._pending.clear()
+            self._reset()
+            for point_id, text in documents:
+                _encode_point_id(str(point_id))
+                self._add_one(str(point_id), text)
+            self._replace = True
+        self.flush()
+
+    def _compact(self):
+        """Drop tombstoned docs and renumber the rest (caller holds the write lock)"""
+        alive = self._alive[:self._size]
+        renumber = (np.cumsum(alive) - 1).astype(np.uint32)
+        postings = {}
+        for term, (docs, tfs, count) in self._postings.items():
+            docs, tfs = docs[:count], tfs[:count]
+            keep = alive[docs]
+            if keep.any():
+                postings[term] = [renumber[docs[keep]], tfs[keep].copy(), int(keep.sum())]
+        self._postings = postings
+        self._point_ids = [point_id for point_id, live in zip(self._point_ids, alive) if live]
+        self._doc_of = {point_id: doc for doc, point_id in enumerate(self._point_ids)}
+        self._lengths = self._lengths[:self._size][alive].copy()
+        self._size = len(self._point_ids)
+        self._alive = np.ones(self._size, dtype=bool)
+
+    # -------- Persistence --------
+    def flush(self):
+        """
+        Write the index to disk if it changed, compacting first when enough of it is dead.
+        Changes saved by other processes in the meantime are loaded first, so none are lost.
+        """
+        with self.file_lock, self.lock.write_lock():
+            if not self._pending and not self._replace:
+                return
+            if not self._replace and _file_signature(self.path) != self._signature:
+                self._reload()
+            dead = self._size - len(self._doc_of)
+            if dead and dead >= self.compact_ratio * self._size:
+                self._compact()
+
+            terms = list(self._postings)
+            sizes = np.array([self._postings[term][2] for term in terms], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+            docs = np.concatenate([self._postings[term][0][:self._postings[term][2]] for term in terms]) if terms else np.empty(0, np.uint32)
+            tfs = np.concatenate([self._postings[term][1][:self._postings[term][2]] for term in terms]) if terms else np.empty(0, np.uint16)
+            # Gap-encode doc numbers within each posting list (ascending by construction)
+            gaps = docs.astype(np.int64)
+            gaps[1:] -= docs[:-1]
+            gaps[offsets[:-1][sizes > 0]] = docs[offsets[:-1][sizes > 0]]
+            encoded_ids = [_encode_point_id(point_id) for point_id in self._point_ids]
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                gaps=gaps.astype(np.uint32),
+                tfs=tfs,
+                point_ids=np.frombuffer(b"".join(raw for _, raw in encoded_ids), dtype=np.uint8),
+                point_id_tags=np.array([tag for tag, _ in encoded_ids], dtype=np.uint8),
+                lengths=self._lengths[:self._size],
+                alive=self._alive[:self._size].astype(np.uint8))
+            os.replace(tmp_path, self.path)
+            self._signature = _file_signature(self.path)
+            self._pending.clear()
+            self._replace = False
+
+    def _load(self):
+        with np.load(self.path) as data:
+            raw_terms = data["terms"].tobytes().decode("utf-8")
+            terms = raw_terms.split("\n") if raw_terms else []
+            offsets = data["offsets"]
+            docs = np.cumsum(data["gaps"].astype(np.int64))
+            tfs = data["tfs"]
+            raw_ids = data["point_ids"].tobytes()
+            # Indexes written before integer ids were supported hold UUIDs only
+            tags = data["point_id_tags"] if "point_id_tags" in data else np.full(len(raw_ids) // 16, _UUID_ID, dtype=np.uint8)
+            self._point_ids = [_decode_point_id(int(tag), raw_ids[16 * i:16 * i + 16]) for i, tag in enumerate(tags)]
+            self._lengths = data["lengths"].astype(np.uint32)
+            self._alive = data["alive"].astype(bool)
+
+        for idx, term in enumerate(terms):
+            start, end = offsets[idx], offsets[idx + 1]
+            base = docs[start - 1] if start > 0 else 0
+            self._postings[term] = [(docs[start:end] - base).astype(np.uint32), tfs[start:end].astype(np.uint16), int(end - start)]
+        self._size = len(self._point_ids)
+        self._doc_of = {point_id: doc for doc, point_id in enumerate(self._point_ids) if self._alive[doc]}
+        self._total_length = int(self._lengths[self._alive].sum())
+
+    # -------- Search --------
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """BM25 top-k as [(point_id, score)], best first; cost grows with the query terms' postings only"""
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+        terms = set(tokenize(query))
+        self.refresh()
+        with self.lock.read_lock():
+            live = len(self._doc_of)
+            if not live or not terms:
+                return []
+            avg_length = self._total_length / live
+            term_docs, term_scores = [], []
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                count = posting[2]
+                docs = posting[0][:count]
+                tf = posting[1][:count].astype(np.float32)
+                idf = np.log1p((live - count + 0.5) / (count + 0.5))    # df includes tombstones until the next compaction
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / avg_length)
+                term_docs.append(docs)
+                term_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+            if not term_docs:
+                return []
+            if len(term_docs) == 1:
+                docs, scores = term_docs[0], term_scores[0]
+            else:
+                # Sum the per-term scores of every doc that contains any query term
+                docs, inverse = np.unique(np.concatenate(term_docs), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(term_scores))
+            keep = self._alive[docs] & (scores > 0)
+            docs, scores = docs[keep], scores[keep]
+
+            if len(docs) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                docs, scores = docs[best], scores[best]
+            order = np.argsort(-scores, kind="stable")
+            return [(self._point_ids[doc], float(scores[idx])) for idx, doc in zip(order, docs[order])]
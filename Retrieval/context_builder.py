@@ -0,0 +1,233 @@
+## context_builder.py
+
+"""
+Token-budgeted LLM context assembly from retrieved chunks.
+- merges overlapping / adjacent chunks of the same page (by their character offsets)
+- drops near-duplicates (word-shingle Jaccard or containment against a more relevant passage)
+- fills the token budget in relevance order, cutting the last passage at a sentence boundary
+- orders the kept passages by relevance (or "edges": best first and last, or "document" order)
+Tokens are counted with the LLM tokenizer when one is given, else estimated from characters.
+Reports how many prompt tokens were saved against joining every retrieved chunk.
+Thread-safe: build() keeps no state except the stats counters.
+"""
+
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+from Ingestion.splitter import split_sentences
+
+ORDERS = ("relevance", "edges", "document")
+
+def estimate_tokens(texts: List[str]) -> List[int]:
+    """Tokenizer-free estimate: about 4 characters per token for English text"""
+    return [math.ceil(len(text) / 4) for text in texts]
+
+def tokenizer_counter(tokenizer_path: str) -> Callable[[List[str]], List[int]]:
+    """Batched token counter backed by a local HuggingFace tokenizer folder (e.g. the LLM's)"""
+    from transformers import AutoTokenizer # pyright: ignore[reportMissingImports]
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+    return lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+@dataclass
+class Passage:
+    text: str
+    score: float
+    rank: int                       # best retrieval rank among merged chunks (0 = most relevant)
+    pdf_id: Optional[str] = None
+    page: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    chunks: int = 1                 # retrieved chunks merged into this passage
+    shingles: frozenset = field(default=frozenset(), repr=False)
+
+def _shingles(text: str, size: int = 3) -> frozenset:
+    words = text.lower().split()
+    if len(words) <= size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+def _stitch(first: str, second: str) -> str:
+    """Join two texts, dropping the longest suffix of first that is a prefix of second (word-wise)"""
+    a, b = first.split(), second.split()
+    for k in range(min(len(a), len(b)), 0, -1):
+        if a[-k] == b[0] and a[-k:] == b[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+class ContextBuilder:
+    """
+    Usage:
+        builder = ContextBuilder(max_tokens=1500)
+        context, report = builder.build([(text, score, {"pdf_id": ..., "page": 3, "start": 0, "end": 812}), ...])
+        # report: passages_in/out, merged, duplicates, truncated, dropped, tokens_in/out, tokens_saved
+    Hits are (text, score) or (text, score, metadata) tuples, most relevant first.
+    """
+    def __init__(self, max_tokens: int = 1500, count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+                 duplicate_threshold: float = 0.85, merge_adjacent: bool = True, merge_gap: int = 8,
+                 order: str = "relevance", min_fragment_tokens: int = 32, separator: str = "\n\n"):
+        """
+        :param max_tokens: Token budget of the assembled context
+        :param count_tokens: Batched token counter (e.g. the LLM tokenizer), defaults to estimate_tokens
+        :param duplicate_threshold: Shingle Jaccard / containment at which a passage counts as a duplicate
+        :param merge_adjacent: Merge chunks of the same page whose spans overlap or are at most merge_gap characters apart
+        :param order: "relevance", "edges" (most relevant at both ends) or "document" (pdf, page, offset)
+        :param min_fragment_tokens: Smallest remaining budget worth filling with a cut passage
+        """
+        if not isinstance(max_tokens, int) or max_tokens <= 0:
+            raise ValueError("max_tokens must be a positive integer")
+        if not 0 < duplicate_threshold <= 1:
+            raise ValueError("duplicate_threshold must be within (0, 1]")
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {ORDERS}")
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or estimate_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.merge_adjacent = merge_adjacent
+        self.merge_gap = merge_gap
+        self.order = order
+        self.min_fragment_tokens = min_fragment_tokens
+        self.separator = separator
+        self._stats_lock = threading.Lock()
+        self._builds = 0
+        self._tokens_in = 0
+        self._tokens_out = 0
+
+    @staticmethod
+    def _passages(hits: Sequence[Tuple]) -> List[Passage]:
+        passages = []
+        for rank, hit in enumerate(hits):
+            meta = hit[2] if len(hit) > 2 and hit[2] else {}
+            passages.append(Passage(text=hit[0], score=hit[1], rank=rank, pdf_id=meta.get("pdf_id"), page=meta.get("page"),
+                                    start=meta.get("start"), end=meta.get("end")))
+        return passages
+
+    def _merge(self, passages: List[Passage]) -> List[Passage]:
+        """Merge same-page passages with overlapping or adjacent character spans"""
+        located, merged = [], []
+        for passage in passages:
+            has_span = None not in (passage.pdf_id, passage.page, passage.start, passage.end)
+            (located if has_span else merged).append(passage)
+        located.sort(key=lambda p: (p.pdf_id, p.page, p.start))
+        current = None
+        for passage in located:
+            if (current is not None and (passage.pdf_id, passage.page) == (current.pdf_id, current.page)
+                    and passage.start <= current.end + self.merge_gap):
+                if passage.end > current.end:
+                    current.text = _stitch(current.text, passage.text)
+                    current.end = passage.end
+                current.score = max(current.score, passage.score)
+                current.rank = min(current.rank, passage.rank)
+                current.chunks += passage.chunks
+                continue
+            if current is not None:
+                merged.append(current)
+            current = passage
+        if current is not None:
+            merged.append(current)
+        return sorted(merged, key=lambda p: p.rank)
+
+    def _dedupe(self, passages: List[Passage]) -> Tuple[List[Passage], int]:
+        """Keep a passage only if no more relevant kept passage (nearly) contains it"""
+        kept, duplicates = [], 0
+        for passage in passages:
+            passage.shingles = _shingles(passage.text)
+            duplicate = False
+            for other in kept:
+                common = len(passage.shingles & other.shingles)
+                if not common:
+                    continue
+                jaccard = common / len(passage.shingles | other.shingles)
+                containment = common / max(len(passage.shingles), 1)
+                if jaccard >= self.duplicate_threshold or containment >= self.duplicate_threshold:
+                    duplicate = True
+                    break
+            if duplicate:
+                duplicates += 1
+            else:
+                kept.append(passage)
+        return kept, duplicates
+
+    def _cut(self, text: str, budget: int) -> Optional[str]:
+        """Longest sentence-aligned prefix of text within budget tokens"""
+        spans = split_sentences(text)
+        ends = [end for _, end in spans]
+        counts = self.count_tokens([text[:end] for end in ends]) if ends else []
+        best = None
+        for end, tokens in zip(ends, counts):
+            if tokens > budget:
+                break
+            best = text[:end]
+        return best
+
+    def _arrange(self, passages: List[Passage]) -> List[Passage]:
+        if self.order == "document":
+            return sorted(passages, key=lambda p: (p.pdf_id or "", p.page if p.page is not None else -1, p.start or 0, p.rank))
+        if self.order == "edges":
+            # Most relevant passages at the start and the end, weakest in the middle
+            front, back = [], []
+            for idx, passage in enumerate(passages):
+                (front if idx % 2 == 0 else back).append(passage)
+            return front + back[::-1]
+        return passages
+
+    def build(self, hits: Sequence[Tuple]) -> Tuple[str, dict]:
+        """Assemble the context string; returns (context, report)"""
+        hits = list(hits)
+        texts = [hit[0] for hit in hits]
+        separator_tokens = self.count_tokens([self.separator])[0] if self.separator.strip() else 0
+        tokens_in = self.count_tokens([" ".join(texts)])[0] if texts else 0
+
+        passages = self._passages(hits)
+        if self.merge_adjacent:
+            passages = self._merge(passages)
+        merged = len(hits) - len(passages)
+        passages, duplicates = self._dedupe(passages)
+
+        selected, used, truncated, dropped = [], 0, 0, 0
+        for passage, tokens in zip(passages, self.count_tokens([p.text for p in passages]) if passages else []):
+            cost = tokens + (separator_tokens if selected else 0)
+            if used + cost <= self.max_tokens:
+                selected.append(passage)
+                used += cost
+                continue
+            remaining = self.max_tokens - used - (separator_tokens if selected else 0)
+            fragment = self._cut(passage.text, remaining) if remaining >= self.min_fragment_tokens else None
+            if fragment:
+                passage.text = fragment
+                selected.append(passage)
+                used += self.count_tokens([fragment])[0] + (separator_tokens if len(selected) > 1 else 0)
+                truncated += 1
+            else:
+                dropped += 1
+
+        context = self.separator.join(p.text for p in self._arrange(selected))
+        tokens_out = self.count_tokens([context])[0] if context else 0
+        with self._stats_lock:
+            self._builds += 1
+            self._tokens_in += tokens_in
+            self._tokens_out += tokens_out
+        report = {
+            "passages_in": len(hits),
+            "passages_out": len(selected),
+            "merged": merged,
+            "duplicates": duplicates,
+            "truncated": truncated,
+            "dropped": dropped,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": max(tokens_in - tokens_out, 0),
+        }
+        return context, report
+
+    def stats(self) -> dict:
+        """Totals over all builds: prompt tokens before/after assembly and the share saved"""
+        with self._stats_lock:
+            builds, tokens_in, tokens_out = self._builds, self._tokens_in, self._tokens_out
+        return {
+            "builds": builds,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": max(tokens_in - tokens_out, 0),
+            "saved_ratio": 1 - tokens_out / tokens_in if tokens_in else 0.0,
+        }
@@ -0,0 +1,153 @@
+## reranker.py
+
+"""
+Cross-encoder reranking of retrieved chunks on CPU.
+The retriever over-fetches top-N candidates, the cross-encoder scores (query, chunk) pairs in
+length-sorted batches and the best top-k are kept. Each request has a time budget: when it runs
+out before every candidate is scored, the retrieval order is returned unchanged.
+Scores are cached per (query, chunk) pair. Thread-safe: forward passes are serialized by a lock.
+"""
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification # pyright: ignore[reportMissingImports]
+import torch # pyright: ignore[reportMissingImports]
+import time
+import hashlib
+import threading
+import logging
+import numpy as np
+from collections import deque
+from typing import List, Optional, Sequence, Tuple
+from Utils.cache import LRUCache
+
+def _percentile(values, pct: float) -> float:
+    return float(np.percentile(values, pct)) if len(values) else 0.0
+
+def _pair_key(query: str, text: str) -> tuple:
+    return (" ".join(query.split()), hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest())
+
+class CrossEncoderReranker:
+    """
+    Usage:
+        reranker = CrossEncoderReranker("./Models/RerankModels/ms-marco-MiniLM-L-6-v2")
+        hits, info = reranker.rerank("What is ERR-4012?", [(text, score), ...], top_k=5, budget_ms=150)
+        # info: {"reranked", "fallback", "candidates", "scored", "cached", "ms"}
+    """
+    def __init__(self, model_path: str = "./Models/RerankModels/ms-marco-MiniLM-L-6-v2", device: int = -1, batch_size: int = 16,
+                 max_length: int = 256, cache_entries: int = 10_000, stats_window: int = 1024):
+        """
+        :param model_path: Path to a HuggingFace sequence-classification cross-encoder folder
+        :param device: -1 for CPU, 0+ for GPU
+        :param batch_size: (query, chunk) pairs per forward pass
+        :param max_length: Token limit of a (query, chunk) pair; the chunk side is truncated
+        :param cache_entries: LRU bound of the (query, chunk) score cache
+        :param stats_window: Recent requests kept for latency percentiles
+        """
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+        if not isinstance(max_length, int) or max_length <= 0:
+            raise ValueError("max_length must be a positive integer")
+
+        try:
+            self.device = torch.device("cuda" if device >= 0 and torch.cuda.is_available() else "cpu")
+            self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            self.model.to(self.device)
+            self.model.eval()
+        except Exception as e:
+            logging.error(f"Failed to load cross-encoder from {model_path}: {e}")
+            raise RuntimeError(f"Cross-encoder loading failed: {e}")
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        self.cache = LRUCache(max_entries=cache_entries)
+        self._stats_lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=stats_window)
+        self._requests = 0
+        self._fallbacks = 0
+
+    def _forward(self, query: str, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer([query] * len(texts), texts, padding=True, truncation="only_second",
+                                max_length=self.max_length, return_tensors="pt")
+        with self.lock, torch.no_grad():
+            logits = self.model(**inputs.to(self.device)).logits
+        # Single-logit models score relevance directly, two-class models use the "relevant" logit
+        return logits[:, -1].float().cpu().numpy()
+
+    def score(self, query: str, texts: Sequence[str], deadline: Optional[float] = None) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Relevance scores of texts for query, from the cache or in length-sorted batches.
+        deadline is a time.perf_counter() value; returns (None, cached) when it passes before every
+        text is scored (scores finished so far are still cached), else (scores, cached).
+        """
+        scores = np.empty(len(texts), dtype=np.float32)
+        missing = []
+        for idx, text in enumerate(texts):
+            cached = self.cache.get(_pair_key(query, text))
+            if cached is None:
+                missing.append(idx)
+            else:
+                scores[idx] = cached
+        cached_count = len(texts) - len(missing)
+
+        missing.sort(key=lambda i: len(texts[i]))
+        for start in range(0, len(missing), self.batch_size):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None, cached_count
+            batch = missing[start:start + self.batch_size]
+            batch_scores = self._forward(query, [texts[i] for i in batch])
+            for idx, value in zip(batch, batch_scores):
+                scores[idx] = value
+                self.cache.put(_pair_key(query, texts[idx]), float(value))
+        if missing and deadline is not None and time.perf_counter() > deadline:
+            return None, cached_count
+        return scores, cached_count
+
+    def rerank(self, query: str, hits: List[Tuple], top_k: int, budget_ms: Optional[float] = None):
+        """
+        Reorder retrieved (text, score, ...) hits by cross-encoder score and keep top_k.
+        The score is replaced by the cross-encoder score, any further fields are kept.
+        Returns (hits, info); on budget overrun the first top_k hits in retrieval order are returned.
+        """
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+        started = time.perf_counter()
+        deadline = None if budget_ms is None else started + budget_ms / 1000.0
+
+        try:
+            scores, cached = self.score(query, [hit[0] for hit in hits], deadline) if hits else (np.empty(0), 0)
+        except Exception as e:
+            logging.error(f"Error during reranking: {e}")
+            raise RuntimeError(f"Reranking failed: {e}")
+
+        fallback = scores is None
+        if fallback:
+            reranked = list(hits[:top_k])
+        else:
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            reranked = [(hits[i][0], float(scores[i])) + tuple(hits[i][2:]) for i in order]
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._requests += 1
+            self._fallbacks += int(fallback)
+            self._latencies_ms.append(elapsed_ms)
+        info = {"reranked": not fallback, "fallback": fallback, "candidates": len(hits),
+                "scored": 0 if fallback else len(hits) - cached, "cached": cached, "ms": elapsed_ms}
+        return reranked, info
+
+    def stats(self) -> dict:
+        """Requests, budget fallbacks, score cache counters and latency percentiles"""
+        with self._stats_lock:
+            latencies = list(self._latencies_ms)
+            requests, fallbacks = self._requests, self._fallbacks
+        return {
+            "requests": requests,
+            "fallbacks": fallbacks,
+            "score_cache": self.cache.stats(),
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+            },
+        }
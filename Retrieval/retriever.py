@@ -2,8 +2,174 @@
 
 """
 Retrieval pipeline.
-Embeds query → searches Qdrant → builds context.
+Hybrid search: the dense leg (Qdrant vectors) and the sparse leg (local BM25 index) run
+concurrently, their rankings are combined with reciprocal rank fusion (RRF).
+Per-leg latencies are kept over a recent window and reported as percentiles.
 """
 
-def retrieve_context(query: str, top_k: int = 5):
-    return []
+import time
+import threading
+import logging
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from Retrieval.bm25_index import BM25Index
+
+def _percentile(values, pct: float) -> float:
+    return float(np.percentile(values, pct)) if len(values) else 0.0
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence], k: int = 60, weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists: score(id) = sum over lists of weight / (k + rank), rank starting at 1.
+    Returns [(id, fused score)], best first; ties keep first-seen order.
+    """
+    if k <= 0:
+        raise ValueError("k must be positive")
+    weights = weights or [1.0] * len(rankings)
+    if len(weights) != len(rankings):
+        raise ValueError("weights must hold one weight per ranking")
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+class HybridRetriever:
+    """
+    Usage:
+        retriever = HybridRetriever(qdrant_handler, BM25Index("Cache/bm25", "pdf_embeddings"))
+        hits = retriever.search("What does ERR-4012 mean?", query_vector, top_k=5)
+        # [{"id", "text", "score", "payload", "dense_rank", "sparse_rank"}]
+        retriever.stats()
+    """
+    def __init__(self, qdrant_handler, bm25_index: BM25Index, rrf_k: int = 60, candidates: int = 50, stats_window: int = 1024):
+        if not isinstance(candidates, int) or candidates <= 0:
+            raise ValueError("candidates must be a positive integer")
+        self.qdrant_handler = qdrant_handler
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+        self._stats_lock = threading.Lock()
+        self._latencies_ms = {leg: deque(maxlen=stats_window) for leg in ("dense", "sparse", "fusion", "total")}
+        self._queries = 0
+        self._sparse_only_hits = 0
+
+    def _sparse_leg(self, query: str, limit: int):
+        t0 = time.perf_counter()
+        hits = self.bm25_index.search(query, top_k=limit)
+        return hits, (time.perf_counter() - t0) * 1000
+
+    def _fuse(self, dense_hits, sparse_hits, top_k: int):
+        """RRF of one query's legs; returns (hits, keyword-only hit count)"""
+        payloads = {str(hit.id): hit.payload for hit in dense_hits}
+        dense_ranking = list(payloads)
+        sparse_ranking = [point_id for point_id, _ in sparse_hits]
+        fused = reciprocal_rank_fusion([dense_ranking, sparse_ranking], k=self.rrf_k)[:top_k]
+        # Keyword-only hits are not in the dense results, fetch their payloads
+        missing = [point_id for point_id, _ in fused if point_id not in payloads]
+        if missing:
+            payloads.update(self.qdrant_handler.retrieve(missing))
+
+        dense_rank = {point_id: rank for rank, point_id in enumerate(dense_ranking, start=1)}
+        sparse_rank = {point_id: rank for rank, point_id in enumerate(sparse_ranking, start=1)}
+        hits = []
+        for point_id, score in fused:
+            payload = payloads.get(point_id)
+            if payload is None:     # indexed locally but gone from Qdrant
+                continue
+            hits.append({"id": point_id, "text": payload.get("text", ""), "score": score, "payload": payload,
+                         "dense_rank": dense_rank.get(point_id), "sparse_rank": sparse_rank.get(point_id)})
+        return hits, len(missing)
+
+    def _record(self, dense_ms: float, sparse_ms: float, fusion_ms: float, total_ms: float, sparse_only: int):
+        with self._stats_lock:
+            self._queries += 1
+            self._sparse_only_hits += sparse_only
+            self._latencies_ms["dense"].append(dense_ms)
+            self._latencies_ms["sparse"].append(sparse_ms)
+            self._latencies_ms["fusion"].append(fusion_ms)
+            self._latencies_ms["total"].append(total_ms)
+
+    def search(self, query: str, query_vector, top_k: int = 5) -> List[dict]:
+        """Top-k hits by fused rank; text is resolved from Qdrant payloads"""
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+        limit = max(top_k, self.candidates)
+        started = time.perf_counter()
+
+        try:
+            # Sparse leg on the pool, dense leg in the calling thread
+            sparse_future = self._pool.submit(self._sparse_leg, query, limit)
+            t0 = time.perf_counter()
+            dense_hits = self.qdrant_handler.search(query_vector, top_k=limit)
+            dense_ms = (time.perf_counter() - t0) * 1000
+            sparse_hits, sparse_ms = sparse_future.result()
+
+            t0 = time.perf_counter()
+            hits, sparse_only = self._fuse(dense_hits, sparse_hits, top_k)
+            fusion_ms = (time.perf_counter() - t0) * 1000
+        except Exception as e:
+            logging.error(f"Hybrid search failed for '{query}': {e}")
+            raise RuntimeError(f"Hybrid search failed: {e}")
+
+        self._record(dense_ms, sparse_ms, fusion_ms, (time.perf_counter() - started) * 1000, sparse_only)
+        return hits
+
+    def search_many(self, queries: List[str], query_vectors, top_k: int = 5) -> List[List[dict]]:
+        """
+        search() for many queries: one batched Qdrant round trip for the dense legs while the BM25
+        legs run on the pool. Each query's latencies are the batch's (dense) or its own (sparse, fusion).
+        """
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+        if len(queries) != len(query_vectors):
+            raise ValueError("queries and query_vectors must have the same length")
+        if not queries:
+            return []
+        limit = max(top_k, self.candidates)
+        started = time.perf_counter()
+
+        try:
+            sparse_futures = [self._pool.submit(self._sparse_leg, query, limit) for query in queries]
+            t0 = time.perf_counter()
+            dense_batches = self.qdrant_handler.search_batch(query_vectors, top_k=limit)
+            dense_ms = (time.perf_counter() - t0) * 1000
+
+            results = []
+            for dense_hits, sparse_future in zip(dense_batches, sparse_futures):
+                sparse_hits, sparse_ms = sparse_future.result()
+                t0 = time.perf_counter()
+                hits, sparse_only = self._fuse(dense_hits, sparse_hits, top_k)
+                fusion_ms = (time.perf_counter() - t0) * 1000
+                self._record(dense_ms, sparse_ms, fusion_ms, (time.perf_counter() - started) * 1000, sparse_only)
+                results.append(hits)
+            return results
+        except Exception as e:
+            logging.error(f"Hybrid batch search failed for {len(queries)} queries: {e}")
+            raise RuntimeError(f"Hybrid search failed: {e}")
+
+    def stats(self) -> dict:
+        """Query count, keyword-only hits and per-leg latency percentiles over the recent window"""
+        with self._stats_lock:
+            latencies = {leg: list(values) for leg, values in self._latencies_ms.items()}
+            queries, sparse_only = self._queries, self._sparse_only_hits
+        return {
+            "queries": queries,
+            "sparse_only_hits": sparse_only,
+            "indexed_chunks": len(self.bm25_index),
+            "latency_ms": {
+                leg: {"p50": _percentile(values, 50), "p95": _percentile(values, 95), "p99": _percentile(values, 99)}
+                for leg, values in latencies.items()
+            },
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+def retrieve_context(query: str, top_k: int = 5, retriever: Optional[HybridRetriever] = None, query_vector=None) -> List[str]:
+    """Texts of the top-k hybrid hits (empty without a retriever and a query embedding)"""
+    if retriever is None or query_vector is None:
+        return []
+    return [hit["text"] for hit in retriever.search(query, query_vector, top_k=top_k)]
@@ -0,0 +1,57 @@
+# test_batcher.py
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from Embeddings.batcher import EmbeddingBatcher
+
+def test_batcher_coalesces_and_returns_each_callers_vector():
+    seen_batches = []
+
+    def embed_fn(texts):
+        seen_batches.append(len(texts))
+        time.sleep(0.01)
+        return np.array([[float(t)] * 3 for t in texts])
+
+    batcher = EmbeddingBatcher(embed_fn, max_batch_size=4, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            vectors = list(pool.map(lambda i: batcher.encode(str(i)), range(12)))
+    finally:
+        batcher.close()
+
+    assert [v[0] for v in vectors] == [float(i) for i in range(12)]
+    assert vectors[0].dtype == np.float32
+    assert max(seen_batches) <= 4 and len(seen_batches) < 12
+
+    stats = batcher.stats()
+    assert stats["items"] == 12 and stats["queue_depth"] == 0
+    assert stats["latency_ms"]["p99"] >= stats["latency_ms"]["p50"] > 0
+
+def test_batcher_propagates_errors():
+    batcher = EmbeddingBatcher(lambda texts: 1 / 0, max_wait_ms=0)
+    try:
+        future = batcher.submit("boom")
+        try:
+            future.result(timeout=5)
+            assert False, "expected failure"
+        except RuntimeError as e:
+            assert "Encoding failed" in str(e)
+    finally:
+        batcher.close()
+
+def test_submit_racing_close_still_resolves():
+    batcher = EmbeddingBatcher(lambda texts: np.ones((len(texts), 3)), max_wait_ms=0)
+    put = batcher._queue.put
+    closer = threading.Thread(target=batcher.close)
+
+    def slow_put(item):
+        if item is not None and not closer.is_alive():
+            closer.start()          # close() arrives between submit()'s closed check and its put
+            time.sleep(0.05)
+        put(item)
+    batcher._queue.put = slow_put
+
+    future = batcher.submit("late")
+    closer.join(timeout=5)
+    assert future.result(timeout=2).shape == (3,)
@@ -0,0 +1,15 @@
+# test_bench_pipeline.py
+from Benchmarks.bench_pipeline import compare
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"results": {"ask": {"throughput": 10.0, "mean_ms": 100.0, "p95_ms": 120.0, "peak_rss_mb": 500.0},
+                            "search": {"throughput": 1000.0, "mean_ms": 1.0, "p95_ms": 1.5, "peak_rss_mb": 500.0}}}
+    report = {"results": {"ask": {"throughput": 7.0, "mean_ms": 143.0, "p95_ms": 130.0, "peak_rss_mb": 500.0},
+                          "search": {"throughput": 500.0, "mean_ms": 2.0, "p95_ms": 3.0, "peak_rss_mb": 500.0},
+                          "rerank": {"throughput": 1.0, "mean_ms": 1.0, "p95_ms": 1.0, "peak_rss_mb": 1.0}}}
+    rows = {(row["benchmark"], row["metric"]): row for row in compare(report, baseline, tolerance=0.2, min_delta_ms=5.0)}
+    assert rows["ask", "throughput"]["regression"] and rows["ask", "throughput"]["change_pct"] == -30.0
+    assert not rows["ask", "p95_ms"]["regression"] and not rows["ask", "peak_rss_mb"]["regression"]
+    # A 1 ms stage getting 1 ms slower is below the noise floor
+    assert not any(rows["search", metric]["regression"] for metric in ("throughput", "p95_ms"))
+    assert all(benchmark != "rerank" for benchmark, _ in rows)
@@ -0,0 +1,53 @@
+# test_bulk_ingest.py
+import os
+import shutil
+import fitz # type: ignore
+from Config.config import AppConfig, IngestionConfig, OCRConfig, RetrievalConfig
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+from RAG_Pipeline.bulk_ingest import BulkIngestor, IngestCheckpoint
+from Utils.standins import StandInCaptioner, StubEmbedder, StubLLM
+from Vectorstore.qdrant_handler import QdrantHandler
+
+def test_checkpoint_resume(tmp_path):
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 v1")
+    checkpoint_path = str(tmp_path / "checkpoints" / "collection.json")
+
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    assert not checkpoint.is_done(str(pdf_path))
+    checkpoint.mark(str(pdf_path), "failed", "hash-v1", "boom")
+    assert not checkpoint.is_done(str(pdf_path))
+    checkpoint.mark(str(pdf_path), "done", "hash-v1")
+
+    # A new run reads the finished file back from disk
+    assert IngestCheckpoint(checkpoint_path).is_done(str(pdf_path))
+
+    # A modified file is ingested again
+    pdf_path.write_bytes(b"%PDF-1.4 v2 changed")
+    os.utime(pdf_path, (0, 0))
+    assert not IngestCheckpoint(checkpoint_path).is_done(str(pdf_path))
+
+def test_identical_files_in_one_run_are_ingested_once(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Pump maintenance. Replace the filter every month.")
+    doc.save(str(pdf_dir / "a.pdf"))
+    doc.close()
+    shutil.copy(pdf_dir / "a.pdf", pdf_dir / "b.pdf")
+
+    config = AppConfig(
+        ocr=OCRConfig(enabled=False),
+        ingestion=IngestionConfig(manifest_dir=str(tmp_path / "manifests"), checkpoint_dir=str(tmp_path / "checkpoints")),
+        retrieval=RetrievalConfig(hybrid=False))
+    handler = QdrantHandler(url=":memory:", collection_name="bulk_copies")
+    pipeline = RAGPipeline(config=config, embedder=StubEmbedder(dim=16, latency_ms=0), captioner=StandInCaptioner(0),
+                           qdrant_handler=handler, llm_client=StubLLM(latency_ms=0))
+    try:
+        ingestor = BulkIngestor(pipeline, parse_workers=1, temp_dir=str(tmp_path / "temp"))
+        report = ingestor.ingest_directory(str(pdf_dir))
+        assert report["skipped"]["duplicate"] == 1 and report["ingested"] == 1
+        assert handler.count() == 1
+        assert all(ingestor.checkpoint.is_done(str(pdf_dir / name)) for name in ("a.pdf", "b.pdf"))
+    finally:
+        pipeline.close()
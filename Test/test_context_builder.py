@@ -0,0 +1,43 @@
+# test_context_builder.py
+from Ingestion.splitter import chunk_text
+from Retrieval.context_builder import ContextBuilder
+
+PAGE = ("Pumps must be primed before start. The primer valve is on the left side. "
+        "Open it for ten seconds. Close it before the motor starts. "
+        "Error ERR-4012 means the pump is dry. Refill the tank and restart.")
+
+def _hits(chunks, pdf_id="doc", scores=None):
+    scores = scores or [1.0 - i / 10 for i in range(len(chunks))]
+    return [(chunk.text, score, {"pdf_id": pdf_id, "page": 1, "start": chunk.start, "end": chunk.end})
+            for chunk, score in zip(chunks, scores)]
+
+def test_overlapping_chunks_of_a_page_are_merged():
+    chunks = chunk_text(PAGE, chunk_size=14, overlap=7)
+    assert len(chunks) > 2
+    # Retrieved out of page order
+    hits = _hits(chunks[::-1])
+    context, report = ContextBuilder(max_tokens=1000).build(hits)
+
+    assert context == " ".join(PAGE.split())
+    assert report["passages_out"] == 1 and report["merged"] == len(chunks) - 1
+    assert report["tokens_saved"] > 0
+
+def test_near_duplicates_dropped_and_budget_enforced():
+    count = lambda texts: [len(text.split()) for text in texts]
+    a = ("The quick brown fox jumps over the lazy dog near the river bank today, "
+         "while the farmer watches from the old wooden bridge and counts his sheep.")
+    hits = [(a, 0.9), ("Picture 1 text : " + a, 0.8), ("Unrelated maintenance schedule for pumps. Check weekly. Replace yearly.", 0.7)]
+    builder = ContextBuilder(max_tokens=35, count_tokens=count, min_fragment_tokens=3)
+    context, report = builder.build(hits)
+
+    assert report["duplicates"] == 1
+    assert report["truncated"] == 1
+    assert count([context])[0] <= 35
+    assert context.startswith(a) and "Check weekly." in context and "Replace yearly." not in context
+    assert builder.stats()["tokens_saved"] == report["tokens_saved"]
+
+def test_edges_order_puts_best_passages_at_both_ends():
+    hits = [(f"passage number {word} unique words here", 1.0 - i / 10) for i, word in enumerate(["one", "two", "three", "four"])]
+    context, _ = ContextBuilder(order="edges", merge_adjacent=False).build(hits)
+    order = [line.split()[2] for line in context.split("\n\n")]
+    assert order == ["one", "three", "four", "two"]
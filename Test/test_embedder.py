@@ -6,6 +6,7 @@ from Ingestion.ocr import run_ocr_on_images
 from Ingestion.image_BlipCaptioner import BlipCaptioner
 from Ingestion.image_Captioner import Image_Captioner
 from Embeddings.embedder import Embedder
+from Utils.standins import build_tiny_model
 
 def test_embedderModel():
     """
@@ -28,5 +29,49 @@ def test_embedderModel():
         shutil.rmtree(temp_dir)
         print(f"\nTemporary folder '{temp_dir}' deleted.")
 
+def test_encode_batch_matches_encode(tmp_path):
+    """
+    Batched, length-sorted encoding must return the same vectors as one-by-one encoding, in input order.
+    """
+    import numpy as np
+
+    embedder = Embedder(model_path=build_tiny_model(str(tmp_path / "tiny")), device=-1, batch_size=2)
+    texts = ["a much longer sentence with many words in it", "short", "medium length text", "x"]
+
+    batched = embedder.encode_batch(texts)
+    single = np.stack([embedder.encode(t).squeeze(0).numpy() for t in texts])
+
+    assert batched.dtype == np.float32
+    assert batched.flags["C_CONTIGUOUS"]
+    assert batched.shape == single.shape
+    assert np.allclose(batched, single, atol=1e-5)
+
+def test_backends_agree_with_torch(tmp_path):
+    """
+    Quantized and ONNX backends must produce vectors close to the fp32 PyTorch baseline.
+    """
+    import numpy as np
+    import pytest
+
+    model_dir = build_tiny_model(str(tmp_path / "tiny"))
+    texts = ["a much longer sentence with many words in it", "short", "medium length text"]
+    reference = Embedder(model_path=model_dir, device=-1).encode_batch(texts)
+
+    backends = ["torch-int8"]
+    try:
+        import onnxruntime # pyright: ignore[reportMissingImports] # noqa: F401
+        backends += ["onnx", "onnx-int8"]
+    except ImportError:
+        pass
+    for backend in backends:
+        embedder = Embedder(model_path=model_dir, device=-1, backend=backend, onnx_dir=str(tmp_path / "onnx"))
+        vectors = embedder.encode_batch(texts)
+        cosines = (reference * vectors).sum(1) / (np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1))
+        assert vectors.shape == reference.shape
+        assert cosines.min() > 0.99, backend
+
+    with pytest.raises(RuntimeError):
+        Embedder(model_path=model_dir, device=-1, backend="tensorrt")
+
 if __name__ == "__main__":
     test_embedderModel()
@@ -0,0 +1,86 @@
+# test_embedding_cache.py
+import multiprocessing
+import os
+import numpy as np
+from Embeddings.embedding_cache import EmbeddingCache
+
+def test_cache_hits_and_persistence(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_key="tiny@rev1", dim=4, max_entries=8, dtype="float32")
+    texts = ["page header", "some sentence"]
+    vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+
+    hits, missing = cache.get_many(texts)
+    assert hits == {} and missing == [0, 1]
+    cache.put_many(texts, vectors)
+    cache.flush()
+
+    # Whitespace differences map to the same entry, and the cache survives a restart
+    reopened = EmbeddingCache(str(tmp_path), model_key="tiny@rev1", dim=4, max_entries=8, dtype="float32")
+    hits, missing = reopened.get_many(["page   header", "new text"])
+    assert missing == [1]
+    assert np.array_equal(hits[0], vectors[0])
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 1
+
+    # Another model revision never sees these vectors
+    other = EmbeddingCache(str(tmp_path), model_key="tiny@rev2", dim=4, max_entries=8, dtype="float32")
+    assert other.get_many(texts)[1] == [0, 1]
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=2, dtype="float16")
+    cache.put_many(["a", "b"], np.ones((2, 2), dtype=np.float32))
+    cache.get_many(["a"])                                   # "b" is now least recently used
+    cache.put_many(["c"], np.full((1, 2), 3.0, dtype=np.float32))
+
+    hits, missing = cache.get_many(["a", "b", "c"])
+    assert missing == [1]
+    assert hits[0].dtype == np.float32 and np.allclose(hits[2], 3.0)
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+def test_index_is_written_every_flush_every_entries(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=8, flush_every=3)
+    index_path = tmp_path / cache.dir / "index.npz"
+    cache.put_many(["a", "b"], np.ones((2, 2), dtype=np.float32))
+    cache.flush_if_due()
+    assert not index_path.exists()
+    cache.put_many(["c"], np.ones((1, 2), dtype=np.float32))
+    cache.flush_if_due()
+    assert index_path.exists()
+
+def _vectors(texts):
+    return np.array([[float(ord(text[0]))] * 2 for text in texts], dtype=np.float32)
+
+def _evict_and_crash(cache_dir):
+    cache = EmbeddingCache(cache_dir, model_key="tiny", dim=2, max_entries=2, dtype="float32", flush_every=1)
+    cache.put_many(["a", "b"], _vectors(["a", "b"]))
+    cache.flush()
+    cache.put_many(["c", "d"], _vectors(["c", "d"]))      # evicts a and b, d may land in a's old slot
+    os._exit(0)                                             # no flush, no close
+
+def test_reopen_after_eviction_never_returns_another_key(tmp_path):
+    crash = multiprocessing.get_context("spawn").Process(target=_evict_and_crash, args=(str(tmp_path),))
+    crash.start()
+    crash.join()
+
+    reopened = EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=2, dtype="float32", flush_every=1)
+    texts = ["a", "b", "c", "d"]
+    hits, missing = reopened.get_many(texts)
+    assert 0 in missing
+    assert all(np.array_equal(vector, _vectors([texts[idx]])[0]) for idx, vector in hits.items())
+
+def test_second_instance_on_a_folder_is_read_only(tmp_path):
+    writer = EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=1, dtype="float32", flush_every=1)
+    writer.put_many(["p"], _vectors(["p"]))
+    writer.flush()
+    reader = EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=1, dtype="float32", flush_every=1)
+    assert writer.stats()["writable"] and not reader.stats()["writable"]
+    assert np.array_equal(reader.get_many(["p"])[0][0], _vectors(["p"])[0])
+
+    # The writer reuses p's slot for r; the reader's snapshot still maps p there but sees the new key
+    writer.put_many(["q", "r"], _vectors(["q", "r"]))
+    assert reader.get_many(["p"]) == ({}, [0])
+    reader.put_many(["s"], _vectors(["s"]))
+    assert writer.get_many(["s"])[1] == [0]
+
+    writer.close()
+    assert EmbeddingCache(str(tmp_path), model_key="tiny", dim=2, max_entries=1, dtype="float32", flush_every=1).writable
+
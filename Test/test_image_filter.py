@@ -0,0 +1,34 @@
+# test_image_filter.py
+import numpy as np
+import pytest
+from PIL import Image
+from Ingestion.image_filter import ImageFilter, decoding_kwargs
+
+def _save(path, array):
+    Image.fromarray(array).save(path)
+    return str(path)
+
+def test_filter_skips_small_and_duplicate_images(tmp_path):
+    rng = np.random.default_rng(0)
+    logo = (rng.random((64, 96, 3)) * 255).astype("uint8")
+    photo = (rng.random((64, 96, 3)) * 255).astype("uint8")
+
+    paths = [
+        _save(tmp_path / "logo_p1.png", logo),
+        _save(tmp_path / "photo.png", photo),
+        _save(tmp_path / "logo_p2.png", logo),                              # byte-identical
+        _save(tmp_path / "logo_p3.jpg", logo),                              # re-encoded, same picture
+        _save(tmp_path / "bullet.png", np.zeros((8, 8, 3), dtype="uint8")),  # too small
+    ]
+    keep, stats = ImageFilter().select(paths)
+    assert keep == [paths[0], paths[1]]
+    assert stats == {"kept": 2, "too_small": 1, "duplicate": 2, "unreadable": 0}
+
+    keep, _ = ImageFilter(dedupe=False, min_area=0, min_width=0, min_height=0).select(paths)
+    assert keep == paths
+
+def test_decoding_presets():
+    assert decoding_kwargs("fast")["num_beams"] == 1
+    assert decoding_kwargs("quality")["num_beams"] > 1
+    with pytest.raises(ValueError):
+        decoding_kwargs("slow")
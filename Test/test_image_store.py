@@ -0,0 +1,49 @@
+# test_image_store.py
+import io
+import os
+import fitz # type: ignore
+import numpy as np
+import pytest
+from PIL import Image
+from Ingestion.pdf_parser import parse_pdf
+from Ingestion.image_filter import ImageFilter
+from Ingestion.image_store import ExtractedImage, image_key, open_image
+
+def _make_pdf(path, pages=2):
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray((rng.random((64, 96, 3)) * 255).astype("uint8")).save(buffer, format="PNG")
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {number} text.")
+        page.insert_image(fitz.Rect(72, 100, 264, 228), stream=buffer.getvalue())
+    doc.save(str(path))
+    doc.close()
+
+def test_images_stay_in_memory(tmp_path):
+    _make_pdf(tmp_path / "doc.pdf")
+    result = parse_pdf(str(tmp_path / "doc.pdf"), str(tmp_path / "temp"))
+
+    assert [image_key(image) for image in result["images"]] == ["page0_img0", "page1_img0"]
+    assert all(isinstance(image, ExtractedImage) and image.path is None for image in result["images"])
+    assert os.listdir(result["output_dir"]) == []
+    assert open_image(result["images"][0]).size == (96, 64)
+
+    # Identical embedded images are recognised without touching the disk
+    keep, stats = ImageFilter().select(result["images"])
+    assert len(keep) == 1 and stats["duplicate"] == 1
+
+def test_images_spill_above_memory_limit(tmp_path):
+    _make_pdf(tmp_path / "doc.pdf")
+    result = parse_pdf(str(tmp_path / "doc.pdf"), str(tmp_path / "temp"), image_memory_limit=0)
+
+    spilled = result["images"]
+    assert all(image.data is None and os.path.dirname(image.path) == result["output_dir"] for image in spilled)
+    assert open_image(spilled[1]).size == (96, 64)
+
+def test_failed_parse_removes_its_folder(tmp_path):
+    (tmp_path / "broken.pdf").write_bytes(b"%PDF-1.4 truncated")
+    with pytest.raises(RuntimeError):
+        parse_pdf(str(tmp_path / "broken.pdf"), str(tmp_path / "temp"))
+    assert os.listdir(tmp_path / "temp") == []
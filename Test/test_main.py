@@ -0,0 +1,77 @@
+# test_main.py
+import time
+import fitz # type: ignore
+import pytest
+from fastapi.testclient import TestClient # pyright: ignore[reportMissingImports]
+import main
+from Config.config import AppConfig, IngestionConfig, OCRConfig, QueryCacheConfig, RetrievalConfig, ServiceConfig
+from LLM.ollama_client import OllamaClient
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+from Utils.standins import StandInCaptioner, StubEmbedder, StubOllamaServer
+from Vectorstore.qdrant_handler import QdrantHandler
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    config = AppConfig(
+        ocr=OCRConfig(enabled=False),
+        ingestion=IngestionConfig(manifest_dir=str(tmp_path / "manifests")),
+        retrieval=RetrievalConfig(index_dir=str(tmp_path / "bm25")),
+        query_cache=QueryCacheConfig(cache_answers=False),
+        service=ServiceConfig(upload_dir=str(tmp_path / "uploads"), model_workers=2, max_finished_jobs=2))
+    with StubOllamaServer(tokens=4, ttft_ms=0, token_ms=0) as server:
+        def build_pipeline(**kwargs):
+            return RAGPipeline(config=config, embedder=StubEmbedder(dim=16, latency_ms=0), captioner=StandInCaptioner(0),
+                               qdrant_handler=QdrantHandler(url=":memory:", collection_name="api"),
+                               llm_client=OllamaClient(url=server.url))
+        monkeypatch.setattr(main, "config", config)
+        monkeypatch.setattr(main, "RAGPipeline", build_pipeline)
+        with TestClient(main.app) as test_client:
+            yield test_client
+
+def _pdf_bytes(text: str) -> bytes:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _wait_for_job(client, job_id: str) -> dict:
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_upload_query_ask_and_metrics(client):
+    response = client.post("/upload_pdf", files={"file": ("pump.pdf", _pdf_bytes("Pump maintenance. Replace the filter every month."), "application/pdf")})
+    assert response.status_code == 202
+    job = _wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "done" and job["result"]["new_chunks"] >= 1
+
+    hits = client.post("/query", json={"question": "how often is the filter replaced", "top_k": 3}).json()["hits"]
+    assert hits and "filter" in hits[0]["text"]
+
+    body = client.post("/ask", json={"question": "how often is the filter replaced"}).text
+    assert body.count('"token"') == 4 and body.endswith("event: done\ndata: {}\n\n")
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200 and "rag_stage_seconds_bucket" in metrics.text
+
+def test_rejected_requests(client):
+    assert client.post("/upload_pdf", files={"file": ("notes.txt", b"text", "text/plain")}).status_code == 400
+    assert client.get("/jobs/unknown").status_code == 404
+    for endpoint in ("/query", "/ask"):
+        assert client.post(endpoint, json={"question": "   "}).status_code == 422
+        assert client.post(endpoint, json={"question": "pump", "top_k": 0}).status_code == 422
+
+def test_job_store_keeps_only_the_last_finished_jobs():
+    jobs = main.JobStore(max_finished=2)
+    ids = [jobs.create(f"{idx}.pdf") for idx in range(4)]
+    for job_id in ids[:3]:
+        jobs.update(job_id, status="running")
+        jobs.update(job_id, status="done")
+    assert jobs.get(ids[0]) is None
+    assert [jobs.get(job_id)["status"] for job_id in ids[1:]] == ["done", "done", "queued"]
+    assert len(jobs) == 3
@@ -0,0 +1,27 @@
+# test_manifest.py
+from Vectorstore.manifest import IngestManifest, make_point_id
+from Utils.utils import text_sha256, make_pdf_id
+
+def test_point_ids_are_deterministic():
+    chunk_hash = text_sha256("Burns is a character.")
+    assert chunk_hash == text_sha256("  Burns is a character.\n")
+    assert make_point_id("report.pdf", chunk_hash) == make_point_id("report.pdf", chunk_hash)
+    assert make_point_id("report.pdf", chunk_hash) != make_point_id("other.pdf", chunk_hash)
+    assert make_pdf_id("report.pdf") == make_pdf_id("report.pdf")
+
+def test_manifest_roundtrip(tmp_path):
+    manifest = IngestManifest(str(tmp_path), "collection")
+    manifest.record("report.pdf", "hash-v1", "report_1234", {"c1": "id1", "c2": "id2"})
+
+    # A fresh instance reads the same state back from disk
+    reloaded = IngestManifest(str(tmp_path), "collection")
+    assert reloaded.find_by_content("hash-v1") == "report.pdf"
+    assert reloaded.find_by_content("hash-v2") is None
+    assert reloaded.chunks("report.pdf") == {"c1": "id1", "c2": "id2"}
+
+    assert sorted(reloaded.remove("report.pdf")) == ["id1", "id2"]
+    assert reloaded.chunks("report.pdf") == {}
+
+    reloaded.record("report.pdf", "hash-v2", "report_1234", {})
+    reloaded.clear()
+    assert IngestManifest(str(tmp_path), "collection").get("report.pdf") is None
@@ -0,0 +1,50 @@
+# test_metrics.py
+import contextvars
+import threading
+import pytest
+from Utils.metrics import MetricsRegistry, Tracer
+
+def test_registry_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("rag_pages_total", "Pages parsed").inc(3, stage="parse")
+    registry.gauge("rag_queue_depth", "Waiting items").set_function(lambda: 7, queue="embed")
+    histogram = registry.histogram("rag_stage_seconds", "Stage latency", buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 5.0):
+        histogram.observe(value, stage="embed")
+
+    text = registry.render()
+    assert "# HELP rag_pages_total Pages parsed" in text and "# TYPE rag_pages_total counter" in text
+    assert 'rag_pages_total{stage="parse"} 3.0' in text
+    assert 'rag_queue_depth{queue="embed"} 7.0' in text
+    assert 'rag_stage_seconds_bucket{stage="embed",le="0.1"} 3.0' in text
+    assert 'rag_stage_seconds_bucket{stage="embed",le="+Inf"} 4.0' in text
+    assert 'rag_stage_seconds_count{stage="embed"} 4.0' in text
+    assert 0.01 < histogram.quantile(0.5, stage="embed") <= 0.1
+    with pytest.raises(ValueError):
+        registry.counter("rag_stage_seconds")
+
+def test_tracer_builds_span_trees_across_threads():
+    tracer = Tracer(MetricsRegistry(), trace_buffer=2)
+    with tracer.trace("ask", top_k=3):
+        with tracer.span("embed", items=1):
+            pass
+        # Worker threads join the trace when run in a copy of the caller's context
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(lambda: tracer.record("generate", 0.01),))
+        worker.start()
+        worker.join()
+    with pytest.raises(KeyError):
+        with tracer.trace("query"):
+            raise KeyError("boom")
+
+    query, ask = tracer.recent_traces()
+    assert query["name"] == "query" and "KeyError" in query["error"]
+    assert ask["attrs"] == {"top_k": 3}
+    assert [child["name"] for child in ask["children"]] == ["embed", "generate"]
+    assert tracer.stage_items.value(stage="embed") == 1
+    assert tracer.requests.value(op="query", status="error") == 1
+    assert tracer.inflight.value(op="ask") == 0
+
+    tracer.enabled = False
+    with tracer.trace("ask") as root:
+        assert root is None
+    assert len(tracer.recent_traces()) == 2
@@ -0,0 +1,64 @@
+# test_ocr.py
+import io
+import os
+import stat
+import pytesseract
+import fitz # type: ignore
+import cv2
+import numpy as np
+from PIL import Image
+from Ingestion.ocr import OCREngine, preprocess_for_ocr, text_likelihood
+from Ingestion.pdf_parser import parse_pdf
+
+def _text_page_image(angle: float = 0.0) -> Image.Image:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 550, 700), "The quick brown fox jumps over the lazy dog. " * 60, fontsize=11)
+    image = Image.open(io.BytesIO(page.get_pixmap(dpi=150).tobytes("png")))
+    return image.rotate(angle, fillcolor="white", expand=True)
+
+def _row_profile_variance(binary: np.ndarray) -> float:
+    return float((255 - binary).sum(axis=1).astype(float).var())
+
+def test_text_likelihood_separates_text_from_photos():
+    assert text_likelihood(preprocess_for_ocr(_text_page_image())) > 0.5
+
+    noise = (np.random.default_rng(0).random((400, 600)) * 255).astype("uint8")
+    photo = cv2.normalize(cv2.GaussianBlur(noise, (31, 31), 10), None, 0, 255, cv2.NORM_MINMAX)
+    assert text_likelihood(preprocess_for_ocr(Image.fromarray(photo))) == 0.0
+
+def test_deskew_straightens_rotated_text():
+    for angle in (4, -4):
+        rotated = _text_page_image(angle)
+        _, raw = cv2.threshold(np.asarray(rotated.convert("L")), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # Horizontal text lines give a sharply peaked row profile
+        assert _row_profile_variance(preprocess_for_ocr(rotated)) > 2 * _row_profile_variance(raw)
+
+def test_scanned_pages_are_rendered(tmp_path):
+    buffer = io.BytesIO()
+    _text_page_image().save(buffer, format="PNG")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Born-digital page.")
+    doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=buffer.getvalue())
+    doc.save(str(tmp_path / "scan.pdf"))
+
+    result = parse_pdf(str(tmp_path / "scan.pdf"), str(tmp_path))
+    assert [scan.name for scan in result["scans"]] == ["page1_scan"]
+    assert parse_pdf(str(tmp_path / "scan.pdf"), str(tmp_path), scan_dpi=0)["scans"] == []
+
+def test_thread_limit_only_reaches_tesseract(tmp_path, monkeypatch):
+    # Fake tesseract: reads the PNG from stdin and prints its OMP_THREAD_LIMIT
+    fake = tmp_path / "tesseract"
+    fake.write_text("#!/bin/sh\ncat > /dev/null\necho \"limit=$OMP_THREAD_LIMIT\"\n")
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", str(fake))
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    image_path = str(tmp_path / "page.png")
+    _text_page_image().save(image_path)
+
+    engine = OCREngine(workers=1)
+    try:
+        assert engine.ocr_images([image_path])[image_path]["text"] == "limit=1"
+    finally:
+        engine.close()
+    assert "OMP_THREAD_LIMIT" not in os.environ
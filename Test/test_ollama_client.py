@@ -0,0 +1,37 @@
+# test_ollama_client.py
+import asyncio
+import time
+from LLM.ollama_client import OllamaClient
+from Utils.standins import StubOllamaServer
+
+def test_stub_ollama_streams_through_client():
+    with StubOllamaServer(tokens=5, ttft_ms=0, token_ms=0) as server:
+        client = OllamaClient(model="stub", url=server.url)
+        stats = []
+        answer = client.generate_answer("question", context="context", max_tokens=3, on_stats=stats.append)
+        client.close()
+    assert answer == "token0 token1 token2"
+    assert stats[0].tokens == 3 and stats[0].eval_tokens == 3
+    assert server.requests == 1
+
+def test_astream_answer_stops_reading_when_consumer_leaves():
+    async def first_token(client):
+        stream = client.astream_answer("question", context="context")
+        token = await stream.__anext__()
+        await stream.aclose()
+        return token
+
+    async def all_tokens(client):
+        return [token async for token in client.astream_answer("question", max_tokens=3)]
+
+    # The stub stalls 3 s between tokens; asyncio.run() also waits for the executor thread to finish
+    with StubOllamaServer(tokens=5, ttft_ms=0, token_ms=3000) as server:
+        client = OllamaClient(model="stub", url=server.url)
+        t0 = time.perf_counter()
+        token = asyncio.run(first_token(client))
+        elapsed_s = time.perf_counter() - t0
+        server.token_delay = 0
+        assert asyncio.run(all_tokens(client)) == [" token0", " token1", " token2"]
+        client.close()
+    assert token == " token0"
+    assert elapsed_s < 1.0
@@ -0,0 +1,22 @@
+# test_pdf_tables.py
+import fitz # type: ignore
+from Benchmarks.bench_pdf_parser import build_pdf, legacy_parse_pdf
+from Ingestion.pdf_parser import page_may_have_table, parse_pdf
+
+def test_table_detection(tmp_path):
+    pdf_path = str(tmp_path / "doc.pdf")
+    build_pdf(pdf_path, pages=4, table_every=2, image_every=0)
+    with fitz.open(pdf_path) as doc:
+        assert [page_may_have_table(page) for page in doc] == [True, False, True, False]
+
+def test_single_pass_matches_legacy(tmp_path):
+    pdf_path = str(tmp_path / "doc.pdf")
+    build_pdf(pdf_path, pages=12, table_every=3, image_every=4)
+    legacy = legacy_parse_pdf(pdf_path, str(tmp_path))
+
+    serial = parse_pdf(pdf_path, str(tmp_path), workers=1)
+    parallel = parse_pdf(pdf_path, str(tmp_path), workers=2, parallel_min_pages=1)
+    for result in (serial, parallel):
+        assert result["tables"] == legacy["tables"] and len(result["tables"]) == 4
+        assert result["text"] == legacy["text"]
+        assert [image.name for image in result["images"]] == ["page0_img0", "page4_img0", "page8_img0"]
@@ -0,0 +1,79 @@
+# test_qdrant_handler.py
+from Config.config import COLLECTION_PROFILES, CollectionProfile
+from Vectorstore.qdrant_handler import QdrantHandler
+
+def test_profile_search_params():
+    assert QdrantHandler._search_params(CollectionProfile()) is None
+    params = QdrantHandler._search_params(COLLECTION_PROFILES["fast"])
+    assert params.hnsw_ef == 64 and params.quantization.rescore
+
+def test_quantized_profile_round_trip():
+    handler = QdrantHandler(url=":memory:", collection_name="profiles", profile=COLLECTION_PROFILES["fast"])
+
+    handler.create_collection(vector_size=3)
+    info = handler.client.get_collection("profiles")
+    assert info.config.hnsw_config.m == COLLECTION_PROFILES["fast"].hnsw_m
+
+    handler.insert_embeddings(["a", "b"], [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], pdf_id=["doc-a", "doc-b"],
+                              ids=[1, 2])
+    hits = handler.search([0.9, 0.1, 0.0], top_k=1)
+    assert hits[0].payload == {"pdf_id": "doc-a", "text": "a", "source": "pdf"}
+    assert handler.count() == 2
+    assert handler.retrieve([2])["2"]["text"] == "b"
+
+def test_chunked_upsert_retries_and_final_barrier():
+    import threading
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    handler = QdrantHandler(url=":memory:", collection_name="chunks", upsert_batch_size=4, backoff_factor=0.0)
+    handler.create_collection(vector_size=3)
+    handler._upsert_pool = ThreadPoolExecutor(max_workers=2)     # parallel path, as with a server
+    upsert, calls, lock = handler.client.upsert, [], threading.Lock()
+
+    def flaky_upsert(collection_name, points, wait=True):
+        with lock:
+            calls.append(wait)
+            if len(calls) == 2:
+                raise ConnectionError("transient")
+            return upsert(collection_name=collection_name, points=points, wait=wait)
+    handler.client.upsert = flaky_upsert
+
+    vectors = np.random.default_rng(0).standard_normal((10, 3)).astype(np.float32)
+    report = handler.insert_embeddings([str(i) for i in range(10)], vectors, ids=list(range(10)))
+
+    assert report["batches"] == 3 and report["retries"] == 1
+    assert calls[-1] is True and calls.count(True) == 1      # only the barrier waits
+    assert handler.count() == 10
+    assert handler.upsert_stats()["points"] == 10
+    handler.close()
+
+def test_failed_parallel_upsert_waits_for_running_batches():
+    import time
+    import threading
+    import pytest
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    handler = QdrantHandler(url=":memory:", collection_name="failing", upsert_batch_size=2, max_retries=0)
+    handler.create_collection(vector_size=3)
+    handler._upsert_pool = ThreadPoolExecutor(max_workers=2)
+    upsert, running, lock = handler.client.upsert, [], threading.Lock()
+
+    def failing_upsert(collection_name, points, wait=True):
+        if 0 in points.ids:
+            time.sleep(0.05)        # the other batch has started by now
+            raise ConnectionError("down")
+        with lock:
+            running.append(points.ids[0])
+        time.sleep(0.2)             # still writing when the other batch fails
+        upsert(collection_name=collection_name, points=points, wait=wait)
+        with lock:
+            running.remove(points.ids[0])
+    handler.client.upsert = failing_upsert
+
+    vectors = np.random.default_rng(0).standard_normal((6, 3)).astype(np.float32)
+    with pytest.raises(RuntimeError):
+        handler.insert_embeddings([str(i) for i in range(6)], vectors, ids=list(range(6)))
+    assert running == []            # no batch keeps writing after the error
+    handler.close()
@@ -0,0 +1,25 @@
+# test_query_cache.py
+from RAG_Pipeline.query_cache import QueryCache
+
+def test_invalidate_drops_results_and_answers():
+    cache = QueryCache(answer_entries=4)
+    key = cache.result_key("docs", [0.1, 0.2], top_k=5)
+    cache.put_results(key, [("text", 0.9)])
+    answer_key = cache.answer_key("docs", "What is it?", "text")
+    cache.put_answer(answer_key, "An answer")
+
+    assert cache.get_results(cache.result_key("docs", [0.1, 0.2], top_k=5)) == [("text", 0.9)]
+    assert cache.get_answer(cache.answer_key("docs", "What  is it?", "text")) == "An answer"
+
+    cache.invalidate("docs")
+    assert cache.get_results(cache.result_key("docs", [0.1, 0.2], top_k=5)) is None
+    assert cache.get_answer(cache.answer_key("docs", "What is it?", "text")) is None
+
+def test_result_computed_during_invalidation_is_not_served():
+    cache = QueryCache()
+    key = cache.result_key("docs", [1.0], top_k=3)     # lookup starts
+    cache.invalidate("docs")                           # ingest finishes meanwhile
+    cache.put_results(key, [("old", 0.5)])              # lookup stores its (stale) result
+
+    assert cache.get_results(cache.result_key("docs", [1.0], top_k=3)) is None
+    assert cache.stats()["results"]["misses"] == 1
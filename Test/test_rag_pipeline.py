@@ -0,0 +1,105 @@
+# test_rag_pipeline.py
+import fitz # type: ignore
+from Config.config import AppConfig, IngestionConfig, OCRConfig, QueryCacheConfig, RetrievalConfig
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline
+from Utils.standins import StandInCaptioner, StubEmbedder, StubLLM
+from Vectorstore.manifest import make_point_id
+from Vectorstore.qdrant_handler import QdrantHandler
+
+class FlakyLLM(StubLLM):
+    def generate_answer(self, prompt: str, context: str = "", max_tokens: int = 512) -> str:
+        if "fail" in prompt:
+            raise ConnectionError("ollama unavailable")
+        return super().generate_answer(prompt, context, max_tokens)
+
+def test_query_many_and_ask_many_keep_input_order(tmp_path):
+    config = AppConfig(
+        ocr=OCRConfig(enabled=False),
+        ingestion=IngestionConfig(manifest_dir=str(tmp_path / "manifests")),
+        retrieval=RetrievalConfig(index_dir=str(tmp_path / "bm25")),
+        query_cache=QueryCacheConfig(cache_answers=False))
+    embedder = StubEmbedder(dim=16, latency_ms=0)
+    handler = QdrantHandler(url=":memory:", collection_name="batched")
+    pipeline = RAGPipeline(config=config, embedder=embedder, captioner=object(), qdrant_handler=handler,
+                           llm_client=FlakyLLM(latency_ms=0))
+    try:
+        sentences = [f"sentence {i} about topic {i % 5}" for i in range(40)]
+        handler.create_collection(vector_size=16)
+        ids = [make_point_id("doc", str(i)) for i in range(len(sentences))]
+        pipeline._insert_points(sentences, embedder.encode_batch(sentences), "doc", ids, None)
+
+        questions = ["topic 3", "sentence 7", "topic 3", "fail on topic 1"]
+        batched = pipeline.query_many(questions, top_k=3)
+        assert [item["question"] for item in batched] == questions
+        for item in batched:
+            assert item["results"] == pipeline.query(item["question"], top_k=3)
+            assert set(item["timings_ms"]) == {"embed", "search", "rerank"}
+
+        answers = pipeline.ask_many(questions, top_k=3, concurrency=2)
+        assert [item["answer"] for item in answers[:3]] == [pipeline.ask(q, top_k=3) for q in questions[:3]]
+        assert answers[3]["answer"] is None and "ollama unavailable" in answers[3]["error"]
+        assert all(item["timings_ms"]["total"] >= item["timings_ms"]["retrieve"] for item in answers)
+
+        # ask_many's generations run on worker threads but still land in its span tree
+        trace = next(trace for trace in pipeline.recent_traces() if trace["name"] == "ask_many")
+        generations = [child for child in trace["children"] if child["name"] == "generate"]
+        assert len(generations) == 4 and sum("error" in child for child in generations) == 1
+        assert "rag_stage_seconds_bucket" in pipeline.metrics_text()
+    finally:
+        pipeline.close()
+
+def test_sparse_index_resyncs_when_point_ids_differ(tmp_path):
+    # A delete plus an insert by another process keeps the point count equal
+    config = AppConfig(
+        ocr=OCRConfig(enabled=False),
+        ingestion=IngestionConfig(manifest_dir=str(tmp_path / "manifests")),
+        retrieval=RetrievalConfig(index_dir=str(tmp_path / "bm25")))
+    embedder = StubEmbedder(dim=16, latency_ms=0)
+    handler = QdrantHandler(url=":memory:", collection_name="resync")
+    pipeline = RAGPipeline(config=config, embedder=embedder, captioner=object(), qdrant_handler=handler,
+                           llm_client=StubLLM(latency_ms=0))
+    try:
+        handler.create_collection(vector_size=16)
+        sentences = ["alpha pump", "beta valve"]
+        ids = [make_point_id("doc", str(i)) for i in range(len(sentences))]
+        pipeline._insert_points(sentences, embedder.encode_batch(sentences), "doc", ids, None)
+        pipeline._flush_sparse_index()
+
+        replacement = make_point_id("doc", "2")
+        handler.delete_points([ids[0]])
+        handler.insert_embeddings(sentences=["gamma motor"], embeddings=embedder.encode_batch(["gamma motor"]),
+                                  pdf_id="doc", source="pdf", ids=[replacement], payloads=None)
+        assert handler.count() == len(pipeline.bm25_index)
+        pipeline._sync_sparse_index()
+        assert pipeline.bm25_index.point_ids() == {ids[1], replacement}
+    finally:
+        pipeline.close()
+
+def test_reingest_refreshes_location_of_unchanged_chunks(tmp_path):
+    def write_pdf(path, pages):
+        doc = fitz.open()
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(str(path))
+        doc.close()
+
+    config = AppConfig(
+        ocr=OCRConfig(enabled=False),
+        ingestion=IngestionConfig(manifest_dir=str(tmp_path / "manifests")),
+        retrieval=RetrievalConfig(hybrid=False))
+    handler = QdrantHandler(url=":memory:", collection_name="moved")
+    pipeline = RAGPipeline(config=config, embedder=StubEmbedder(dim=16, latency_ms=0), captioner=StandInCaptioner(0),
+                           qdrant_handler=handler, llm_client=StubLLM(latency_ms=0))
+    try:
+        manual = "Pump maintenance. Replace the filter every month."
+        write_pdf(tmp_path / "v1.pdf", [manual])
+        write_pdf(tmp_path / "v2.pdf", ["Safety notice. Disconnect power first.", manual])
+        pipeline.ingest_pdf(str(tmp_path / "v1.pdf"), temp_dir=str(tmp_path / "temp"), doc_key="manual.pdf")
+        (point_id, before), = handler.retrieve(list(pipeline.manifest.chunks("manual.pdf").values())).items()
+
+        result = pipeline.ingest_pdf(str(tmp_path / "v2.pdf"), temp_dir=str(tmp_path / "temp"), doc_key="manual.pdf")
+        assert result["new_chunks"] == 1 and result["stale_chunks"] == 0
+        after = handler.retrieve([point_id])[point_id]
+        assert after["text"] == before["text"] and after["page"] == before["page"] + 1
+    finally:
+        pipeline.close()
@@ -0,0 +1,29 @@
+# test_reranker.py
+from Retrieval.reranker import CrossEncoderReranker
+from Utils.standins import build_tiny_cross_encoder
+
+def test_rerank_orders_by_score_and_caches(tmp_path):
+    reranker = CrossEncoderReranker(build_tiny_cross_encoder(str(tmp_path / "ce")), batch_size=2)
+    hits = [(f"chunk number {i} about pumps", 1.0 - i / 10) for i in range(5)]
+
+    reranked, info = reranker.rerank("pump fault", hits, top_k=3)
+    assert info["reranked"] and info["scored"] == 5 and len(reranked) == 3
+    scores = [score for _, score in reranked]
+    assert scores == sorted(scores, reverse=True)
+
+    again, info = reranker.rerank("pump fault", hits, top_k=3)
+    assert again == reranked
+    assert info["cached"] == 5 and info["scored"] == 0
+
+    # Pipeline hits carry their chunk location as a third field, it is kept
+    located, info = reranker.rerank("pump fault", [hit + ({"page": i},) for i, hit in enumerate(hits)], top_k=3)
+    assert [(text, score) for text, score, _ in located] == reranked
+    assert all(location["page"] == int(text.split()[2]) for text, _, location in located)
+
+def test_rerank_budget_falls_back_to_retrieval_order(tmp_path):
+    reranker = CrossEncoderReranker(build_tiny_cross_encoder(str(tmp_path / "ce")))
+    hits = [(f"text {i}", 1.0 - i / 10) for i in range(4)]
+    reranked, info = reranker.rerank("query", hits, top_k=2, budget_ms=0)
+    assert info["fallback"]
+    assert reranked == hits[:2]
+    assert reranker.stats()["fallbacks"] == 1
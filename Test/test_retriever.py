@@ -0,0 +1,80 @@
+# test_retriever.py
+import uuid
+import pytest
+from Retrieval.bm25_index import BM25Index, tokenize
+from Retrieval.retriever import reciprocal_rank_fusion
+
+def _ids(n):
+    return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk-{i}")) for i in range(n)]
+
+def test_tokenize_keeps_identifiers():
+    tokens = tokenize("Error ERR-4012 raised in src/app.py")
+    assert "err-4012" in tokens and "4012" in tokens
+    assert "src/app.py" in tokens and "app" in tokens
+
+def test_bm25_exact_identifier_and_removal(tmp_path):
+    ids = _ids(4)
+    texts = ["The pump reported error ERR-4012 during startup.",
+             "General maintenance notes for the pump.",
+             "Error codes are listed in the appendix.",
+             "Startup sequence of the controller."]
+    index = BM25Index(str(tmp_path), "docs")
+    index.add(ids, texts)
+    hits = index.search("what does ERR-4012 mean", top_k=2)
+    assert hits[0][0] == ids[0]
+
+    index.remove([ids[0]])
+    assert len(index) == 3
+    assert all(point_id != ids[0] for point_id, _ in index.search("ERR-4012 pump", top_k=4))
+
+def test_bm25_persistence_round_trip(tmp_path):
+    ids = _ids(50)
+    texts = [f"chunk {i} about topic{i % 7} with code X-{i}" for i in range(50)]
+    index = BM25Index(str(tmp_path), "docs")
+    index.add(ids, texts)
+    index.remove(ids[:20])      # enough tombstones to compact on flush
+    index.flush()
+
+    reloaded = BM25Index(str(tmp_path), "docs")
+    assert len(reloaded) == 30
+    for query in ("topic3", "x-42", "chunk code"):
+        assert reloaded.search(query, top_k=10) == index.search(query, top_k=10)
+
+def test_bm25_integer_point_ids(tmp_path):
+    # Existing collections may use Qdrant's unsigned integer ids
+    ids = [7, 2**63, _ids(1)[0]]
+    index = BM25Index(str(tmp_path), "docs")
+    index.add(ids, ["alpha pump", "beta valve", "gamma pump"])
+    index.flush()
+
+    reloaded = BM25Index(str(tmp_path), "docs")
+    assert {point_id for point_id, _ in reloaded.search("pump valve", top_k=3)} == {str(point_id) for point_id in ids}
+    with pytest.raises(ValueError):
+        reloaded.add(["chunk-1"], ["not a Qdrant id"])
+
+def test_bm25_flush_merges_changes_of_another_instance(tmp_path):
+    # e.g. the API service and the bulk ingest CLI on the same index folder
+    ids = _ids(6)
+    service = BM25Index(str(tmp_path), "docs")
+    bulk = BM25Index(str(tmp_path), "docs")
+    service.add(ids[:3], ["alpha pump", "beta valve", "gamma pump"])
+    service.flush()
+    bulk.add(ids[3:], ["delta pump", "epsilon valve", "zeta motor"])
+    bulk.remove([ids[1]])
+    bulk.flush()
+    service.add([ids[0]], ["alpha pump rewritten"])
+    service.flush()
+
+    reloaded = BM25Index(str(tmp_path), "docs")
+    assert reloaded.point_ids() == set(ids) - {ids[1]}
+    assert reloaded.search("rewritten", top_k=1)[0][0] == ids[0]
+    # Searches pick up what the other instance saved
+    assert service.search("motor", top_k=1)[0][0] == ids[5]
+    assert bulk.search("rewritten", top_k=1)[0][0] == ids[0]
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+    order = [item for item, _ in fused]
+    assert order[0] == "c"      # found by both legs
+    assert set(order) == {"a", "b", "c", "d"}
+    assert fused[0][1] > fused[1][1]
@@ -0,0 +1,47 @@
+# test_splitter.py
+import pytest
+from Ingestion.splitter import split_sentences, chunk_text, chunk_pages
+from Embeddings.embedder import Embedder
+from Utils.standins import build_tiny_model
+
+def test_split_sentences_keeps_offsets():
+    text = "Hello world. This is (a test. Inside) parens; Next one!  3 items.\n\nNew paragraph without end"
+    spans = split_sentences(text)
+    assert [text[start:end] for start, end in spans] == [
+        "Hello world.", "This is (a test. Inside) parens;", "Next one!", "3 items.", "New paragraph without end"]
+    assert split_sentences("   ") == []
+
+def test_chunks_respect_budget_and_overlap():
+    text = " ".join(f"Sentence number {i} has seven words." for i in range(40))
+    chunks = chunk_text(text, chunk_size=30, overlap=10)
+
+    assert all(chunk.tokens <= 30 for chunk in chunks)
+    assert all(chunk.text == " ".join(text[chunk.start:chunk.end].split()) for chunk in chunks)
+    # Each chunk starts with the last sentence of the previous one
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start < previous.end
+    assert chunks[-1].end == len(text)
+
+def test_long_sentences_are_cut_at_words():
+    chunks = chunk_text("word " * 95, chunk_size=30, overlap=0)
+    assert [chunk.tokens for chunk in chunks] == [30, 30, 30, 5]
+
+    # A long sentence after a short one keeps its offsets into the source text
+    text = "Hello world. This is (a test. with paren) stuff; " + " ".join(f"w{i}" for i in range(20))
+    chunks = chunk_text(text, chunk_size=5, overlap=2)
+    assert all(chunk.tokens <= 5 for chunk in chunks)
+    assert all(chunk.text == " ".join(text[chunk.start:chunk.end].split()) for chunk in chunks)
+    covered = {word for chunk in chunks for word in chunk.text.split()}
+    assert covered == set(text.split())
+    with pytest.raises(ValueError):
+        chunk_text("text", chunk_size=10, overlap=10)
+
+def test_chunk_pages_with_embedder_tokenizer(tmp_path):
+    embedder = Embedder(model_path=build_tiny_model(str(tmp_path / "tiny")), device=-1)
+    assert embedder.max_tokens == 510
+
+    pages = [(0, "First page. It has two sentences."), (3, "Scanned text, on page four.")]
+    chunks = chunk_pages(pages, chunk_size=8, overlap=2, count_tokens=embedder.count_tokens)
+    assert {chunk.page for chunk in chunks} == {0, 3}
+    assert all(len(embedder.tokenizer(chunk.text, add_special_tokens=False)["input_ids"]) <= 8 for chunk in chunks)
+    assert chunks[-1].provenance() == {"page": 3, "start": 0, "end": len(pages[1][1])}
@@ -0,0 +1,98 @@
+# Utils/cache.py
+
+"""
+Small thread-safe LRU cache with hit/miss counters.
+Shared by the embedding cache and the query-side caches.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    Usage:
+        cache = LRUCache(max_entries=1024)
+        cache.put("key", value)
+        value = cache.get("key")        # None on miss
+    on_evict(key, value) is called (under the cache lock) for every entry pushed out by put().
+    """
+    def __init__(self, max_entries: int = 1024, on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Lookup without touching recency or counters"""
+        with self.lock:
+            return self._data.get(key, default)
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                old_key, old_value = self._data.popitem(last=False)
+                self.evictions += 1
+                if self.on_evict is not None:
+                    self.on_evict(old_key, old_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            return self._data.pop(key, default)
+
+    def remove_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate; returns how many were removed"""
+        with self.lock:
+            doomed = [key for key in self._data if predicate(key)]
+            for key in doomed:
+                del self._data[key]
+            return len(doomed)
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of (key, value) pairs, least recently used first"""
+        with self.lock:
+            return list(self._data.items())
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self._data
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,72 @@
+# Utils/filelock.py
+
+"""
+Exclusive inter-process lock on a lock file (flock, or msvcrt on Windows).
+Used where several processes share files on disk, e.g. the API service and the bulk ingest CLI.
+The lock is tied to the open file, so it is released when the holder exits or crashes.
+"""
+
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    Usage:
+        with FileLock("Cache/bm25/pdf_embeddings.lock"):
+            ...                                 # blocks until no other process holds it
+        lock = FileLock(path)
+        if lock.acquire(blocking=False):        # False when another process (or instance) holds it
+            ...
+            lock.release()
+    """
+    def __init__(self, path: str, poll_interval: float = 0.05):
+        if not isinstance(path, str) or not path:
+            raise ValueError("path must be a non-empty string")
+        self.path = path
+        self.poll_interval = poll_interval
+        self._file = None
+
+    @property
+    def locked(self) -> bool:
+        return self._file is not None
+
+    def _try(self, f) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._file is not None:
+            raise RuntimeError(f"Lock {self.path} is already held by this instance")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+b")
+        while not self._try(f):
+            if not blocking:
+                f.close()
+                return False
+            time.sleep(self.poll_interval)
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
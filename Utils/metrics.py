@@ -0,0 +1,401 @@
+# Utils/metrics.py
+
+"""
+In-process metrics and tracing, cheap enough to leave on.
+Counters, gauges and fixed-bucket histograms live in a registry that renders the Prometheus
+text exposition format. Tracer spans time a pipeline stage into one stage histogram and,
+inside a request started with tracer.trace(), also build that request's span tree; the last
+finished trees are kept in a bounded buffer.
+"""
+
+import abc
+import bisect
+import contextvars
+import itertools
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond cache hits up to multi-minute PDF ingests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        """[(name suffix, labels, value)]"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{_format_labels(key)} {_format_value(value)}"
+                     for suffix, key, value in self.samples())
+        return lines
+
+class Counter(_Metric):
+    """Monotonic count per label set, e.g. counter.inc(3, stage="embed")"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+class Gauge(_Metric):
+    """Current value per label set; set_function() samples a callable at export time (e.g. queue sizes)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._functions.pop(key, None)
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = _label_key(labels)
+        with self._lock:
+            fn = self._functions.get(key)
+            value = self._values.get(key, 0.0)
+        return float(fn()) if fn is not None else value
+
+    def samples(self):
+        with self._lock:
+            samples = [("", key, value) for key, value in self._values.items()]
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                samples.append(("", key, float(fn())))
+            except Exception as e:
+                logging.warning(f"Gauge {self.name} callback failed: {e}")
+        return samples
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram per label set: observe() is a bisect plus two additions under a lock.
+    quantile() interpolates within buckets, so percentiles are estimates at bucket resolution.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        if not buckets or list(buckets) != sorted(buckets):
+            raise ValueError("buckets must be a non-empty increasing sequence")
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self._series: Dict[LabelKey, list] = {}      # key -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value: float, **labels):
+        idx = bisect.bisect_left(self.buckets, value)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def _copy(self, key: LabelKey):
+        with self._lock:
+            series = self._series.get(key)
+            return (list(series[0]), series[1]) if series is not None else None
+
+    def count(self, **labels) -> int:
+        series = self._copy(_label_key(labels))
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, **labels) -> float:
+        """Estimated q-quantile (0..1) of the observations with these labels, 0.0 when there are none"""
+        series = self._copy(_label_key(labels))
+        total = sum(series[0]) if series else 0
+        if not total:
+            return 0.0
+        rank, seen = q * total, 0
+        for idx, count in enumerate(series[0]):
+            if count and seen + count >= rank:
+                if idx == len(self.buckets):        # +Inf bucket, best answer is the largest bound
+                    return self.buckets[-1]
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                return lower + (self.buckets[idx] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, dict]:
+        """{label values: {"count", "sum", "p50", "p95", "p99"}}, e.g. {"embed": {...}} for one label"""
+        with self._lock:
+            keys = list(self._series)
+        result = {}
+        for key in keys:
+            labels = dict(key)
+            counts, total = self._copy(key)
+            name = key[0][1] if len(key) == 1 else ",".join(f"{label}={value}" for label, value in key)
+            result[name] = {"count": sum(counts), "sum": total,
+                            **{f"p{pct}": self.quantile(pct / 100, **labels) for pct in (50, 95, 99)}}
+        return result
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        samples = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", key + (("le", _format_value(bound)),), cumulative))
+            samples.append(("_sum", key, total))
+            samples.append(("_count", key, cumulative))
+        return samples
+
+class MetricsRegistry:
+    """
+    Usage:
+        registry = MetricsRegistry()
+        registry.counter("rag_pages_total", "Pages parsed").inc(stage="parse")
+        registry.histogram("rag_stage_seconds", "Stage latency").observe(0.012, stage="embed")
+        text = registry.render()        # Prometheus text format
+    Metrics are created on first use and shared by name afterwards.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+# Process-wide registry, exported by the HTTP service on /metrics
+REGISTRY = MetricsRegistry()
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "items", "error", "children")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+        self.items = None           # work units handled by the stage (pages, texts, points, ...)
+        self.error = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        span = {"name": self.name, "start_ms": round((self.start - origin) * 1000, 3),
+                "duration_ms": None if self.duration is None else round(self.duration * 1000, 3)}
+        if self.attrs:
+            span["attrs"] = self.attrs
+        if self.items is not None:
+            span["items"] = self.items
+        if self.error is not None:
+            span["error"] = self.error
+        if self.children:
+            span["children"] = [child.to_dict(origin) for child in list(self.children)]
+        return span
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Usage:
+        tracer = Tracer()
+        with tracer.trace("ask", top_k=5):              # one request, root of a span tree
+            with tracer.span("embed", items=1):
+                ...
+        tracer.recent_traces()                          # [{"trace_id", "name", ..., "children": [...]}]
+
+    Every span feeds rag_stage_seconds{stage} and rag_stage_items_total{stage}; requests feed
+    rag_request_seconds{op}, rag_requests_total{op,status} and rag_inflight_requests{op}.
+    Outside a trace a span only updates the metrics. The active span is a context variable, so
+    worker threads join a trace only when run in a copy of the caller's context.
+    With enabled=False spans and traces record nothing.
+    """
+    def __init__(self, registry: MetricsRegistry = REGISTRY, trace_buffer: int = 256, enabled: bool = True):
+        if not isinstance(trace_buffer, int) or trace_buffer < 0:
+            raise ValueError("trace_buffer must be a non-negative integer")
+        self.enabled = enabled
+        self.stage_seconds = registry.histogram("rag_stage_seconds", "Latency of pipeline stages in seconds")
+        self.stage_items = registry.counter("rag_stage_items_total", "Work items (pages, images, chunks, texts, points) processed per stage")
+        self.request_seconds = registry.histogram("rag_request_seconds", "End-to-end latency of pipeline requests in seconds")
+        self.requests = registry.counter("rag_requests_total", "Pipeline requests by outcome")
+        self.inflight = registry.gauge("rag_inflight_requests", "Pipeline requests currently running")
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=trace_buffer)
+        self._trace_ids = itertools.count(1)
+
+    def _finish_span(self, span: Span, parent: Optional[Span]):
+        span.duration = time.perf_counter() - span.start
+        self.stage_seconds.observe(span.duration, stage=span.name)
+        if span.items:
+            self.stage_items.inc(span.items, stage=span.name)
+        if parent is not None:
+            parent.children.append(span)    # list.append is atomic, stages may finish on several threads
+
+    @contextmanager
+    def span(self, name: str, items: Optional[int] = None, **attrs):
+        """Time one stage; `items` (or span.items set inside the block) counts its work units"""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(name, attrs)
+        span.items = items
+        token = _current_span.set(span) if parent is not None else None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+            self._finish_span(span, parent)
+
+    def record(self, name: str, seconds: float, items: Optional[int] = None, **attrs):
+        """Record a stage timed elsewhere (e.g. across generator steps) under the active span"""
+        if not self.enabled:
+            return
+        span = Span(name, attrs)
+        span.start -= seconds
+        span.items = items
+        self._finish_span(span, _current_span.get())
+
+    def start(self, name: str, **attrs) -> Optional[Span]:
+        """Open a request without activating it, for requests whose steps run as generator steps"""
+        if not self.enabled:
+            return None
+        self.inflight.inc(op=name)
+        return Span(name, attrs)
+
+    @contextmanager
+    def activate(self, root: Optional[Span]):
+        """Make `root` the active span for the block; the block must not span a generator yield"""
+        if root is None:
+            yield None
+            return
+        token = _current_span.set(root)
+        try:
+            yield root
+        finally:
+            _current_span.reset(token)
+
+    def finish(self, root: Optional[Span], error: Optional[BaseException] = None):
+        if root is None:
+            return
+        root.duration = time.perf_counter() - root.start
+        if error is not None:
+            root.error = f"{type(error).__name__}: {error}"
+        self.inflight.dec(op=root.name)
+        self.request_seconds.observe(root.duration, op=root.name)
+        self.requests.inc(op=root.name, status="error" if root.error else "ok")
+        with self._lock:
+            self._traces.append((next(self._trace_ids), time.time(), root))
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """One request: root span of a tree. Nested inside another trace it is a plain span."""
+        if not self.enabled:
+            yield None
+            return
+        if _current_span.get() is not None:
+            with self.span(name, **attrs) as span:
+                yield span
+            return
+        root = self.start(name, **attrs)
+        error = None
+        try:
+            with self.activate(root):
+                yield root
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(root, error)
+
+    def recent_traces(self, limit: Optional[int] = None) -> List[dict]:
+        """Finished request span trees, newest first"""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        if limit is not None:
+            traces = traces[:limit]
+        return [{"trace_id": trace_id, "timestamp": timestamp, **root.to_dict()} for trace_id, timestamp, root in traces]
+
+    def stage_summary(self) -> Dict[str, dict]:
+        """Per-stage and per-request count, total seconds and estimated p50/p95/p99 seconds"""
+        return {"stages": self.stage_seconds.summary(), "requests": self.request_seconds.summary()}
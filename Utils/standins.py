@@ -0,0 +1,168 @@
+# Utils/standins.py
+
+"""
+Offline stand-ins for the pipeline's models and services, shared by the tests and the benchmarks.
+- build_tiny_model / build_tiny_cross_encoder: randomly initialised BERT models on a tiny vocabulary
+- StubEmbedder, StubLLM: deterministic embedder and LLM with fixed latencies
+- StandInCaptioner: fixed caption per image
+- StubOllamaServer: in-process HTTP server speaking Ollama's /api/generate
+"""
+
+import os
+import json
+import time
+import string
+import hashlib
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Ingestion.image_store import image_key
+
+def build_tiny_model(model_dir):
+    """
+    Save a tiny randomly initialised BERT model + tokenizer so Embedder can be tested offline.
+    """
+    from transformers import BertConfig, BertModel, BertTokenizerFast # pyright: ignore[reportMissingImports]
+
+    os.makedirs(model_dir, exist_ok=True)
+    vocab_path = os.path.join(model_dir, "vocab.txt")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list(string.ascii_lowercase) + list(string.digits) + [".", ","]
+    with open(vocab_path, "w") as f:
+        f.write("\n".join(vocab))
+
+    BertTokenizerFast(vocab_path).save_pretrained(model_dir)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2,
+                        num_attention_heads=2, intermediate_size=64)
+    BertModel(config).save_pretrained(model_dir)
+    return model_dir
+
+def build_tiny_cross_encoder(model_dir):
+    """Tiny randomly initialised single-logit BERT cross-encoder sharing the tiny test vocabulary"""
+    from transformers import BertConfig, BertForSequenceClassification # pyright: ignore[reportMissingImports]
+    build_tiny_model(model_dir)
+    config = BertConfig.from_pretrained(model_dir, num_labels=1)
+    BertForSequenceClassification(config).save_pretrained(model_dir)
+    return model_dir
+
+class StubEmbedder:
+    """Deterministic pseudo-embeddings with a fixed per-call latency"""
+    def __init__(self, dim: int = 64, latency_ms: float = 15.0):
+        self.dim = dim
+        self.latency = latency_ms / 1000.0
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def encode(self, texts):
+        import torch # pyright: ignore[reportMissingImports]
+        texts = [texts] if isinstance(texts, str) else texts
+        time.sleep(self.latency)
+        return torch.from_numpy(np.stack([self._vector(t) for t in texts]))
+
+    def encode_batch(self, texts, batch_size=None, use_cache=True):
+        time.sleep(self.latency)
+        return np.stack([self._vector(t) for t in texts])
+
+    def cache_stats(self):
+        return {}
+
+class StubLLM:
+    """generate_answer() stand-in with a fixed latency"""
+    def __init__(self, latency_ms: float = 200.0):
+        self.latency = latency_ms / 1000.0
+
+    def generate_answer(self, prompt: str, context: str = "", max_tokens: int = 512) -> str:
+        time.sleep(self.latency)
+        return f"answer to: {prompt}"
+
+class StubOllamaServer:
+    """
+    Ollama /api/generate stand-in on 127.0.0.1: waits ttft_ms, then streams `tokens` NDJSON chunks
+    token_ms apart (or returns one JSON body when "stream" is false).
+    Usage:
+        with StubOllamaServer(tokens=32, ttft_ms=50) as server:
+            OllamaClient(url=server.url).generate_answer("question", context="...")
+    """
+    def __init__(self, tokens: int = 32, ttft_ms: float = 50.0, token_ms: float = 2.0):
+        self.tokens = tokens
+        self.ttft = ttft_ms / 1000.0
+        self.token_delay = token_ms / 1000.0
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ollama", daemon=True)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"       # keep-alive, like Ollama, so the client's pool is exercised
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send(200, b"Ollama is running", "text/plain")
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate":
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                stub.requests += 1
+                tokens = min(stub.tokens, request.get("options", {}).get("num_predict", stub.tokens))
+                done = {"model": request.get("model"), "response": "", "done": True,
+                        "prompt_eval_count": len(request.get("prompt", "").split()), "eval_count": tokens}
+                time.sleep(stub.ttft)
+                if not request.get("stream", True):
+                    time.sleep(stub.token_delay * tokens)
+                    self._send(200, json.dumps(dict(done, response=" ".join(["token"] * tokens))).encode())
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for idx in range(tokens):
+                    self._chunk({"model": request.get("model"), "response": f" token{idx}", "done": False})
+                    time.sleep(stub.token_delay)
+                self._chunk(done)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data: dict):
+                line = json.dumps(data).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self) -> "StubOllamaServer":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StandInCaptioner:
+    """Captioner stand-in: one fixed caption per image after latency_ms per image"""
+    def __init__(self, latency_ms: float = 25.0):
+        self.latency = latency_ms / 1000.0
+
+    def caption(self, images):
+        time.sleep(self.latency * len(images))
+        return {image_key(image): "a chart of synthetic measurements" for image in images}
@@ -1,7 +1,27 @@
 # Utils/utils.py
 import re
+import os
+import uuid
+import hashlib
 import logging
 
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha256(text: str) -> str:
+    """Hex SHA-256 of a text chunk with surrounding whitespace ignored"""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+def make_pdf_id(doc_key: str) -> str:
+    """Stable pdf_id for a document key (usually the file name): <basename>_<8 hex chars>"""
+    base_name = os.path.splitext(os.path.basename(doc_key))[0]
+    return f"{base_name}_{uuid.uuid5(uuid.NAMESPACE_URL, doc_key).hex[:8]}"
+
 def format_text_by_sentences(text: str, max_words: int = 100) -> str:
     if not isinstance(text, str):
         raise ValueError("text must be a string")
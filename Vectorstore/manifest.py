@@ -0,0 +1,92 @@
+## manifest.py
+
+"""
+Local manifest of ingested documents and chunks, one JSON file per Qdrant collection.
+Drives deduplication and incremental re-ingestion:
+- unchanged file content      -> ingestion is a no-op
+- changed file (same doc_key) -> only new chunks are embedded, stale chunks are deleted
+Thread-safe via an instance lock; writes are atomic (temp file + rename).
+"""
+
+import os
+import json
+import uuid
+import threading
+import logging
+from typing import Dict, List, Optional
+
+def make_point_id(doc_key: str, chunk_hash: str) -> str:
+    """Deterministic Qdrant point id for a chunk of a document"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc_key}:{chunk_hash}"))
+
+class IngestManifest:
+    """
+    Layout of <manifest_dir>/<collection_name>.json:
+        {"documents": {doc_key: {"content_hash": str, "pdf_id": str, "chunks": {chunk_hash: point_id}}}}
+    """
+    def __init__(self, manifest_dir: str = "Cache/manifests", collection_name: str = "pdf_embeddings"):
+        if not isinstance(manifest_dir, str) or not manifest_dir:
+            raise ValueError("manifest_dir must be a non-empty string")
+        if not isinstance(collection_name, str) or not collection_name:
+            raise ValueError("collection_name must be a non-empty string")
+
+        self.lock = threading.Lock()
+        self.path = os.path.join(manifest_dir, f"{collection_name}.json")
+        self._documents: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("documents", {})
+        except Exception as e:
+            # A corrupt manifest only costs a full re-ingest, never wrong answers
+            logging.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self._documents}, f)
+        os.replace(tmp_path, self.path)
+
+    def find_by_content(self, content_hash: str) -> Optional[str]:
+        """Return the doc_key of an already ingested document with this content hash, if any"""
+        with self.lock:
+            for doc_key, doc in self._documents.items():
+                if doc["content_hash"] == content_hash:
+                    return doc_key
+            return None
+
+    def get(self, doc_key: str) -> Optional[dict]:
+        with self.lock:
+            doc = self._documents.get(doc_key)
+            return None if doc is None else {**doc, "chunks": dict(doc["chunks"])}
+
+    def chunks(self, doc_key: str) -> Dict[str, str]:
+        """chunk_hash -> point_id of the last ingested version of doc_key (empty if unknown)"""
+        doc = self.get(doc_key)
+        return {} if doc is None else doc["chunks"]
+
+    def record(self, doc_key: str, content_hash: str, pdf_id: str, chunks: Dict[str, str]):
+        """Store the chunk set of the version that was just ingested"""
+        with self.lock:
+            self._documents[doc_key] = {"content_hash": content_hash, "pdf_id": pdf_id, "chunks": dict(chunks)}
+            self._save()
+
+    def remove(self, doc_key: str) -> List[str]:
+        """Forget a document; returns its point ids so the caller can delete them"""
+        with self.lock:
+            doc = self._documents.pop(doc_key, None)
+            if doc is not None:
+                self._save()
+            return [] if doc is None else list(doc["chunks"].values())
+
+    def clear(self):
+        """Forget every document (used when the collection is deleted)"""
+        with self.lock:
+            self._documents = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
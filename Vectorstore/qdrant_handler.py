@@ -2,30 +2,113 @@
 
 """
 Qdrant operations.
-Thread-safe: Each client created per request.
+Thread-safe: the client is shared; searches run lock-free and concurrently,
+collection-level changes (create/insert/delete) are serialized by an instance lock.
+url may be an http(s) URL, ":memory:" or a local folder path (embedded Qdrant).
+A CollectionProfile sets HNSW parameters, int8 scalar quantization, on-disk vectors and
+keyword payload indexes at collection creation, and the search-time ef / rescoring.
+Vectors travel as float32 NumPy arrays (validated once per array, not per float) and are
+upserted as column-oriented batches, converted to wire format one batch at a time.
+Upserts are split into upsert_batch_size batches sent by up to upsert_parallelism threads with
+wait=False; the last batch is sent with wait=True once every other batch is acknowledged, which
+acts as a barrier (Qdrant applies acknowledged updates in order). Failed batches are retried
+with exponential backoff. prefer_grpc switches a server connection to gRPC for bulk loads.
 """
 
 from qdrant_client import QdrantClient # pyright: ignore[reportMissingImports]
-from qdrant_client.models import Distance, VectorParams, PointStruct # pyright: ignore[reportMissingImports]
+from qdrant_client.models import Distance, VectorParams, Batch, PointIdsList, SetPayload, SetPayloadOperation # pyright: ignore[reportMissingImports]
+from qdrant_client.models import (HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, # pyright: ignore[reportMissingImports]
+                                  SearchParams, QuantizationSearchParams, PayloadSchemaType, QueryRequest)
+from Config.config import CollectionProfile
 import uuid
+import time
 import threading
 import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+def as_vector_array(vectors, ndim: int = 2) -> np.ndarray:
+    """
+    Validate vectors once and return them as a C-contiguous float32 array of `ndim` dimensions.
+    float32 arrays pass through without a copy; lists of numbers are converted in one call.
+    """
+    array = vectors if isinstance(vectors, np.ndarray) else np.asarray(vectors)
+    if array.dtype.kind not in "fiu" or array.ndim != ndim or 0 in array.shape:
+        kind = "list of lists / 2-D array" if ndim == 2 else "list / 1-D array"
+        raise ValueError(f"vectors must be a non-empty {kind} of numbers")
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    if not np.isfinite(array).all():
+        raise ValueError("vectors must not contain NaN or infinite values")
+    return array
 
 class QdrantHandler:
-    def __init__(self, url: str = "http://localhost:6333", collection_name: str = "pdf_embeddings"):
+    def __init__(self, url: str = "http://localhost:6333", collection_name: str = "pdf_embeddings", profile: CollectionProfile | None = None,
+                 prefer_grpc: bool = False, grpc_port: int = 6334, upsert_batch_size: int = 256, upsert_parallelism: int = 2,
+                 max_retries: int = 3, backoff_factor: float = 0.5, upsert_wait: bool = False):
+        """
+        :param url: http(s) URL, ":memory:" or a local folder (embedded Qdrant)
+        :param profile: Collection profile (HNSW, quantization, payload indexes, search params)
+        :param prefer_grpc: Talk to a Qdrant server over gRPC (faster for bulk loads)
+        :param grpc_port: Server gRPC port
+        :param upsert_batch_size: Points per upsert request
+        :param upsert_parallelism: Upsert requests in flight at once (1 for embedded Qdrant)
+        :param max_retries: Retries of a failed upsert batch, with exponential backoff
+        :param backoff_factor: First retry delay in seconds, doubled on every retry
+        :param upsert_wait: Wait for every batch to be applied instead of only the final barrier
+        """
         if not isinstance(url, str) or not url:
             raise ValueError("url must be a non-empty string")
         if not isinstance(collection_name, str) or not collection_name:
             raise ValueError("collection_name must be a non-empty string")
+        if not isinstance(upsert_batch_size, int) or upsert_batch_size <= 0:
+            raise ValueError("upsert_batch_size must be a positive integer")
+        if not isinstance(upsert_parallelism, int) or upsert_parallelism <= 0:
+            raise ValueError("upsert_parallelism must be a positive integer")
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise ValueError("max_retries must be a non-negative integer")
 
         try:
-            self.client = QdrantClient(url=url)
+            if url == ":memory:":
+                self.client = QdrantClient(location=":memory:")
+            elif url.startswith(("http://", "https://")):
+                self.client = QdrantClient(url=url, prefer_grpc=prefer_grpc, grpc_port=grpc_port)
+            else:
+                self.client = QdrantClient(path=url)
             self.collection_name = collection_name
+            self.profile = profile or CollectionProfile()
+            # Embedded Qdrant searches exactly and has no payload indexes, profile search settings do not apply
+            self.embedded = not url.startswith(("http://", "https://"))
+            self.search_params = None if self.embedded else self._search_params(self.profile)
             self.lock = threading.Lock()
+            self.upsert_batch_size = upsert_batch_size
+            self.max_retries = max_retries
+            self.backoff_factor = backoff_factor
+            self.upsert_wait = upsert_wait
+            # Embedded Qdrant applies updates in-process, concurrent requests would only contend
+            self.upsert_parallelism = 1 if self.embedded else upsert_parallelism
+            self._upsert_pool = ThreadPoolExecutor(max_workers=self.upsert_parallelism, thread_name_prefix="qdrant-upsert") if self.upsert_parallelism > 1 else None
+            self._stats_lock = threading.Lock()
+            self._stats = {"points": 0, "batches": 0, "retries": 0, "seconds": 0.0}
         except Exception as e:
             logging.error(f"Failed to initialize QdrantHandler: {e}")
             raise RuntimeError(f"QdrantHandler initialization failed: {e}")
 
+    @staticmethod
+    def _search_params(profile: CollectionProfile):
+        quantization = None
+        if profile.quantization:
+            quantization = QuantizationSearchParams(rescore=profile.rescore, oversampling=profile.oversampling)
+        if profile.search_ef is None and quantization is None:
+            return None
+        return SearchParams(hnsw_ef=profile.search_ef, quantization=quantization)
+
+    def collection_exists(self) -> bool:
+        try:
+            return self.client.collection_exists(self.collection_name)
+        except Exception as e:
+            logging.error(f"Error checking collection {self.collection_name}: {e}")
+            raise RuntimeError(f"Collection check failed: {e}")
+
     def create_collection(self, vector_size: int):
         """Create collection if not exists"""
         if not isinstance(vector_size, int) or vector_size <= 0:
@@ -34,76 +117,249 @@ class QdrantHandler:
         with self.lock:
             try:
                 if not self.client.collection_exists(self.collection_name):
+                    profile = self.profile
+                    quantization = None
+                    if profile.quantization:
+                        quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(
+                            type=ScalarType.INT8, quantile=profile.quantile, always_ram=profile.quantized_in_ram))
                     self.client.create_collection(
                         collection_name=self.collection_name,
-                        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+                        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=profile.on_disk),
+                        hnsw_config=HnswConfigDiff(m=profile.hnsw_m, ef_construct=profile.hnsw_ef_construct),
+                        quantization_config=quantization
                     )
+                    for field_name in () if self.embedded else profile.payload_indexes:
+                        self.client.create_payload_index(collection_name=self.collection_name, field_name=field_name,
+                                                         field_schema=PayloadSchemaType.KEYWORD)
                     print(f"Created collection: {self.collection_name}")
             except Exception as e:
                 logging.error(f"Error creating collection {self.collection_name}: {e}")
                 raise RuntimeError(f"Collection creation failed: {e}")
 
-    def insert_embeddings(self, sentences, embeddings, pdf_id: str = "default_pdf", source: str = "pdf"):
+    def _send_batch(self, sentences, embeddings, pdf_id, source, ids, payloads, start: int, stop: int, wait_applied: bool) -> int:
+        """Build and upsert points [start, stop), retrying with exponential backoff; returns the retries used"""
+        batch_payloads = [
+            {
+                **(payloads[idx] if payloads is not None else {}),
+                "pdf_id": pdf_id[idx] if isinstance(pdf_id, list) else pdf_id,
+                "text": sentences[idx],
+                "source": source
+            }
+            for idx in range(start, stop)
+        ]
+        # Python floats exist for one batch at a time only
+        batch = Batch(ids=ids[start:stop], vectors=embeddings[start:stop].tolist(), payloads=batch_payloads)
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.upsert(collection_name=self.collection_name, points=batch, wait=wait_applied)
+                return attempt
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_factor * (2 ** attempt)
+                logging.warning(f"Upsert of points {start}-{stop} into {self.collection_name} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def insert_embeddings(self, sentences, embeddings, pdf_id: str = "default_pdf", source: str = "pdf", ids=None, payloads=None,
+                          batch_size: int | None = None):
         """
         sentences: list of text chunks (sentences or captions)
-        embeddings: list of precomputed embeddings corresponding to each sentence
-        pdf_id: identifier for the PDF
+        embeddings: (len(sentences), dim) float32 array of precomputed embeddings (lists of lists are converted)
+        pdf_id: identifier for the PDF, or a list with one pdf_id per sentence (multi-document batches)
         source: "pdf" or "caption"
+        ids: optional deterministic point ids (random UUIDs when omitted)
+        payloads: optional extra payload fields per sentence, e.g. chunk provenance {"page", "start", "end"}
+        batch_size: points per upsert request (defaults to upsert_batch_size)
+        Returns {"points", "batches", "retries", "seconds", "points_per_s"} of this call.
         """
         if not isinstance(sentences, list) or not all(isinstance(s, str) for s in sentences):
             raise ValueError("sentences must be a list of strings")
-        if not isinstance(embeddings, list) or not all(isinstance(e, list) and all(isinstance(v, (int, float)) for v in e) for e in embeddings):
-            raise ValueError("embeddings must be a list of lists of numbers")
+        embeddings = as_vector_array(embeddings)
         if len(sentences) != len(embeddings):
             raise ValueError("Length of sentences and embeddings must match.")
-        if not isinstance(pdf_id, str):
+        if isinstance(pdf_id, list):
+            if len(pdf_id) != len(sentences) or not all(isinstance(p, str) for p in pdf_id):
+                raise ValueError("pdf_id list must hold one string per sentence")
+        elif not isinstance(pdf_id, str):
             raise ValueError("pdf_id must be a string")
         if not isinstance(source, str):
             raise ValueError("source must be a string")
+        if ids is not None and (not isinstance(ids, list) or len(ids) != len(sentences)):
+            raise ValueError("ids must be a list with one id per sentence")
+        if payloads is not None and (not isinstance(payloads, list) or len(payloads) != len(sentences) or not all(isinstance(p, dict) for p in payloads)):
+            raise ValueError("payloads must be a list with one dict per sentence")
+        batch_size = self.upsert_batch_size if batch_size is None else batch_size
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in sentences]  # unique ID for each vector
 
         with self.lock:
             try:
-                points = []
-                for idx, (sentence, vector) in enumerate(zip(sentences, embeddings)):
-                    points.append(
-                        PointStruct(
-                            id=str(uuid.uuid4()),  # unique ID for each vector
-                            vector=vector,
-                            payload={
-                                "pdf_id": pdf_id,
-                                "text": sentence,
-                                "source": source
-                            }
-                        )
-                    )
+                started = time.perf_counter()
+                bounds = [(start, min(start + batch_size, len(sentences))) for start in range(0, len(sentences), batch_size)]
+                *body, last = bounds
+                retries = 0
+
+                def send(start, stop, wait_applied):
+                    return self._send_batch(sentences, embeddings, pdf_id, source, ids, payloads, start, stop, wait_applied)
+
+                if self._upsert_pool is None:
+                    for start, stop in body:
+                        retries += send(start, stop, self.upsert_wait)
+                else:
+                    futures = [self._upsert_pool.submit(send, start, stop, self.upsert_wait) for start, stop in body]
+                    done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                    for future in pending:
+                        future.cancel()
+                    # Batches already running cannot be cancelled; let them end before the lock is released
+                    wait(pending)
+                    retries += sum(future.result() for future in futures if not future.cancelled())
+                # Barrier: every other batch is acknowledged, the last one returns once all are applied
+                retries += send(*last, True)
+                seconds = time.perf_counter() - started
 
-                self.client.upsert(collection_name=self.collection_name, points=points)
-                print(f"Inserted {len(points)} embeddings into '{self.collection_name}'.")
+                with self._stats_lock:
+                    self._stats["points"] += len(sentences)
+                    self._stats["batches"] += len(bounds)
+                    self._stats["retries"] += retries
+                    self._stats["seconds"] += seconds
+                print(f"Inserted {len(sentences)} embeddings into '{self.collection_name}' ({len(sentences) / seconds:.0f} points/s).")
+                return {"points": len(sentences), "batches": len(bounds), "retries": retries,
+                        "seconds": seconds, "points_per_s": len(sentences) / seconds}
             except Exception as e:
                 logging.error(f"Error inserting embeddings into {self.collection_name}: {e}")
                 raise RuntimeError(f"Embedding insertion failed: {e}")
 
+    def upsert_stats(self) -> dict:
+        """Points, batches, retries and throughput of all upserts so far"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["points_per_s"] = stats["points"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def close(self):
+        """Stop the upsert workers and close the client connection"""
+        if self._upsert_pool is not None:
+            self._upsert_pool.shutdown(wait=True)
+        self.client.close()
+
+    def delete_points(self, ids):
+        """Delete points by id (used to drop stale chunks of a re-ingested document)"""
+        if not isinstance(ids, list):
+            raise ValueError("ids must be a list")
+        if not ids:
+            return
+
+        with self.lock:
+            try:
+                self.client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=ids))
+                print(f"Deleted {len(ids)} points from '{self.collection_name}'.")
+            except Exception as e:
+                logging.error(f"Error deleting points from {self.collection_name}: {e}")
+                raise RuntimeError(f"Point deletion failed: {e}")
+
+    def set_payloads(self, payloads: dict):
+        """Overwrite payload fields of existing points, {point_id: {field: value}}, in one request"""
+        if not isinstance(payloads, dict) or not all(isinstance(p, dict) for p in payloads.values()):
+            raise ValueError("payloads must be a dict of point id -> payload dict")
+        if not payloads:
+            return
+
+        with self.lock:
+            try:
+                operations = [SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+                              for point_id, payload in payloads.items()]
+                self.client.batch_update_points(collection_name=self.collection_name, update_operations=operations)
+            except Exception as e:
+                logging.error(f"Error updating payloads in {self.collection_name}: {e}")
+                raise RuntimeError(f"Payload update failed: {e}")
+
     def search(self, query_vector, top_k: int = 5):
         """
-        query_vector: precomputed embedding of the query
+        query_vector: precomputed embedding of the query (1-D float32 array or list of numbers)
         top_k: number of results
         """
-        if not isinstance(query_vector, list) or not all(isinstance(v, (int, float)) for v in query_vector):
-            raise ValueError("query_vector must be a list of numbers")
+        query_vector = as_vector_array(query_vector, ndim=1)
         if not isinstance(top_k, int) or top_k <= 0:
             raise ValueError("top_k must be a positive integer")
 
-        with self.lock:
-            try:
-                results = self.client.search(
-                    collection_name=self.collection_name,
-                    query_vector=query_vector,
-                    limit=top_k
-                )
-                return results
-            except Exception as e:
-                logging.error(f"Error searching in {self.collection_name}: {e}")
-                raise RuntimeError(f"Search failed: {e}")
+        # No lock: reads don't mutate client state and can run concurrently
+        try:
+            results = self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector.tolist(),
+                limit=top_k,
+                search_params=self.search_params
+            )
+            return results.points
+        except Exception as e:
+            logging.error(f"Error searching in {self.collection_name}: {e}")
+            raise RuntimeError(f"Search failed: {e}")
+
+    def search_batch(self, query_vectors, top_k: int = 5):
+        """
+        Search many queries in one round trip.
+        query_vectors: (n_queries, dim) float32 array (or list of lists)
+        Returns one list of hits per query, in input order.
+        """
+        query_vectors = as_vector_array(query_vectors)
+        if not isinstance(top_k, int) or top_k <= 0:
+            raise ValueError("top_k must be a positive integer")
+
+        try:
+            requests = [QueryRequest(query=vector, limit=top_k, params=self.search_params, with_payload=True)
+                        for vector in query_vectors.tolist()]
+            return [response.points for response in self.client.query_batch_points(collection_name=self.collection_name, requests=requests)]
+        except Exception as e:
+            logging.error(f"Error batch searching in {self.collection_name}: {e}")
+            raise RuntimeError(f"Batch search failed: {e}")
+
+    def retrieve(self, ids):
+        """Fetch payloads of points by id; returns {point_id: payload} for the ids that exist"""
+        if not isinstance(ids, list):
+            raise ValueError("ids must be a list")
+        if not ids:
+            return {}
+
+        try:
+            # Sparse hits carry ids as strings, integer ids must go back to Qdrant as integers
+            ids = [int(point_id) if isinstance(point_id, str) and point_id.isdigit() else point_id for point_id in ids]
+            points = self.client.retrieve(collection_name=self.collection_name, ids=ids, with_payload=True, with_vectors=False)
+            return {str(point.id): point.payload for point in points}
+        except Exception as e:
+            logging.error(f"Error retrieving points from {self.collection_name}: {e}")
+            raise RuntimeError(f"Point retrieval failed: {e}")
+
+    def count(self) -> int:
+        """Number of points in the collection (0 when it does not exist)"""
+        try:
+            if not self.client.collection_exists(self.collection_name):
+                return 0
+            return self.client.count(collection_name=self.collection_name, exact=True).count
+        except Exception as e:
+            logging.error(f"Error counting points in {self.collection_name}: {e}")
+            raise RuntimeError(f"Point count failed: {e}")
+
+    def scroll(self, batch_size: int = 1024, with_payload: bool = True):
+        """Yield (point_id, payload) for every point in the collection, e.g. to rebuild a keyword index (payload None without with_payload)"""
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer")
+
+        try:
+            if not self.client.collection_exists(self.collection_name):
+                return
+            offset = None
+            while True:
+                points, offset = self.client.scroll(collection_name=self.collection_name, limit=batch_size, offset=offset,
+                                                    with_payload=with_payload, with_vectors=False)
+                for point in points:
+                    yield str(point.id), point.payload
+                if offset is None:
+                    break
+        except Exception as e:
+            logging.error(f"Error scrolling {self.collection_name}: {e}")
+            raise RuntimeError(f"Scroll failed: {e}")
 
     def delete_collection(self):
         """Danger: deletes the whole collection"""
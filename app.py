@@ -173,7 +173,8 @@ class RAGApp:
                             tmp_file.write(uploaded_file.read())
                             tmp_path = tmp_file.name
 
-                        self.pipeline.ingest_pdf(tmp_path)
+                        # Name the document after the upload so re-uploads are deduplicated by content
+                        self.pipeline.ingest_pdf(tmp_path, doc_key=uploaded_file.name)
 
                     st.session_state.uploaded_file_names.add(uploaded_file.name)
                     st.success(f"✅ {uploaded_file.name} added to database")
@@ -192,7 +193,7 @@ class RAGApp:
             st.session_state.busy = True
             try:
                 with st.spinner("Clearing Qdrant database..."):
-                    self.pipeline.qdrant_handler.delete_collection()
+                    self.pipeline.delete_collection()
                 st.session_state.uploaded_file_names.clear()
                 st.session_state.last_answer = ""
                 st.success("✅ Database cleared")
@@ -2,54 +2,208 @@
 """
 FastAPI entry point.
 Coordinates ingestion, retrieval, and answering.
+
+Endpoints:
+    GET  /                  health check
+    POST /upload_pdf        store the upload, queue ingestion, return a job id
+    GET  /jobs/{job_id}     ingestion status polling
+    POST /query             top-k retrieval hits
+    POST /ask               answer tokens streamed as Server-Sent Events
+    GET  /metrics           stage latencies, throughput, queue depths and model load times (Prometheus text)
+    GET  /traces            span trees of the most recent requests
+
+Models are loaded once at startup and shared by all requests. Blocking model work runs
+on executors so the event loop never stalls.
+Run with: python main.py   (or: uvicorn main:app)
 """
+import os
+import json
+import uuid
+import time
+import asyncio
 import logging
+import threading
+from typing import Annotated
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, UploadFile, HTTPException # pyright: ignore[reportMissingImports]
+from fastapi.responses import PlainTextResponse, StreamingResponse # pyright: ignore[reportMissingImports]
+from pydantic import BaseModel, Field, StringConstraints # pyright: ignore[reportMissingImports]
+
+from Config.config import AppConfig
+from LLM.ollama_client import abort_response
+from RAG_Pipeline.RAG_Pipeline import RAGPipeline # pyright: ignore[reportMissingImports]
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# from fastapi import FastAPI, UploadFile
-# from config import AppConfig
+config = AppConfig()
 
-# app = FastAPI()
-# config = AppConfig()
+class QueryRequest(BaseModel):
+    question: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]   # whitespace-only -> 422
+    top_k: int = Field(10, gt=0, le=100)
 
-# @app.get("/")
-# def health_check():
-#     return {"status": "ok"}
+class JobStore:
+    """
+    Thread-safe in-memory registry of ingestion jobs.
+    Queued and running jobs are always kept; of the finished ones only the last max_finished are.
+    """
+    def __init__(self, max_finished: int = 1000):
+        if not isinstance(max_finished, int) or max_finished <= 0:
+            raise ValueError("max_finished must be a positive integer")
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self._jobs = {}
+        self._finished = OrderedDict()      # job ids in the order they finished
 
-# @app.post("/upload_pdf")
-# async def upload_pdf(file: UploadFile):
-#     TODO: call ingestion pipeline
-#     return {"filename": file.filename}
+    def create(self, filename: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self._jobs[job_id] = {"job_id": job_id, "filename": filename, "status": "queued",
+                                  "created_at": time.time(), "finished_at": None, "result": None, "error": None}
+        return job_id
 
-# @app.post("/query")
-# async def query_llm(query: str):
-#     TODO: embed query, retrieve docs, call Ollama
-#     return {"query": query, "answer": "TBD"}
+    def update(self, job_id: str, **fields):
+        with self.lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if job["status"] in ("done", "failed"):
+                self._finished[job_id] = None
+                while len(self._finished) > self.max_finished:
+                    self._jobs.pop(self._finished.popitem(last=False)[0], None)
 
-from RAG_Pipeline.RAG_Pipeline import RAGPipeline # pyright: ignore[reportMissingImports]
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._jobs)
 
-if __name__ == "__main__":
+    def get(self, job_id: str):
+        with self.lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    service = config.service
+    os.makedirs(service.upload_dir, exist_ok=True)
+    app.state.pipeline = RAGPipeline(
+        embedder_device=service.embedder_device,
+        qdrant_url=service.qdrant_url,
+        collection_name=service.collection_name,
+        config=config)
+    # Ingestions are serialized by the pipeline anyway, one worker keeps them in upload order
+    app.state.ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+    app.state.model_executor = ThreadPoolExecutor(max_workers=service.model_workers, thread_name_prefix="model")
+    app.state.jobs = JobStore(max_finished=service.max_finished_jobs)
+    try:
+        yield
+    finally:
+        app.state.ingest_executor.shutdown(wait=True)
+        app.state.model_executor.shutdown(wait=True)
+        app.state.pipeline.close()
+
+app = FastAPI(title="Advanced RAG", lifespan=lifespan)
+
+def _run_ingest_job(pipeline: RAGPipeline, jobs: JobStore, job_id: str, pdf_path: str, doc_key: str):
+    jobs.update(job_id, status="running")
+    try:
+        result = pipeline.ingest_pdf(pdf_path, doc_key=doc_key)
+        summary = {key: result.get(key) for key in ("pdf_id", "doc_key", "skipped", "new_chunks", "stale_chunks")}
+        jobs.update(job_id, status="done", result=summary, finished_at=time.time())
+    except Exception as e:
+        logging.error(f"Ingestion job {job_id} failed: {e}")
+        jobs.update(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+@app.get("/")
+def health_check():
+    return {"status": "ok"}
+
+@app.post("/upload_pdf", status_code=202)
+async def upload_pdf(file: UploadFile):
+    if not file.filename or not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only .pdf uploads are supported")
+
+    jobs: JobStore = app.state.jobs
+    job_id = jobs.create(file.filename)
+    pdf_path = os.path.join(config.service.upload_dir, f"{job_id}.pdf")
+
+    # Copy the upload in chunks without blocking the loop on disk writes
+    loop = asyncio.get_running_loop()
+    with open(pdf_path, "wb") as out:
+        while chunk := await file.read(1 << 20):
+            await loop.run_in_executor(None, out.write, chunk)
+
+    app.state.ingest_executor.submit(_run_ingest_job, app.state.pipeline, jobs, job_id, pdf_path, file.filename)
+    return {"job_id": job_id, "filename": file.filename, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    loop = asyncio.get_running_loop()
     try:
-        pdf_path = "Test/Test.pdf"
-        pipeline = RAGPipeline(embedder_device=0, collection_name="pdf_embeddings")
-
-        # Ingest PDF and store embeddings
-        # TODO : NOTE: Comment this line after first run, Qdrant DB will already been updated
-        logging.info("Starting PDF ingestion...")
-        result = pipeline.ingest_pdf(pdf_path, temp_dir="TempData")
-        logging.info("PDF ingestion completed.")
-
-        # Query example
-        # user_question = "Who is Burns?"
-        # user_question = "What is in picture 3 ?"
-        user_question = "What is the document all about ?"
-
-        logging.info(f"Querying: {user_question}")
-        answer = pipeline.ask(user_question)
-        print("Answer:", answer)
-        logging.info("Query completed.")
+        hits = await loop.run_in_executor(app.state.model_executor, app.state.pipeline.query, request.question, request.top_k)
     except Exception as e:
-        logging.error(f"Error in main execution: {e}")
-        raise
+        raise HTTPException(status_code=500, detail=str(e))
+    if isinstance(hits, str):  # No results
+        return {"question": request.question, "hits": [], "message": hits}
+    return {"question": request.question, "hits": [{"text": text, "score": score} for text, score in hits]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(app.state.pipeline.metrics_text(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+def traces(limit: int = 20):
+    return {"traces": app.state.pipeline.recent_traces(limit)}
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/ask")
+async def ask(request: QueryRequest):
+    loop = asyncio.get_running_loop()
+    executor = app.state.model_executor
+    responses = []          # the open Ollama response, once generation starts
+    tokens = app.state.pipeline.ask_stream(request.question, request.top_k, on_response=responses.append)
+    finished = object()
+
+    async def event_stream():
+        step = None
+        try:
+            while True:
+                # Each next() may block on retrieval or the LLM, so it runs on the model executor
+                step = executor.submit(next, tokens, finished)
+                token = await asyncio.wrap_future(step)
+                if token is finished:
+                    break
+                yield _sse({"token": token})
+            yield _sse({}, event="done")
+        except Exception as e:
+            logging.error(f"Streaming answer failed: {e}")
+            yield _sse({"error": str(e)}, event="error")
+        finally:
+            if step is not None and not step.done():
+                # The client went away while a worker is blocked reading Ollama: abort that read so the
+                # step ends now and the generator can be closed, instead of leaving the response open until GC
+                for response in responses:
+                    abort_response(response)
+                with suppress(Exception):
+                    await asyncio.wrap_future(step)     # fails with the aborted read
+            await loop.run_in_executor(executor, tokens.close)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+if __name__ == "__main__":
+    import uvicorn # pyright: ignore[reportMissingImports]
+    uvicorn.run(app, host=config.service.host, port=config.service.port)